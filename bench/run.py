@@ -0,0 +1,407 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from synthetic import generate_workshop  # noqa: E402
+
+from reroader.diskusage import DiskUsageCache  # noqa: E402
+from reroader.entryindex import EntryIndex  # noqa: E402
+from reroader.layout import LayoutModel  # noqa: E402
+from reroader.roa import RoaCategoriesFile, RoaEntry, RoaOrderFile  # noqa: E402
+from reroader.sorting import sort_name  # noqa: E402
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parent / 'src'
+DEFAULT_BASELINE = BENCH_DIR / 'baseline.json'
+DEFAULT_WORKDIR = BENCH_DIR / '.work'
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+
+# Each benchmark is (name, setup, run). setup(ctx) runs untimed before every
+# repetition and returns the argument for run(ctx, arg), which is timed.
+Setup = Callable[['Context'], Any]
+Run = Callable[['Context', Any], Any]
+BENCHMARKS: list[tuple[str, Setup, Run]] = []
+
+
+def benchmark(name: str, setup: Setup = lambda ctx: None) -> Callable[[Run], Run]:
+    def register(run: Run) -> Run:
+        BENCHMARKS.append((name, setup, run))
+        return run
+    return register
+
+
+class Context():
+    def __init__(self, roa_dir: Path, seed: int) -> None:
+        self.roa_dir: Path = roa_dir
+        self.rng = random.Random(seed)
+        self.order_data: bytes = (roa_dir / 'order.roa').read_bytes()
+        self.categories_data: bytes = (roa_dir / 'categories.roa').read_bytes()
+        self.order_roa: RoaOrderFile = RoaOrderFile(roa_dir / 'order.roa')
+        self.categories_roa: RoaCategoriesFile = RoaCategoriesFile(roa_dir / 'categories.roa')
+        # Pruned and scanned state, restored before the benchmarks that need it
+        self.settled: dict[str, list[RoaEntry]] = {k: list(v) for k, v in self.order_roa.groups.items()}
+        self.warm: bool = False
+
+    def fresh_order(self) -> None:
+        self.order_roa.load_bytes(self.order_data)
+
+    def settled_state(self) -> None:
+        # Reads every config.ini once per size, then reuses the entries
+        if not self.warm:
+            for group in self.settled.values():
+                for entry in group:
+                    entry.sort_key  # noqa: B018
+            self.warm = True
+        self.order_roa.groups = OrderedDict((k, list(v)) for k, v in self.settled.items())
+        self.categories_roa.load_bytes(self.categories_data)
+
+    def model(self) -> LayoutModel:
+        return LayoutModel.from_roa(self.order_roa, self.categories_roa)
+
+
+# ROA files
+
+@benchmark('roa.open')
+def bench_open(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    RoaOrderFile(ctx.roa_dir / 'order.roa')
+    RoaCategoriesFile(ctx.roa_dir / 'categories.roa')
+
+
+@benchmark('order.parse')
+def bench_order_parse(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    ctx.order_roa.load_bytes(ctx.order_data)
+
+
+@benchmark('order.encode')
+def bench_order_encode(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    ctx.order_roa.encode_bytes()
+
+
+@benchmark('categories.parse')
+def bench_categories_parse(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    ctx.categories_roa.load_bytes(ctx.categories_data)
+
+
+@benchmark('categories.encode')
+def bench_categories_encode(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    ctx.categories_roa.encode_bytes()
+
+
+@benchmark('order.prune', setup=Context.fresh_order)
+def bench_prune(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    ctx.order_roa.prune_deleted_entries()
+
+
+def setup_scan(ctx: Context) -> None:
+    ctx.fresh_order()
+    ctx.order_roa.prune_deleted_entries()
+
+
+@benchmark('order.scan', setup=setup_scan)
+def bench_scan(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    ctx.order_roa.scan_for_new_entries()
+
+
+@benchmark('entries.index', setup=Context.fresh_order)
+def bench_entry_index(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    index = EntryIndex(ctx.order_roa.groups)
+    list(index.issues(disk=False, types=False))
+
+
+# Disk usage: a cold scan lists every folder, a warm one only stats them
+
+def disk_usage_paths(ctx: Context) -> list[str]:
+    return [e.decode() for group in ctx.order_roa.groups.values() for e in group]
+
+
+def setup_disk_cold(ctx: Context) -> tuple[DiskUsageCache, list[str]]:
+    ctx.fresh_order()
+    cache = DiskUsageCache(ctx.roa_dir.parent.parent / 'disk_usage.json')
+    cache.nodes.clear()
+    return cache, disk_usage_paths(ctx)
+
+
+def setup_disk_warm(ctx: Context) -> tuple[DiskUsageCache, list[str]]:
+    cache, paths = setup_disk_cold(ctx)
+    cache.scan(paths)
+    return cache, paths
+
+
+@benchmark('disk.scan', setup=setup_disk_cold)
+def bench_disk_scan(ctx: Context, arg: tuple[DiskUsageCache, list[str]]) -> None:  # noqa: ARG001
+    cache, paths = arg
+    cache.scan(paths)
+
+
+@benchmark('disk.rescan', setup=setup_disk_warm)
+def bench_disk_rescan(ctx: Context, arg: tuple[DiskUsageCache, list[str]]) -> None:  # noqa: ARG001
+    cache, paths = arg
+    cache.scan(paths)
+
+
+# Metadata
+
+def setup_metadata(ctx: Context) -> list[RoaEntry]:
+    return [RoaEntry(e.value) for group in ctx.order_roa.groups.values() for e in group]
+
+
+@benchmark('metadata.ini', setup=setup_metadata)
+def bench_metadata(ctx: Context, entries: list[RoaEntry]) -> None:  # noqa: ARG001
+    for entry in entries:
+        entry.name  # noqa: B018
+        entry.author  # noqa: B018
+        entry.version  # noqa: B018
+
+
+def setup_collation(ctx: Context) -> list[RoaEntry]:
+    entries = setup_metadata(ctx)
+    for entry in entries:
+        entry.name, entry.author  # noqa: B018
+    return entries
+
+
+@benchmark('metadata.collation', setup=setup_collation)
+def bench_collation(ctx: Context, entries: list[RoaEntry]) -> None:  # noqa: ARG001
+    sorted(entries, key=sort_name)
+
+
+# YAML sync. The sync functions work on sort.yaml in the working directory.
+
+def setup_yaml_fresh(ctx: Context) -> None:
+    ctx.settled_state()
+    with contextlib.suppress(FileNotFoundError):
+        os.remove('sort.yaml')
+
+
+@benchmark('yaml.create', setup=setup_yaml_fresh)
+def bench_yaml_create(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    from reroader.yaml_sync import load_yaml_state
+    load_yaml_state(ctx.order_roa, ctx.categories_roa)
+
+
+@benchmark('yaml.sync_to_yaml', setup=Context.settled_state)
+def bench_yaml_to_yaml(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    from reroader.yaml_sync import sync_characters_to_yaml
+    sync_characters_to_yaml(ctx.order_roa, ctx.categories_roa)
+
+
+@benchmark('yaml.sync_to_roa', setup=Context.settled_state)
+def bench_yaml_to_roa(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    from reroader.yaml_sync import sync_yaml_to_roa
+    sync_yaml_to_roa(ctx.order_roa, ctx.categories_roa)
+
+
+# Layout model
+
+def setup_model(ctx: Context) -> LayoutModel:
+    ctx.settled_state()
+    return ctx.model()
+
+
+@benchmark('model.zip', setup=Context.settled_state)
+def bench_model_zip(ctx: Context, arg: None) -> None:  # noqa: ARG001
+    ctx.model()
+
+
+@benchmark('model.unzip', setup=setup_model)
+def bench_model_unzip(ctx: Context, model: LayoutModel) -> None:
+    model.to_roa(ctx.order_roa, ctx.categories_roa)
+
+
+def largest_category(model: LayoutModel) -> str:
+    return max(model, key=lambda name: len(model[name]))
+
+
+def sample(ctx: Context, entries: list[RoaEntry]) -> list[RoaEntry]:
+    return ctx.rng.sample(entries, max(1, len(entries) // 100)) if entries else []
+
+
+def setup_move_entries(ctx: Context) -> tuple[LayoutModel, list[RoaEntry], str]:
+    model = setup_model(ctx)
+    return model, sample(ctx, list(model.entries())), ctx.rng.choice(model.order)
+
+
+@benchmark('model.move_entries', setup=setup_move_entries)
+def bench_move_entries(ctx: Context, arg: tuple[LayoutModel, list[RoaEntry], str]) -> None:  # noqa: ARG001
+    model, entries, dest = arg
+    model.move_entries(entries, dest)
+
+
+def setup_move_within(ctx: Context) -> tuple[LayoutModel, str, list[RoaEntry]]:
+    model = setup_model(ctx)
+    name = largest_category(model)
+    model.positions(name)
+    return model, name, sample(ctx, model[name])
+
+
+@benchmark('model.move_within', setup=setup_move_within)
+def bench_move_within(ctx: Context, arg: tuple[LayoutModel, str, list[RoaEntry]]) -> None:  # noqa: ARG001
+    model, name, entries = arg
+    for _ in range(10):
+        model.move_within(name, entries, -1)
+
+
+@benchmark('model.move_within_to', setup=setup_move_within)
+def bench_move_within_to(ctx: Context, arg: tuple[LayoutModel, str, list[RoaEntry]]) -> None:  # noqa: ARG001
+    model, name, entries = arg
+    model.move_within_to(name, entries, 0)
+
+
+@benchmark('model.position_of', setup=setup_model)
+def bench_position_of(ctx: Context, model: LayoutModel) -> None:  # noqa: ARG001
+    for entry in model.entries():
+        model.position_of(entry)
+
+
+@benchmark('model.sort_category', setup=setup_model)
+def bench_sort_category(ctx: Context, model: LayoutModel) -> None:  # noqa: ARG001
+    for name in model.order:
+        model.sort_category(name, sort_name)
+
+
+# Cold start of the entry points, each in a fresh interpreter. These don't
+# depend on the workshop size, so they run once and their keys have no @size.
+# startup.python is the bare interpreter, for reading the others against.
+STARTUP_BENCHMARKS: list[tuple[str, list[str]]] = [
+    ('startup.python', ['-c', 'pass']),
+    ('startup.cli_help', [str(SRC_DIR / 'main.py'), '--help']),
+    ('startup.gui_import', ['-c', 'import reroader.gui']),
+]
+
+
+# Runner
+
+def time_benchmark(ctx: Context, setup: Setup, run: Run, min_time: float, max_repeat: int) -> float:
+    # Best of several repetitions, stopping early once min_time has elapsed
+    best = float('inf')
+    total = 0.0
+    for _ in range(max_repeat):
+        arg = setup(ctx)
+        start = time.perf_counter()
+        run(ctx, arg)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        if total >= min_time:
+            break
+    return best
+
+
+def time_startup(argv: list[str], max_repeat: int) -> float:
+    env = {**os.environ, 'PYTHONPATH': str(SRC_DIR)}
+    for var in ('REROADER_STARTUP_REPORT', 'REROADER_PROFILE'):
+        env.pop(var, None)
+    command = [sys.executable, *argv]
+    # Untimed first run, so bytecode compilation isn't counted
+    subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    best = float('inf')
+    for _ in range(max(max_repeat, 5)):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def workshop_for(workdir: Path, count: int, seed: int) -> Path:
+    root = workdir / f"workshop-{count}-{seed}"
+    marker = root / '.complete'
+    if not marker.exists():
+        print(f"Generating {count} entries in {root}", file=sys.stderr)
+        roa_dir = generate_workshop(root, count, seed=seed)
+        marker.write_text(str(roa_dir), encoding='utf-8')
+    return Path(marker.read_text(encoding='utf-8'))
+
+
+def run_all(sizes: list[int], workdir: Path, seed: int, selected: Optional[str], min_time: float, max_repeat: int) -> dict[str, float]:
+    results: dict[str, float] = {}
+    for name, argv in STARTUP_BENCHMARKS:
+        if selected and selected not in name:
+            continue
+        results[name] = time_startup(argv, max_repeat)
+        print(f"{name:<32} {results[name] * 1000:>12.3f} ms", file=sys.stderr)
+
+    cwd = os.getcwd()
+    for size in sizes:
+        roa_dir = workshop_for(workdir, size, seed)
+        os.chdir(roa_dir.parent)
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                ctx = Context(roa_dir, seed)
+            for name, setup, run in BENCHMARKS:
+                if selected and selected not in name:
+                    continue
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    seconds = time_benchmark(ctx, setup, run, min_time, max_repeat)
+                key = f"{name}@{size}"
+                results[key] = seconds
+                print(f"{key:<32} {seconds * 1000:>12.3f} ms", file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float, floor: float) -> list[str]:
+    # Times under `floor` seconds are too noisy to flag
+    regressions: list[str] = []
+    print(f"{'benchmark':<32} {'ms':>12} {'baseline':>12} {'ratio':>8}")
+    for key, seconds in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"{key:<32} {seconds * 1000:>12.3f} {'-':>12} {'-':>8}")
+            continue
+        ratio = seconds / base if base else float('inf')
+        flag = ''
+        if ratio > threshold and seconds > floor:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        elif ratio < 1 / threshold and base > floor:
+            flag = '  faster'
+        print(f"{key:<32} {seconds * 1000:>12.3f} {base * 1000:>12.3f} {ratio:>7.2f}x{flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark Re-ROAder against synthetic workshops",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument("--only", "-k", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR, help="Where generated workshops are kept between runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Stop repeating a benchmark after this many seconds")
+    parser.add_argument("--max-repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Merge these results into the baseline file")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Slowdown ratio that counts as a regression")
+    parser.add_argument("--floor", type=float, default=0.001, help="Ignore regressions in benchmarks faster than this (s)")
+    parser.add_argument("--output", "-o", type=Path, help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    results = run_all(args.sizes, args.workdir.resolve(), args.seed, args.only, args.min_time, args.max_repeat)
+
+    baseline: dict[str, float] = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+    regressions = compare(results, baseline, args.threshold, args.floor)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+    if args.save_baseline:
+        baseline.update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        print(f"Saved {len(results)} results to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,162 @@
+import argparse
+import random
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from reroader.binutil import BinWriter  # noqa: E402
+from reroader.roa import RoaEntry, RoaOrderFile  # noqa: E402
+
+# Synthetic workshop trees for benchmarks and manual testing. The layout
+# mirrors a real install:
+#
+#   <root>/RivalsofAether/workshop/order.roa, categories.roa
+#   <root>/steamapps/workshop/content/383980/<id>/config.ini, <thumbnail>.png
+#
+# A few entries listed in order.roa are missing on disk and a few on disk are
+# missing from order.roa, so pruning and scanning have work to do.
+
+# Share of each group. order.roa stores counts as 16-bit ints, so 100k
+# entries can't all be characters.
+GROUP_SHARES: dict[str, float] = {
+    'characters': 0.55,
+    'buddies': 0.10,
+    'stages': 0.15,
+    'skins': 0.20,
+}
+TYPE_IDS: dict[str, str] = {
+    'characters': '0',
+    'buddies': '1',
+    'stages': '2',
+    'skins': '3',
+}
+
+_syllables = ['ka', 'ro', 'zet', 'mi', 'lo', 'ra', 'fen', 'shi', 'ax', 'vo', 'na', 'qu', 'el', 'to', 'bri']
+_suffixes = ['', '', '', ' EX', ' 2', ' (Beta)', ' v1.3', ' Jr.', ' ★', ' - Workshop']
+
+
+def word(rng: random.Random) -> str:
+    return ''.join(rng.choice(_syllables) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def png_bytes(width: int, height: int, rgb: tuple[int, int, int]) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    row = b'\x00' + bytes(rgb) * width
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(row * height)),
+        chunk(b'IEND', b''),
+    ])
+
+
+def config_ini(rng: random.Random, name: str, author: str, type_: str) -> str:
+    lines = [
+        '[general]',
+        f'name="{name}"',
+        f'author="{author}"',
+        f'description="{" ".join(word(rng).lower() for _ in range(rng.randint(3, 30)))}"',
+        f'type="{TYPE_IDS[type_]}"',
+        f'version="{rng.randint(1, 40)}"',
+        f'major version="{rng.randint(0, 3)}"',
+        f'minor version="{rng.randint(0, 20)}"',
+        'finished="1"',
+    ]
+    if type_ in ('characters', 'skins'):
+        lines.append('')
+        lines.append('[color_shift]')
+        lines.extend(f'color_{i}="{rng.randint(0, 255)},{rng.randint(0, 255)},{rng.randint(0, 255)}"' for i in range(rng.randint(4, 16)))
+    return '\n'.join(lines) + '\n'
+
+
+def group_counts(count: int) -> dict[str, int]:
+    counts = {label: int(count * share) for label, share in GROUP_SHARES.items()}
+    counts['characters'] += count - sum(counts.values())
+    return counts
+
+
+def encode_order(groups: dict[str, list[bytes]]) -> bytes:
+    # Same layout as RoaOrderFile.encode_bytes
+    writer = BinWriter()
+    for label in RoaOrderFile.group_labels:
+        writer.write_str(RoaOrderFile.header)
+        writer.parts.append(b'\x01')
+        writer.write_strlist(groups[label])
+    return writer.blob
+
+
+def encode_categories(categories: list[tuple[int, bytes]]) -> bytes:
+    # Same layout as RoaCategoriesFile.encode_bytes
+    writer = BinWriter()
+    writer.write_int(len(categories))
+    for index, label in categories:
+        writer.write_int(index)
+        writer.write_str(label)
+    return writer.blob
+
+
+def generate_workshop(root: Path, count: int, seed: int = 0, churn: float = 0.01) -> Path:
+    # Returns the folder holding order.roa and categories.roa
+    rng = random.Random(seed)
+    roa_dir = root / 'RivalsofAether' / 'workshop'
+    content_dir = root / 'steamapps' / 'workshop' / 'content' / '383980'
+    roa_dir.mkdir(parents=True, exist_ok=True)
+    content_dir.mkdir(parents=True, exist_ok=True)
+
+    authors = [word(rng) for _ in range(max(1, count // 20))]
+    pngs = {
+        label: png_bytes(*RoaEntry.image_sizes[label], (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+        for label in GROUP_SHARES
+    }
+    used_ids: set[int] = set()
+
+    groups: dict[str, list[bytes]] = {}
+    for label, group_count in group_counts(count).items():
+        groups[label] = []
+        for _ in range(group_count):
+            entry_id = rng.randrange(1_000_000_000, 3_999_999_999)
+            while entry_id in used_ids:
+                entry_id = rng.randrange(1_000_000_000, 3_999_999_999)
+            used_ids.add(entry_id)
+            entry_dir = content_dir / str(entry_id)
+            in_order = rng.random() >= churn
+            on_disk = not in_order or rng.random() >= churn
+
+            if on_disk:
+                entry_dir.mkdir(exist_ok=True)
+                name = word(rng) + rng.choice(_suffixes)
+                (entry_dir / 'config.ini').write_text(config_ini(rng, name, rng.choice(authors), label), encoding='utf-8')
+                (entry_dir / RoaEntry.image_filenames[label]).write_bytes(pngs[label])
+            if in_order:
+                groups[label].append(str(entry_dir).encode('utf-8'))
+
+    # Categories: runs of a few dozen characters, the first one starting at 0
+    characters = groups['characters']
+    categories: list[tuple[int, bytes]] = []
+    index = 0
+    while index < len(characters):
+        categories.append((index, word(rng).encode('utf-8')))
+        index += rng.randint(1, 60)
+
+    (roa_dir / 'order.roa').write_bytes(encode_order(groups))
+    (roa_dir / 'categories.roa').write_bytes(encode_categories(categories))
+    return roa_dir
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic Rivals of Aether workshop",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("root", type=Path)
+    parser.add_argument("--count", "-n", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    roa_dir = generate_workshop(args.root, args.count, seed=args.seed)
+    print(f"REROADER_ROA_DIR={roa_dir}")
@@ -1,3 +1,11 @@
+import sys
+
+# First, so that it times the imports below
+from reroader import bootstrap  # noqa: F401
 from reroader.gui import main
 if __name__ == '__main__':
+    if getattr(sys, 'frozen', False):
+        # Lets frozen image-scan workers start; a no-op otherwise
+        import multiprocessing
+        multiprocessing.freeze_support()
     main()
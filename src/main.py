@@ -1,14 +1,21 @@
+# First, so that it times the imports below
+from reroader import bootstrap  # noqa: F401
 import argparse
 import pprint
+import sys
+from pathlib import Path
 
-from reroader.roa import ROA_DIR, RoaCategoriesFile, RoaOrderFile
-from reroader.yaml_sync import yaml, load_yaml_state, sync_characters_to_yaml, sync_yaml_to_roa, roa_zip_chars
-from reroader.interactive import edit_interactive
+from reroader import cli, startup
+from reroader.logbuffer import setup_logging
+from reroader.profiling import DEFAULT_TRACE_PATH, enable, enabled, summary
+from reroader.roa import RoaCategoriesFile, RoaOrderFile, default_roa_dir
+from reroader.yaml_sync import get_yaml, load_yaml_state, sync_characters_to_yaml, sync_yaml_to_roa, roa_zip_chars, apply_rules_to_yaml
+from reroader.rules import load_rules
 
 
 if __name__ == '__main__':
-    order_roa = RoaOrderFile(ROA_DIR / 'order.roa')
-    categories_roa = RoaCategoriesFile(ROA_DIR / 'categories.roa')
+    startup.mark("imports")
+    setup_logging()
 
     parser = argparse.ArgumentParser(
         description="()",
@@ -16,18 +23,44 @@ if __name__ == '__main__':
     )
 
     parser.add_argument("--interactive", "-i", action="store_true")
+    parser.add_argument("--rules", "-r", type=Path, help="Auto-categorize characters with a rules file")
+    # Looked up on first use; %(default).0s keeps the formatter from
+    # appending "(default: None)"
+    parser.add_argument("--roa-dir", type=Path, default=None, help="Folder with order.roa and categories.roa (default: REROADER_ROA_DIR or the game's folder)%(default).0s")
+    parser.add_argument("--profile", nargs='?', type=Path, const=DEFAULT_TRACE_PATH, help="Record timings and write a Chrome trace on exit")
+    cli.add_commands(parser.add_subparsers(title="commands", description="Headless commands; each streams JSON lines to stdout", dest='command'))
     args = parser.parse_args()
+    if args.profile:
+        enable(args.profile)
+
+    if args.command:
+        sys.exit(cli.run(args))
+
+    roa_dir = args.roa_dir or default_roa_dir()
+    order_roa = RoaOrderFile(roa_dir / 'order.roa')
+    categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
+    startup.mark("loaded")
 
     sync_characters_to_yaml(order_roa, categories_roa)
 
+    if args.rules:
+        moved = apply_rules_to_yaml(order_roa, categories_roa, load_rules(args.rules))
+        print("Rules moved", moved, "characters")
+
     if args.interactive:
+        # prompt_toolkit is only needed here
+        from reroader.interactive import edit_interactive
+
         yaml_state = load_yaml_state(order_roa, categories_roa)
         edit_interactive(yaml_state)
         with open("sort.yaml", "w", encoding="utf-8") as fp:
-            yaml.dump(yaml_state, fp)
+            get_yaml().dump(yaml_state, fp)
         pprint.pprint(roa_zip_chars(order_roa, categories_roa))
 
     sync_yaml_to_roa(order_roa, categories_roa)
 
     order_roa.save_file()
     categories_roa.save_file()
+
+    if enabled():
+        print(summary(limit=8))
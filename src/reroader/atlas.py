@@ -0,0 +1,142 @@
+import heapq
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from .cache import cache_dir, load_json, save_json
+
+# index.json maps image path -> [mtime_ns, sheet, cell, width, height]
+IndexEntry = list
+
+
+class ThumbnailAtlas():
+    # Pre-scaled thumbnails of a single size, packed into a few sprite sheets
+    # on disk. Warm starts open one sheet per ~256 images and crop rows out of
+    # it, instead of opening and decoding every image file.
+    #
+    # Cells of images that were deleted are freed when the atlas is saved and
+    # reused, lowest first, by new images; sheets past the last used cell are
+    # deleted. An image that changed keeps its cell.
+
+    cols: int = 16
+    rows: int = 16
+    version: int = 1
+
+    def __init__(self, size: tuple[int, int], root: Optional[Path] = None) -> None:
+        self.size: tuple[int, int] = size
+        self.root: Path = (root or cache_dir() / 'atlas') / f"{size[0]}x{size[1]}"
+
+        self.lock = threading.Lock()
+        self.sheets: dict[int, Image.Image] = {}
+        self.dirty_sheets: set[int] = set()
+        self.dirty: bool = False
+
+        index = load_json(self.root / 'index.json', {})
+        if index.get('version') != self.version:
+            index = {}
+        self.entries: dict[str, IndexEntry] = index.get('entries', {})
+        self.next_cell: int = index.get('next_cell', 0)
+        # Heap of cells below next_cell that no entry uses
+        used = {sheet * self.cells_per_sheet + cell for _, sheet, cell, _, _ in self.entries.values()}
+        self.free_cells: list[int] = [cell for cell in range(self.next_cell) if cell not in used]
+
+    @property
+    def cells_per_sheet(self) -> int:
+        return self.cols * self.rows
+
+    def sheet_path(self, sheet: int) -> Path:
+        return self.root / f"sheet_{sheet}.png"
+
+    def _sheet(self, sheet: int) -> Image.Image:
+        if sheet not in self.sheets:
+            try:
+                with Image.open(self.sheet_path(sheet), formats=('png',)) as img:
+                    img.load()
+                    self.sheets[sheet] = img.convert('RGBA')
+            except (OSError, ValueError):
+                self.sheets[sheet] = Image.new(
+                    'RGBA', (self.size[0] * self.cols, self.size[1] * self.rows)
+                )
+        return self.sheets[sheet]
+
+    def _cell_box(self, cell: int, width: int, height: int) -> tuple[int, int, int, int]:
+        col, row = divmod(cell, self.rows)
+        x, y = col * self.size[0], row * self.size[1]
+        return (x, y, x + width, y + height)
+
+    def lookup(self, path: str, mtime_ns: int) -> Optional[Image.Image]:
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != mtime_ns:
+                return None
+            _, sheet, cell, width, height = entry
+            return self._sheet(sheet).crop(self._cell_box(cell, width, height))
+
+    def add(self, path: str, mtime_ns: int, image: Image.Image) -> None:
+        if image.width > self.size[0] or image.height > self.size[1]:
+            return
+        with self.lock:
+            if path in self.entries:
+                _, sheet, cell, _, _ = self.entries[path]
+            elif self.free_cells:
+                sheet, cell = divmod(heapq.heappop(self.free_cells), self.cells_per_sheet)
+            else:
+                sheet, cell = divmod(self.next_cell, self.cells_per_sheet)
+                self.next_cell += 1
+
+            sheet_img = self._sheet(sheet)
+            box = self._cell_box(cell, *self.size)
+            sheet_img.paste((0, 0, 0, 0), box)
+            sheet_img.paste(image, box[:2])
+
+            self.entries[path] = [mtime_ns, sheet, cell, image.width, image.height]
+            self.dirty_sheets.add(sheet)
+            self.dirty = True
+
+    def _prune(self) -> int:
+        # Frees the cells of images that no longer exist; call with the lock
+        # held. Returns the number of entries dropped.
+        gone = [path for path in self.entries if not os.path.exists(path)]
+        if not gone:
+            return 0
+        free = set(self.free_cells)
+        for path in gone:
+            _, sheet, cell, _, _ = self.entries.pop(path)
+            free.add(sheet * self.cells_per_sheet + cell)
+        # Free cells at the end give the space back instead of waiting for reuse
+        while self.next_cell - 1 in free:
+            self.next_cell -= 1
+            free.discard(self.next_cell)
+        # A sorted list is a valid heap
+        self.free_cells = sorted(free)
+        self.dirty = True
+        return len(gone)
+
+    def save(self) -> None:
+        with self.lock:
+            self._prune()
+            if not self.dirty:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            sheet_count = -(-self.next_cell // self.cells_per_sheet)
+            for sheet in sorted(self.dirty_sheets):
+                if sheet < sheet_count:
+                    tmp_path = self.sheet_path(sheet).with_suffix('.tmp')
+                    self.sheets[sheet].save(tmp_path, format='png')
+                    os.replace(tmp_path, self.sheet_path(sheet))
+            # Sheets are numbered without gaps
+            sheet = sheet_count
+            while self.sheet_path(sheet).exists():
+                self.sheet_path(sheet).unlink()
+                self.sheets.pop(sheet, None)
+                sheet += 1
+            save_json(self.root / 'index.json', {
+                'version': self.version,
+                'next_cell': self.next_cell,
+                'entries': self.entries,
+            })
+            self.dirty_sheets.clear()
+            self.dirty = False
@@ -0,0 +1,6 @@
+from . import startup
+
+# Imported by the entry scripts before anything else: starts the import timer
+# (see startup.py) so that every module imported after this one is timed.
+
+startup.start_import_timer()
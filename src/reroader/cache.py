@@ -0,0 +1,33 @@
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any
+
+
+def cache_dir() -> Path:
+    if env_dir := os.environ.get('REROADER_CACHE_DIR'):
+        path = Path(env_dir)
+    elif sys.platform == 'win32' and 'LOCALAPPDATA' in os.environ:
+        path = Path(os.environ['LOCALAPPDATA']) / 'reroader' / 'cache'
+    else:
+        path = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'reroader'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def load_json(path: Path, default: Any) -> Any:
+    try:
+        with open(path, 'r', encoding='utf-8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path: Path, data: Any) -> None:
+    # Write-then-rename so a crash never leaves a truncated cache behind
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as fp:
+        json.dump(data, fp)
+    os.replace(tmp_path, path)
@@ -0,0 +1,505 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, Optional
+
+from .diskusage import scan_disk_usage
+from .entryindex import REPAIRABLE, EntryIndex, repair
+from .layout import FlatLayout, LayoutModel, category_spans, diff_layouts, read_flat_layout
+from .maintenance import maintain_targets, summary_record
+from .profiles import ProfileError, ProfileStore, UnknownProfile
+from .roa import RoaCategoriesFile, RoaCategory, RoaEntry, RoaFormatError, RoaOrderFile, default_roa_dir, roa_dirs, workshop_roots
+from .rules import RulesError, apply_rules, load_rules
+
+# Headless subcommands for main.py. Every command writes newline-delimited
+# JSON to stdout, one record per line as it's produced, so the output can be
+# piped through jq or another process. Each record has a "kind". Logging goes
+# to stderr.
+#
+# Commands only load what they need. Nothing here parses config.ini unless
+# the command works on metadata (list --metadata, apply-rules), and nothing
+# goes through sort.yaml.
+#
+# export writes the layout as "category" and "entry" records in file order;
+# a category record starts a category at the current position of the
+# character list. import reads the same stream back.
+
+Record = dict[str, Any]
+
+
+class LayoutFormatError(ValueError):
+    # A line of an import stream that isn't a layout record
+    pass
+
+
+# Bad input rather than a bug: run() reports these as a problem record
+INPUT_ERRORS: tuple[type[Exception], ...] = (FileNotFoundError, LayoutFormatError, ProfileError, RoaFormatError, RulesError)
+
+
+def load_order(roa_dir: Path) -> RoaOrderFile:
+    # As on disk, without pruning or scanning
+    return RoaOrderFile(roa_dir / 'order.roa', scan=False)
+
+
+def resolve_roa_dir(args: argparse.Namespace) -> Path:
+    # --roa-dir, else the default folder, looked up only by commands that
+    # use it
+    if args.roa_dir is None:
+        args.roa_dir = default_roa_dir()
+    return args.roa_dir
+
+
+def failure_record(e: Exception) -> Record:
+    # For errors that end a command early
+    if isinstance(e, FileNotFoundError):
+        return {'kind': 'problem', 'check': 'missing', 'message': "File doesn't exist", 'file': e.filename}
+    if isinstance(e, UnknownProfile):
+        return {'kind': 'problem', 'check': 'not_found', 'message': str(e)}
+    return {'kind': 'problem', 'check': 'invalid', 'message': str(e)}
+
+
+def entry_record(group: str, index: int, entry: RoaEntry) -> Record:
+    return {'kind': 'entry', 'group': group, 'index': index, 'id': entry.id, 'path': entry.decode()}
+
+
+def character_labels(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile) -> list[str]:
+    # Category label of every character, by index
+    characters = order_roa.groups['characters']
+    labels: list[str] = [''] * len(characters)
+    for label, start, end in category_spans(categories_roa.categories, len(characters)):
+        labels[start:end] = [label] * (end - start)
+    return labels
+
+
+def read_layout(lines: Iterable[str]) -> tuple[OrderedDict[str, list[bytes]], Optional[list[RoaCategory]]]:
+    # Inverse of export. Categories are None if the stream has no characters
+    groups: OrderedDict[str, list[bytes]] = OrderedDict()
+    categories: list[RoaCategory] = []
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            kind = record['kind']
+            if kind == 'category':
+                categories.append(RoaCategory(len(groups.get('characters', ())), record['category'].encode('utf-8')))
+            elif kind == 'entry':
+                group = record['group']
+                if group not in RoaOrderFile.group_labels:
+                    raise ValueError(f"unknown group {group!r}")
+                groups.setdefault(group, []).append(record['path'].encode('utf-8'))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise LayoutFormatError(f"line {lineno}: {e}") from e
+    if categories:
+        groups.setdefault('characters', [])
+    return groups, categories if 'characters' in groups else None
+
+
+def read_layout_from(path: Path) -> FlatLayout:
+    # A workshop folder or an export file
+    if path.is_dir():
+        return read_flat_layout(path)
+    with open(path, 'r', encoding='utf-8') as fp:
+        groups, categories = read_layout(fp)
+    return groups, categories or []
+
+
+# Commands
+
+def cmd_list(args: argparse.Namespace) -> Iterator[Record]:
+    roa_dir = resolve_roa_dir(args)
+    order_roa = load_order(roa_dir)
+    groups = args.group or list(order_roa.groups)
+    labels: list[str] = []
+    if 'characters' in groups:
+        labels = character_labels(order_roa, RoaCategoriesFile(roa_dir / 'categories.roa'))
+
+    for group in groups:
+        for i, entry in enumerate(order_roa.groups[group]):
+            if args.category is not None and (group != 'characters' or labels[i] != args.category):
+                continue
+            record = entry_record(group, i, entry)
+            if group == 'characters':
+                record['category'] = labels[i]
+            if args.metadata:
+                record.update(name=entry.name, author=entry.author, version=entry.version)
+            yield record
+
+
+def cmd_stats(args: argparse.Namespace) -> Iterator[Record]:
+    roa_dir = resolve_roa_dir(args)
+    order_roa = load_order(roa_dir)
+    categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
+
+    usage: dict[str, int] = {}
+    if args.sizes:
+        usage = scan_disk_usage(e.decode() for group in order_roa.groups.values() for e in group)
+
+    total = 0
+    for group, entries in order_roa.groups.items():
+        record: Record = {'kind': 'group', 'group': group, 'entries': len(entries)}
+        if args.disk:
+            record['missing'] = sum(not os.path.isdir(e.directory) for e in entries)
+        if args.sizes:
+            record['bytes'] = sum(usage[e.decode()] for e in entries)
+        total += len(entries)
+        yield record
+
+    characters = order_roa.groups['characters']
+    spans = category_spans(categories_roa.categories, len(characters))
+    sizes: Counter[str] = Counter()
+    category_bytes: Counter[str] = Counter()
+    for label, start, end in spans:
+        sizes[label] += end - start
+        if args.sizes:
+            category_bytes[label] += sum(usage[e.decode()] for e in characters[start:end])
+    for label, size in sizes.items():
+        record = {'kind': 'category', 'category': label, 'entries': size}
+        if args.sizes:
+            record['bytes'] = category_bytes[label]
+        yield record
+
+    if args.sizes:
+        group_of = {e.value: group for group, entries in order_roa.groups.items() for e in entries}
+        for path, size in sorted(usage.items(), key=lambda kv: kv[1], reverse=True)[:args.largest]:
+            yield {'kind': 'largest', 'group': group_of[path.encode('utf-8')], 'id': Path(path).name, 'path': path, 'bytes': size}
+    record = {'kind': 'total', 'entries': total, 'categories': len(sizes)}
+    if args.sizes:
+        record['bytes'] = sum(usage.values())
+    yield record
+
+
+def cmd_export(args: argparse.Namespace) -> Iterator[Record]:
+    roa_dir = resolve_roa_dir(args)
+    order_roa = load_order(roa_dir)
+    categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
+    # Stable by index, so categories sharing an index keep their file order
+    categories = sorted(categories_roa.categories, key=lambda c: c.index)
+
+    c = 0
+    for group, entries in order_roa.groups.items():
+        for i, entry in enumerate(entries):
+            if group == 'characters':
+                while c < len(categories) and categories[c].index <= i:
+                    yield {'kind': 'category', 'category': categories[c].label.decode('utf-8')}
+                    c += 1
+            yield entry_record(group, i, entry)
+        if group == 'characters':
+            for category in categories[c:]:
+                yield {'kind': 'category', 'category': category.label.decode('utf-8')}
+
+
+def cmd_import(args: argparse.Namespace) -> Iterator[Record]:
+    """
+    Importing an export gives the same files, byte for byte.
+
+    >>> import io, tempfile
+    >>> tmp = Path(tempfile.mkdtemp())
+    >>> order_roa = RoaOrderFile(tmp / 'order.roa', load=False)
+    >>> order_roa.groups.update((label, []) for label in order_roa.group_labels)
+    >>> order_roa.groups['characters'] = [RoaEntry(b'/workshop/%d' % i) for i in range(5)]
+    >>> order_roa.groups['buddies'] = [RoaEntry(b'/workshop/9')]
+    >>> order_roa.save_file()
+    >>> categories_roa = RoaCategoriesFile(tmp / 'categories.roa', load=False)
+    >>> categories_roa.categories = [RoaCategory(0, b'a'), RoaCategory(2, b'b'), RoaCategory(2, b'c'), RoaCategory(5, b'd')]
+    >>> categories_roa.save_file()
+    >>> saved = {f: (tmp / f).read_bytes() for f in ('order.roa', 'categories.roa')}
+    >>> out = io.StringIO()
+    >>> run(argparse.Namespace(roa_dir=tmp, command_fn=cmd_export), out)
+    0
+    >>> _ = (tmp / 'layout.jsonl').write_text(out.getvalue(), encoding='utf-8')
+    >>> order_roa.groups['characters'].reverse()
+    >>> order_roa.save_file()
+    >>> RoaCategoriesFile(tmp / 'categories.roa', load=False).save_file()
+    >>> run(argparse.Namespace(roa_dir=tmp, file=tmp / 'layout.jsonl', dry_run=False, command_fn=cmd_import), io.StringIO())
+    0
+    >>> all((tmp / f).read_bytes() == data for f, data in saved.items())
+    True
+    """
+    roa_dir = resolve_roa_dir(args)
+    if str(args.file) == '-':
+        groups, categories = read_layout(sys.stdin)
+    else:
+        with open(args.file, 'r', encoding='utf-8') as fp:
+            groups, categories = read_layout(fp)
+
+    order_roa = load_order(roa_dir)
+    for group, values in groups.items():
+        order_roa.groups[group] = [RoaEntry(v) for v in values]
+        missing = sum(not os.path.isdir(e.directory) for e in order_roa.groups[group])
+        yield {'kind': 'imported', 'group': group, 'entries': len(values), 'missing': missing}
+
+    categories_roa: Optional[RoaCategoriesFile] = None
+    if categories is not None:
+        categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
+        categories_roa.categories = categories
+        yield {'kind': 'imported', 'group': 'categories', 'entries': len(categories)}
+
+    if not args.dry_run:
+        order_roa.save_file()
+        if categories_roa is not None:
+            categories_roa.save_file()
+
+
+def cmd_apply_rules(args: argparse.Namespace) -> Iterator[Record]:
+    roa_dir = resolve_roa_dir(args)
+    ruleset = load_rules(args.rules)
+    order_roa = RoaOrderFile(roa_dir / 'order.roa')
+    categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
+    layout = LayoutModel.from_roa(order_roa, categories_roa)
+
+    new_state, moved = apply_rules(layout, ruleset)
+    for label, entries in new_state.items():
+        for entry in entries:
+            old_label = layout.category_of(entry)
+            if old_label != label:
+                yield {'kind': 'moved', 'id': entry.id, 'path': entry.decode(), 'name': entry.name, 'from': old_label, 'to': label}
+    yield {'kind': 'summary', 'moved': moved}
+
+    if moved and not args.dry_run:
+        layout.replace(new_state)
+        layout.to_roa(order_roa, categories_roa)
+        order_roa.save_file()
+        categories_roa.save_file()
+
+
+def cmd_validate(args: argparse.Namespace) -> Iterator[Record]:
+    # Structure only: no config.ini is read, only directories are stat'ed
+    roa_dir = resolve_roa_dir(args)
+    problems = 0
+
+    def problem(check: str, message: str, **fields) -> Record:
+        nonlocal problems
+        problems += 1
+        return {'kind': 'problem', 'check': check, 'message': message, **fields}
+
+    order_roa = RoaOrderFile(roa_dir / 'order.roa', load=False)
+    try:
+        data = order_roa.roa_path.read_bytes()
+    except FileNotFoundError:
+        yield problem('order.missing', "File doesn't exist", file=str(order_roa.roa_path))
+        yield {'kind': 'summary', 'problems': problems}
+        return
+    try:
+        if not order_roa.check_file_header(data):
+            raise ValueError("Bad header")
+        order_roa.load_bytes(data)
+    except (AssertionError, ValueError, IndexError, struct.error) as e:
+        yield problem('order.parse', str(e) or "Truncated or malformed file", file=str(order_roa.roa_path))
+        yield {'kind': 'summary', 'problems': problems}
+        return
+    for warning in order_roa.parse_warnings:
+        yield problem('order.count', warning)
+    if order_roa.encode_bytes() != data:
+        yield problem('order.roundtrip', "Re-encoding order.roa doesn't reproduce the file")
+
+    index = EntryIndex(order_roa.groups)
+    for issue in index.duplicates():
+        yield problem('duplicate', "Entry is listed more than once", group=issue.group, index=issue.index, path=issue.path, **issue.detail)
+    if args.disk:
+        for issue in index.orphans():
+            yield problem('missing', "Entry folder doesn't exist", group=issue.group, index=issue.index, path=issue.path)
+
+    categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa', load=False)
+    try:
+        data = categories_roa.roa_path.read_bytes()
+        categories_roa.load_bytes(data)
+    except FileNotFoundError:
+        yield problem('categories.missing', "File doesn't exist", file=str(categories_roa.roa_path))
+    except (AssertionError, IndexError, struct.error) as e:
+        yield problem('categories.parse', str(e) or "Truncated or malformed file", file=str(categories_roa.roa_path))
+    else:
+        if categories_roa.encode_bytes() != data:
+            yield problem('categories.roundtrip', "Re-encoding categories.roa doesn't reproduce the file")
+        count = len(order_roa.groups['characters'])
+        previous = 0
+        for category in categories_roa.categories:
+            label = category.label.decode('utf-8', 'replace')
+            if category.index > count:
+                yield problem('category.range', "Category starts past the last character", category=label, index=category.index, characters=count)
+            if category.index < previous:
+                yield problem('category.order', "Category starts before the one listed above it", category=label, index=category.index)
+            previous = max(previous, category.index)
+
+    yield {'kind': 'summary', 'problems': problems}
+
+
+def cmd_check(args: argparse.Namespace) -> Iterator[Record]:
+    # Duplicate, shared-ID, orphaned and (with --types) misfiled entries
+    roa_dir = resolve_roa_dir(args)
+    order_roa = load_order(roa_dir)
+    index = EntryIndex(order_roa.groups)
+    issues = []
+    for issue in index.issues(disk=args.disk, types=args.types):
+        issues.append(issue)
+        yield issue.record()
+
+    summary: Record = {'kind': 'summary', 'entries': len(index), 'issues': len(issues), 'problems': len(issues)}
+    if args.repair:
+        categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
+        summary['repaired'] = repair(order_roa, categories_roa, issues)
+        if summary['repaired'] and not args.dry_run:
+            order_roa.save_file()
+            categories_roa.save_file()
+            # What's left is for the user to sort out
+            summary['problems'] = sum(issue.check not in REPAIRABLE for issue in issues)
+    yield summary
+
+
+def cmd_diff(args: argparse.Namespace) -> Iterator[Record]:
+    # From the layout in args.base to the one in --roa-dir
+    changes = 0
+    for record in diff_layouts(read_layout_from(args.base), read_layout_from(resolve_roa_dir(args))):
+        changes += 1
+        yield record
+    yield {'kind': 'summary', 'changes': changes}
+
+
+def cmd_maintain(args: argparse.Namespace) -> Iterator[Record]:
+    # Targets: --target, else REROADER_ROA_DIRS, else --roa-dir
+    targets = args.target or (roa_dirs() if os.environ.get('REROADER_ROA_DIRS') else [resolve_roa_dir(args)])
+    roots = [*workshop_roots(), *(args.root or ())]
+    start = time.perf_counter()
+    reports = []
+    for report in maintain_targets(targets, roots, args.rules, args.dry_run, args.workers):
+        reports.append(report)
+        yield report.record()
+    yield summary_record(reports, time.perf_counter() - start)
+
+
+def cmd_profile_list(args: argparse.Namespace) -> Iterator[Record]:
+    store = ProfileStore(args.store)
+    active = store.active(resolve_roa_dir(args))
+    for profile in store.profiles():
+        yield {**profile.record(), 'active': profile.name == active}
+
+
+def cmd_profile_save(args: argparse.Namespace) -> Iterator[Record]:
+    profile, new_chunks = ProfileStore(args.store).save(args.name, resolve_roa_dir(args))
+    yield {**profile.record(), 'new_chunks': new_chunks}
+
+
+def cmd_profile_activate(args: argparse.Namespace) -> Iterator[Record]:
+    ProfileStore(args.store).activate(args.name, resolve_roa_dir(args), backup=args.backup)
+    yield {'kind': 'activated', 'name': args.name}
+
+
+def cmd_profile_diff(args: argparse.Namespace) -> Iterator[Record]:
+    # From profile `name` to profile `other`, or to the live files
+    store = ProfileStore(args.store)
+    new_layout = store.layout(args.other) if args.other else read_layout_from(resolve_roa_dir(args))
+    changes = 0
+    for record in diff_layouts(store.layout(args.name), new_layout):
+        changes += 1
+        yield record
+    yield {'kind': 'summary', 'changes': changes}
+
+
+def cmd_profile_delete(args: argparse.Namespace) -> Iterator[Record]:
+    freed = ProfileStore(args.store).delete(args.name)
+    yield {'kind': 'deleted', 'name': args.name, 'freed_chunks': freed}
+
+
+def add_commands(subparsers: Any) -> None:
+    groups = RoaOrderFile.group_labels
+
+    p = subparsers.add_parser('list', help="Stream entries")
+    p.add_argument("--group", "-g", action='append', choices=groups, help="Only this group (repeatable)")
+    p.add_argument("--category", "-c", help="Only characters in this category")
+    p.add_argument("--metadata", "-m", action='store_true', help="Add name, author and version (reads every config.ini)")
+    p.set_defaults(command_fn=cmd_list)
+
+    p = subparsers.add_parser('stats', help="Entry counts per group and category")
+    p.add_argument("--disk", action='store_true', help="Also count entries whose folder is missing")
+    p.add_argument("--sizes", "-s", action='store_true', help="Add disk usage in bytes, and list the largest entries (cached by folder mtime)")
+    p.add_argument("--largest", type=int, default=10, metavar='N', help="With --sizes, how many of the largest entries to list")
+    p.set_defaults(command_fn=cmd_stats)
+
+    p = subparsers.add_parser('export', help="Write the layout as category and entry records")
+    p.set_defaults(command_fn=cmd_export)
+
+    p = subparsers.add_parser('import', help="Replace the layout with an export stream")
+    p.add_argument("file", type=Path, help="Export file, or - for stdin")
+    p.add_argument("--dry-run", "-n", action='store_true', help="Report without saving")
+    p.set_defaults(command_fn=cmd_import)
+
+    p = subparsers.add_parser('apply-rules', help="Categorize characters with a rules file")
+    p.add_argument("rules", type=Path)
+    p.add_argument("--dry-run", "-n", action='store_true', help="Report without saving")
+    p.set_defaults(command_fn=cmd_apply_rules)
+
+    p = subparsers.add_parser('validate', help="Check the ROA files without reading any config.ini")
+    p.add_argument("--no-disk", dest='disk', action='store_false', help="Don't check that entry folders exist")
+    p.set_defaults(command_fn=cmd_validate)
+
+    p = subparsers.add_parser('check', help="Find duplicate, orphaned and misfiled entries")
+    p.add_argument("--no-disk", dest='disk', action='store_false', help="Don't check that entry folders exist")
+    p.add_argument("--types", action='store_true', help="Also check each entry's group against its config.ini type (reads every config.ini)")
+    p.add_argument("--repair", action='store_true', help="Drop duplicates and orphans, move misfiled entries to their group, and save")
+    p.add_argument("--dry-run", "-n", action='store_true', help="With --repair, report without saving")
+    p.set_defaults(command_fn=cmd_check)
+
+    p = subparsers.add_parser('diff', help="Changes from BASE to the current layout")
+    p.add_argument("base", type=Path, help="Workshop folder or export file")
+    p.set_defaults(command_fn=cmd_diff)
+
+    p = subparsers.add_parser('maintain', help="Prune, scan and save several targets in parallel")
+    p.add_argument("--target", "-t", type=Path, action='append', help="Folder with order.roa and categories.roa (repeatable; default: REROADER_ROA_DIRS, else --roa-dir)")
+    p.add_argument("--root", type=Path, action='append', help="Extra workshop folder to scan for new entries (repeatable; adds to REROADER_WORKSHOP_ROOTS)")
+    p.add_argument("--rules", "-r", type=Path, help="Also apply a rules file")
+    p.add_argument("--workers", "-j", type=int, help="Worker processes (default: one per target, up to the CPU count)")
+    p.add_argument("--dry-run", "-n", action='store_true', help="Report without saving")
+    p.set_defaults(command_fn=cmd_maintain)
+
+    p = subparsers.add_parser('profile', help="Named snapshots of the ROA files")
+    p.add_argument("--store", type=Path, help="Profile store folder (default: REROADER_PROFILE_DIR or the user data folder)")
+    actions = p.add_subparsers(dest='profile_action', required=True)
+    actions.add_parser('list', help="List profiles").set_defaults(command_fn=cmd_profile_list)
+    a = actions.add_parser('save', help="Snapshot the current files")
+    a.add_argument("name")
+    a.set_defaults(command_fn=cmd_profile_save)
+    a = actions.add_parser('activate', help="Swap the files for a profile's")
+    a.add_argument("name")
+    a.add_argument("--no-backup", dest='backup', action='store_false', help="Don't snapshot the current files as _previous first")
+    a.set_defaults(command_fn=cmd_profile_activate)
+    a = actions.add_parser('diff', help="Changes from a profile to another, or to the current files")
+    a.add_argument("name")
+    a.add_argument("other", nargs='?')
+    a.set_defaults(command_fn=cmd_profile_diff)
+    a = actions.add_parser('delete', help="Delete a profile and its unshared chunks")
+    a.add_argument("name")
+    a.set_defaults(command_fn=cmd_profile_delete)
+
+
+def run(args: argparse.Namespace, out: IO[str] = sys.stdout) -> int:
+    # Exit status 1 if validate or check found problems, diff found changes,
+    # maintain had a target fail, or a command failed on a missing file,
+    # unknown profile or invalid input (reported as a problem record)
+    last: Record = {}
+
+    def write(record: Record) -> None:
+        # Flushed per record, so a reader sees each one as it's produced
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write('\n')
+        out.flush()
+
+    try:
+        try:
+            for record in args.command_fn(args):
+                write(record)
+                last = record
+        except INPUT_ERRORS as e:
+            write(failure_record(e))
+            last = {'kind': 'summary', 'problems': 1}
+            write(last)
+    except BrokenPipeError:
+        # The reader went away, e.g. `| head`
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    return 1 if last.get('problems') or last.get('changes') or last.get('failed') else 0
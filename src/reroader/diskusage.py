@@ -0,0 +1,125 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Mapping, Optional
+
+from .cache import cache_dir, load_json, save_json
+from .profiling import count, timed
+
+# Disk usage of workshop entries. Entry folders are handed to a thread pool in
+# batches (DiskUsageCache.batch_size, 64 per task) and walked with os.scandir
+# (the syscalls release the GIL), and every folder's listing is cached with
+# its mtime:
+#
+#   path -> [mtime_ns, bytes of the files directly inside, [subfolder names]]
+#
+# A rescan stats each known folder and only lists the ones whose mtime
+# changed, i.e. that had files added, removed or renamed. Files rewritten in
+# place don't touch their folder's mtime, so their new size shows once
+# something else changes in that folder.
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    value = size / 1024
+    for unit in ('KB', 'MB'):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def _forget(path: str, cached: Mapping[str, list], changes: dict[str, Optional[list]]) -> None:
+    # A folder and everything cached below it is gone
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        node = cached.get(current)
+        if node is not None:
+            changes[current] = None
+            stack.extend(os.path.join(current, name) for name in node[2])
+
+
+def walk_usage(path: str, cached: Mapping[str, list]) -> tuple[int, dict[str, Optional[list]]]:
+    # (total bytes under path, changed nodes: None for folders that are gone).
+    # Only reads `cached`, so walks can share it.
+    total = 0
+    changes: dict[str, Optional[list]] = {}
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        node = cached.get(current)
+        try:
+            mtime_ns = os.stat(current).st_mtime_ns
+        except OSError:
+            _forget(current, cached, changes)
+            continue
+        if node is None or node[0] != mtime_ns:
+            size = 0
+            names = []
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                names.append(entry.name)
+                            else:
+                                size += entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue
+            except OSError:
+                _forget(current, cached, changes)
+                continue
+            if node is not None:
+                for name in set(node[2]).difference(names):
+                    _forget(os.path.join(current, name), cached, changes)
+            node = [mtime_ns, size, names]
+            changes[current] = node
+        total += node[1]
+        stack.extend(os.path.join(current, name) for name in node[2])
+    return total, changes
+
+
+class DiskUsageCache():
+    batch_size: int = 64
+
+    def __init__(self, cache_path: Optional[Path] = None) -> None:
+        self.cache_path: Path = cache_path or cache_dir() / 'disk_usage.json'
+        self.nodes: dict[str, list] = load_json(self.cache_path, {})
+
+    @timed('disk.scan')
+    def scan(self, paths: Iterable[str], workers: Optional[int] = None) -> dict[str, int]:
+        # Entry folder -> bytes; folders that don't exist count as 0
+        paths = list(dict.fromkeys(paths))
+        # Entries are small; handing them out in batches keeps the pool's
+        # per-task overhead from dominating
+        batches = [paths[i:i + self.batch_size] for i in range(0, len(paths), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='disk-usage') as pool:
+            walked = [
+                result
+                for batch in pool.map(lambda b: [walk_usage(p, self.nodes) for p in b], batches)
+                for result in batch
+            ]
+
+        results: dict[str, int] = {}
+        changed = 0
+        for path, (total, changes) in zip(paths, walked):
+            results[path] = total
+            for node_path, node in changes.items():
+                if node is None:
+                    self.nodes.pop(node_path, None)
+                else:
+                    self.nodes[node_path] = node
+            changed += len(changes)
+        if changed:
+            count('disk.rescanned', changed)
+            self.save()
+        return results
+
+    def save(self) -> None:
+        save_json(self.cache_path, self.nodes)
+
+
+def scan_disk_usage(paths: Iterable[str], workers: Optional[int] = None) -> dict[str, int]:
+    return DiskUsageCache().scan(paths, workers=workers)
@@ -0,0 +1,148 @@
+import os
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Mapping
+
+from .layout import LayoutModel
+from .profiling import timed
+from .roa import RoaCategoriesFile, RoaEntry, RoaOrderFile
+
+# Index over the entries of order.roa, built in one pass over the groups:
+# workshop ID -> folders, and folder -> (group, index) positions. From it,
+# in time linear in the number of entries:
+#
+#   duplicate    a folder listed more than once; the first listing is kept
+#   same_id      one workshop ID in folders under several roots, e.g. a Steam
+#                library and a local copy (reported, never repaired: both
+#                folders exist, so scanning would list them again)
+#   orphan       a listed folder that doesn't exist anymore (stats it)
+#   wrong_group  a folder whose config.ini type isn't the group it's listed
+#                in (reads every config.ini)
+#
+# repair() drops duplicates and orphans and moves wrong_group entries to the
+# end of their group, rebuilding each group once.
+
+Position = tuple[str, int]
+
+REPAIRABLE: frozenset[str] = frozenset({'duplicate', 'orphan', 'wrong_group'})
+
+
+@dataclass
+class EntryIssue():
+    check: str
+    group: str
+    index: int
+    path: str
+    detail: dict = field(default_factory=dict)
+
+    @property
+    def position(self) -> Position:
+        return (self.group, self.index)
+
+    def record(self) -> dict:
+        return {'kind': 'issue', 'check': self.check, 'group': self.group, 'index': self.index, 'path': self.path, **self.detail}
+
+
+class EntryIndex():
+    @timed('entries.index')
+    def __init__(self, groups: Mapping[str, list[RoaEntry]]) -> None:
+        # Distinct folders of each workshop ID, in order of first listing
+        self.paths_by_id: defaultdict[str, list[bytes]] = defaultdict(list)
+        self.positions: defaultdict[bytes, list[Position]] = defaultdict(list)
+        # First listed entry of each folder
+        self.entries: dict[bytes, RoaEntry] = {}
+        for group, entries in groups.items():
+            for i, entry in enumerate(entries):
+                positions = self.positions[entry.value]
+                if not positions:
+                    self.entries[entry.value] = entry
+                    self.paths_by_id[entry.id].append(entry.value)
+                positions.append((group, i))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def duplicates(self) -> Iterator[EntryIssue]:
+        for value, positions in self.positions.items():
+            first_group, first_index = positions[0]
+            for group, index in positions[1:]:
+                yield EntryIssue('duplicate', group, index, value.decode(), {'first_group': first_group, 'first_index': first_index})
+
+    def shared_ids(self) -> Iterator[EntryIssue]:
+        for id_, paths in self.paths_by_id.items():
+            if len(paths) < 2:
+                continue
+            for value in paths[1:]:
+                group, index = self.positions[value][0]
+                yield EntryIssue('same_id', group, index, value.decode(), {'id': id_, 'first_path': paths[0].decode()})
+
+    def orphans(self) -> Iterator[EntryIssue]:
+        for value, entry in self.entries.items():
+            if not os.path.isdir(entry.directory):
+                for group, index in self.positions[value]:
+                    yield EntryIssue('orphan', group, index, value.decode())
+
+    def wrong_groups(self) -> Iterator[EntryIssue]:
+        for value, entry in self.entries.items():
+            try:
+                expected = entry.type
+            except NotImplementedError:
+                # Missing or unreadable config.ini: nothing to compare
+                continue
+            for group, index in self.positions[value]:
+                if group != expected:
+                    yield EntryIssue('wrong_group', group, index, value.decode(), {'expected': expected})
+
+    def issues(self, disk: bool = True, types: bool = True) -> Iterator[EntryIssue]:
+        yield from self.duplicates()
+        yield from self.shared_ids()
+        if disk:
+            yield from self.orphans()
+        if types:
+            yield from self.wrong_groups()
+
+
+@timed('entries.repair')
+def repair(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile, issues: Iterable[EntryIssue]) -> int:
+    """
+    >>> import tempfile
+    >>> from pathlib import Path
+    >>> from reroader.roa import RoaCategory
+    >>> tmp = Path(tempfile.mkdtemp())
+    >>> one, gone, two = tmp / 'root' / '1', tmp / 'root' / '9', tmp / 'root' / '2'
+    >>> one.mkdir(parents=True); two.mkdir()
+    >>> order_roa = RoaOrderFile(tmp / 'order.roa', load=False)
+    >>> order_roa.groups.update((label, []) for label in order_roa.group_labels)
+    >>> order_roa.groups['characters'] = [RoaEntry(str(p).encode()) for p in (one, gone, two, one)]
+    >>> categories_roa = RoaCategoriesFile(tmp / 'categories.roa', load=False)
+    >>> categories_roa.categories = [RoaCategory(0, b'a'), RoaCategory(2, b'b')]
+    >>> issues = list(EntryIndex(order_roa.groups).issues(types=False))
+    >>> [(issue.check, issue.index) for issue in issues]
+    [('duplicate', 3), ('orphan', 1)]
+    >>> repair(order_roa, categories_roa, issues)
+    2
+    >>> [e.id for e in order_roa.groups['characters']], categories_roa.categories
+    (['1', '2'], [RoaCategory(index=0, label=b'a'), RoaCategory(index=1, label=b'b')])
+    """
+    # Returns the number of entries dropped or moved. Categories keep their
+    # characters; characters moved in from another group go to 'unsorted'.
+    drop: set[Position] = set()
+    moves: dict[Position, str] = {}
+    for issue in issues:
+        if issue.check in ('duplicate', 'orphan'):
+            drop.add(issue.position)
+        elif issue.check == 'wrong_group' and issue.detail['expected'] in order_roa.groups:
+            moves[issue.position] = issue.detail['expected']
+    if not drop and not moves:
+        return 0
+
+    layout = LayoutModel.from_roa(order_roa, categories_roa)
+    groups: dict[str, list[RoaEntry]] = {label: [] for label in order_roa.groups}
+    for label, entries in order_roa.groups.items():
+        for i, entry in enumerate(entries):
+            if (label, i) not in drop:
+                groups[moves.get((label, i), label)].append(entry)
+    order_roa.groups.update(groups)
+    layout.reconcile(order_roa.groups['characters'])
+    layout.to_roa(order_roa, categories_roa)
+    return len(drop) + len(moves.keys() - drop)
@@ -1,18 +1,32 @@
+import argparse
+import itertools
+import logging
 import os
 import sys
+import threading
 import tkinter as tk
 from tkinter import ttk
-from typing import Any, Generator
+from pathlib import Path
+from typing import Optional
 from tkinter import messagebox
-from PIL import ImageTk
-from PIL import Image
 
+from . import startup
 from .gui_pages import CharacterManagerFrame, DrivenFrame, ListManagerFrame
-from .roa import ROA_DIR, RoaCategoriesFile, RoaCategory, RoaEntry, RoaOrderFile
-from .yaml_sync import roa_zip_chars
+from .layout import LayoutModel
+from .logbuffer import RingBufferHandler, format_record, ring_buffer, setup_logging
+from .entryindex import EntryIndex
+from .gui_diagnostics import DiagnosticsWindow, LogViewerWindow
+from .gui_entries import EntryCheckWindow
+from .gui_profiles import ProfilesWindow
+from .latency import paused, ui_handler
+from .profiling import DEFAULT_TRACE_PATH, enable, enabled, summary, timed
+from .roa import RoaCategoriesFile, RoaEntry, RoaOrderFile, default_roa_dir
+from .search import SearchIndex
 
 _nogc = []
 
+logger = logging.getLogger(__name__)
+
 # Resolve bundled pyinstaller assets
 if getattr(sys, 'frozen', False):
     bundle_root: str = sys._MEIPASS  # type: ignore
@@ -21,6 +35,10 @@ elif __file__:
 
 
 class MainApp(tk.Tk):
+    # The status bar shows the last few log records, redrawn at most this often
+    status_lines: int = 3
+    status_interval_ms: int = 200
+
     def __init__(
         self,
         order_roa: RoaOrderFile,
@@ -29,21 +47,44 @@ class MainApp(tk.Tk):
         super().__init__()
         self.title("Re-ROAder")
 
-        ico = Image.open(os.path.join(bundle_root, 'icon.png'))
-        photo = ImageTk.PhotoImage(ico)
+        # Tk reads PNG itself, no need to load PIL before the window shows
+        photo = tk.PhotoImage(file=os.path.join(bundle_root, 'icon.png'))
         self.wm_iconphoto(False, photo)
 
         self.text_status: tk.StringVar = tk.StringVar(value="Status")
+        self.log_buffer: RingBufferHandler = ring_buffer()
+        self.status_seq: int = -1
+        self.var_search: tk.StringVar = tk.StringVar(value="")
+
+        self.search_index: SearchIndex = SearchIndex()
+        self.search_index_stale: bool = True
+        # Entry folder -> bytes, filled in after each load by a background scan
+        self.disk_usage: dict[str, int] = {}
+        # Image paths for the image scan thread to check next, and whether
+        # that thread is running; both guarded by the lock
+        self.image_scan_lock: threading.Lock = threading.Lock()
+        self.image_scan_paths: Optional[list[str]] = None
+        self.image_scan_running: bool = False
 
         self.order_roa: RoaOrderFile = order_roa
         self.categories_roa: RoaCategoriesFile = categories_roa
 
         self.childframes: list[DrivenFrame] = []
+        # Placeholder widget name -> list name, for tabs not built yet
+        self.pending_tabs: dict[str, str] = {}
         self.is_dirty: bool = False
+        self.diagnostics: Optional[DiagnosticsWindow] = None
+        self.log_viewer: Optional[LogViewerWindow] = None
+        self.profiles_window: Optional[ProfilesWindow] = None
+        self.entry_check: Optional[EntryCheckWindow] = None
 
         self.load_state_from_roa()
+        startup.mark("loaded")
 
         self.initwindow()
+        self.update_status()
+        startup.mark("window")
+        self.after_idle(startup.finish, "first idle")
 
         self.protocol("WM_DELETE_WINDOW", self.delete_window)
         self.mainloop()
@@ -57,6 +98,12 @@ class MainApp(tk.Tk):
             btn_folder = ttk.Button(
                 frame_btns, text="Open ROA folder",
                 command=self.open_folder)
+            btn_profiles = ttk.Button(
+                frame_btns, text="Profiles",
+                command=self.open_profiles)
+            btn_check = ttk.Button(
+                frame_btns, text="Check entries",
+                command=self.open_entry_check)
             btn_reload = ttk.Button(
                 frame_btns, text="🔄 Reload discarding changes",
                 command=self.load_state_from_roa)
@@ -66,27 +113,39 @@ class MainApp(tk.Tk):
                 underline=3
             )
 
+            lab_search = ttk.Label(frame_btns, text="🔍")
+            entry_search = ttk.Entry(frame_btns, textvariable=self.var_search)
+            entry_search.bind("<Return>", self.search_next)
+            self.var_search.trace_add('write', self.search_changed)
+
             btn_folder.pack(side=tk.LEFT)
+            btn_profiles.pack(side=tk.LEFT)
+            btn_check.pack(side=tk.LEFT)
+            lab_search.pack(side=tk.LEFT)
+            entry_search.pack(side=tk.LEFT)
             btn_reload.pack(side=tk.RIGHT)
             btn_export.pack(side=tk.RIGHT)
             return frame_btns
 
         def notebook():
             notebook = ttk.Notebook(self)
+            self.notebook = notebook
 
             frame_chars = CharacterManagerFrame(self)
             notebook.add(frame_chars, text="Characters")
             self.childframes.append(frame_chars)
 
             for simple_list in ['buddies', 'stages', 'skins']:
-                frame = ListManagerFrame(self, simple_list)
-                notebook.add(frame, text=simple_list.capitalize())
-                self.childframes.append(frame)
+                placeholder = tk.Frame(self)
+                notebook.add(placeholder, text=simple_list.capitalize())
+                self.pending_tabs[str(placeholder)] = simple_list
+            notebook.bind("<<NotebookTabChanged>>", self.build_pending_tab)
             return notebook
 
         def frame_info():
             frame_info = tk.Frame(self)
             lab_context_label = ttk.Label(frame_info, textvariable=self.text_status, relief=tk.GROOVE)
+            lab_context_label.bind("<Double-Button-1>", self.toggle_log_viewer)
 
             var_db = tk.IntVar(value=0)
             check_db = ttk.Checkbutton(
@@ -109,10 +168,63 @@ class MainApp(tk.Tk):
         frame_info().pack(fill='x', side=tk.BOTTOM)
 
         self.bind_all("<Control-s>", self.save_state_to_roas)
+        self.bind_all("<Control-D>", self.toggle_diagnostics)
+        self.bind_all("<Control-l>", self.toggle_log_viewer)
+
+    @ui_handler()
+    def build_pending_tab(self, event=None) -> None:  # noqa: ARG002
+        # The other lists are built on first visit instead of at startup.
+        # Every visit applies the current search to the tab.
+        selected = self.notebook.select()
+        list_name = self.pending_tabs.pop(selected, None)
+        if list_name is None:
+            self.apply_search()
+            return
+        frame = ListManagerFrame(self, list_name)
+        self.notebook.insert(selected, frame, text=list_name.capitalize())
+        self.notebook.select(frame)
+        self.nametowidget(selected).destroy()
+        self.childframes.append(frame)
+
+    def toggle_diagnostics(self, event=None) -> None:  # noqa: ARG002
+        # Hidden: Ctrl+Shift+D
+        if self.diagnostics is not None and self.diagnostics.winfo_exists():
+            self.diagnostics.close()
+            self.diagnostics = None
+        else:
+            self.diagnostics = DiagnosticsWindow(self)
+
+    def toggle_log_viewer(self, event=None) -> None:  # noqa: ARG002
+        # Ctrl+L, or double-click the status bar
+        if self.log_viewer is not None and self.log_viewer.winfo_exists():
+            self.log_viewer.close()
+            self.log_viewer = None
+        else:
+            self.log_viewer = LogViewerWindow(self, self.log_buffer)
+
+    @ui_handler()
+    def open_profiles(self, event=None) -> None:  # noqa: ARG002
+        if self.profiles_window is not None and self.profiles_window.winfo_exists():
+            self.profiles_window.lift()
+        else:
+            self.profiles_window = ProfilesWindow(self)
 
+    @ui_handler()
+    def open_entry_check(self, event=None) -> None:  # noqa: ARG002
+        if self.entry_check is not None and self.entry_check.winfo_exists():
+            self.entry_check.lift()
+            self.entry_check.refresh()
+        else:
+            self.entry_check = EntryCheckWindow(self)
+
+    def has_unsaved_changes(self) -> bool:
+        return self.is_dirty or self.order_roa.is_dirty() or self.categories_roa.is_dirty()
+
+    @ui_handler()
     def delete_window(self) -> None:
-        if self.is_dirty or self.order_roa.is_dirty() or self.categories_roa.is_dirty():
-            resp = messagebox.askyesnocancel("Unsaved changes!", "You have not exported your changes back to Rivals of Aether yet. Save before quitting?")
+        if self.has_unsaved_changes():
+            with paused():
+                resp = messagebox.askyesnocancel("Unsaved changes!", "You have not exported your changes back to Rivals of Aether yet. Save before quitting?")
             if resp is None:
                 return
             elif resp is False:
@@ -123,65 +235,171 @@ class MainApp(tk.Tk):
         else:
             self.destroy()
 
-    def log(self, line) -> None:
-        max_old_lines = 2
-        line = str(line)
-        lines = self.text_status.get().split('\n')
-        self.text_status.set('\n'.join([*lines[-max_old_lines:], line]))
-
-    def _inorder_items(self) -> Generator[tuple[str, list[RoaEntry]], Any, None]:
-        assert set(self.category_order) == set(self.nested_state.keys())
-        for k in self.category_order:
-            yield (k, self.nested_state[k])
-
+    def log(self, msg, *args, level: int = logging.INFO) -> None:
+        # %-style args, formatted only if the record gets displayed
+        logger.log(level, msg, *args)
+
+    def update_status(self) -> None:
+        # Polled rather than pushed, so bursts of records (and records from
+        # worker threads) cost one redraw per interval
+        if self.log_buffer.seq != self.status_seq:
+            self.status_seq = self.log_buffer.seq
+            records = self.log_buffer.tail(self.status_lines, logging.INFO)
+            self.text_status.set('\n'.join(format_record(r) for r in records))
+        self.after(self.status_interval_ms, self.update_status)
+
+    # Search
+
+    def current_frame(self) -> DrivenFrame:
+        return self.nametowidget(self.notebook.select())
+
+    @timed('search')
+    def search(self, query: str) -> set[RoaEntry]:
+        if self.search_index_stale:
+            self.search_index.update(itertools.chain(*self.order_roa.groups.values()))
+            self.search_index_stale = False
+        return self.search_index.search(query)
+
+    @ui_handler()
+    def search_changed(self, *args) -> None:  # noqa: ARG002
+        self.apply_search()
+
+    def apply_search(self) -> None:
+        # Filters the current tab by the search box; clearing the box shows
+        # every item again, with the selection as it was
+        query = self.var_search.get()
+        self.current_frame().show_search_hits(self.search(query) if query.strip() else None)
+
+    @ui_handler()
+    def search_next(self, event=None) -> None:  # noqa: ARG002
+        self.current_frame().goto_next_search_hit(self.search(self.var_search.get()))
+
+    @ui_handler('load')
     def load_state_from_roa(self) -> None:
         self.order_roa.load_from_disk()
+        self.report_duplicate_entries()
         self.order_roa.prune_deleted_entries()
         self.order_roa.scan_for_new_entries()
 
-        self.nested_state: dict[str, list[RoaEntry]] = roa_zip_chars(self.order_roa, self.categories_roa)
-        self.category_order = list(self.nested_state.keys())
+        self.layout: LayoutModel = LayoutModel.from_roa(self.order_roa, self.categories_roa)
+        self.search_index_stale = True
+        self.after_idle(self.start_image_scan)
+        self.after_idle(self.start_disk_usage_scan)
         self.load_gui_from_state()
+        self.log_profile()
+
+    def report_duplicate_entries(self) -> None:
+        # Only what the index finds without touching the disk; orphans are
+        # pruned right after, and types are left to the entry check window
+        index = EntryIndex(self.order_roa.groups)
+        duplicates = sum(1 for _ in index.duplicates()) + sum(1 for _ in index.shared_ids())
+        if duplicates:
+            self.log("%d entries are listed twice or share a workshop ID, see Check entries", duplicates, level=logging.WARNING)
+
+    def start_image_scan(self) -> None:
+        # One scan (and process pool) at a time: reloading during a scan
+        # queues the new paths for the running thread, replacing any queued
+        # before, instead of starting another
+        from .thumbnails import get_thumbnail_cache
+
+        paths: list[str] = [
+            str(entry.image_path(label))
+            for label, group in self.order_roa.groups.items()
+            for entry in group
+        ]
+        thumbnail_cache = get_thumbnail_cache(self)
+        with self.image_scan_lock:
+            self.image_scan_paths = paths
+            if self.image_scan_running:
+                return
+            self.image_scan_running = True
+
+        def scan() -> None:
+            # PIL and multiprocessing load on this thread, off the Tk one
+            from .imagescan import scan_images
+            while True:
+                with self.image_scan_lock:
+                    next_paths, self.image_scan_paths = self.image_scan_paths, None
+                    if next_paths is None:
+                        self.image_scan_running = False
+                        return
+                # Replaced, not merged, so images of removed entries drop out
+                thumbnail_cache.health = scan_images(next_paths)
+
+        threading.Thread(target=scan, name='image-scan', daemon=True).start()
+
+    def start_disk_usage_scan(self) -> None:
+        paths: list[str] = [
+            entry.decode()
+            for group in self.order_roa.groups.values()
+            for entry in group
+        ]
+        results: dict[str, int] = {}
+
+        def scan() -> None:
+            from .diskusage import scan_disk_usage
+            results.update(scan_disk_usage(paths))
+
+        thread = threading.Thread(target=scan, name='disk-usage-scan', daemon=True)
+        thread.start()
+        self.after(self.status_interval_ms, self.finish_disk_usage_scan, thread, results)
+
+    def finish_disk_usage_scan(self, thread: threading.Thread, results: dict[str, int]) -> None:
+        # Polled: the scan thread doesn't touch Tk
+        if thread.is_alive():
+            self.after(self.status_interval_ms, self.finish_disk_usage_scan, thread, results)
+            return
+        self.disk_usage.update(results)
+        for child in self.childframes:
+            child.redraw_values()
 
     def load_gui_from_state(self) -> None:
         for child in self.childframes:
             child.load_gui_from_state()
+        if self.childframes:
+            # The filter holds the entries from before the reload
+            self.apply_search()
 
+    @ui_handler('save')
     def save_state_to_roas(self, event=None) -> None:  # noqa: ARG002
         self.log("Zipping nested groups with category labels")
-        all_characters: list[RoaEntry] = []
-        self.categories_roa.categories.clear()
-        for label in self.category_order:
-            cat_char_list: list[RoaEntry] = self.nested_state[label]
-            if len(cat_char_list) < 1:
-                continue
-            new_cat = RoaCategory(len(all_characters), label.encode('utf-8'))
-            print(new_cat)
-            self.categories_roa.categories.append(new_cat)
-            for char in cat_char_list:
-                print(char)
-                try:
-                    all_characters.append(char)
-                except KeyError:
-                    if label == '_removed': continue  # noqa: E701
-                    self.log(f"Couldn't find {char}")
-                    raise
-
-        self.order_roa.groups['characters'] = all_characters
+        self.layout.to_roa(self.order_roa, self.categories_roa)
 
         self.order_roa.save_file()
         self.categories_roa.save_file()
         self.is_dirty = False
         self.log("Saved groups and order to ROA")
+        self.log_profile()
+
+    def log_profile(self) -> None:
+        if enabled():
+            self.log("%s", summary())
 
+    @ui_handler()
     def open_folder(self, event=None) -> None:  # noqa: ARG002
-        os.startfile(ROA_DIR)  # noqa: S606
+        os.startfile(self.order_roa.roa_path.parent)  # noqa: S606
 
 
 def main() -> None:
-    order_roa = RoaOrderFile(ROA_DIR / 'order.roa')
-    categories_roa = RoaCategoriesFile(ROA_DIR / 'categories.roa')
-    MainApp(order_roa, categories_roa)
+    parser = argparse.ArgumentParser(description="Re-ROAder")
+    parser.add_argument("--profile", nargs='?', type=Path, const=DEFAULT_TRACE_PATH, help="Record timings and write a Chrome trace on exit")
+    parser.add_argument("--roa-dir", type=Path, default=None, help="Folder with order.roa and categories.roa (default: REROADER_ROA_DIR or the game's folder)")
+    args = parser.parse_args()
+    if args.profile:
+        enable(args.profile)
+    setup_logging()
+
+    startup.mark("imports")
+    roa_dir = args.roa_dir or default_roa_dir()
+    order_roa = RoaOrderFile(roa_dir / 'order.roa')
+    categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
+    try:
+        MainApp(order_roa, categories_roa)
+    finally:
+        # Only if a list ever asked for a thumbnail
+        if 'reroader.thumbnails' in sys.modules:
+            from .thumbnails import close_thumbnail_cache
+            close_thumbnail_cache()
 
 
 if __name__ == '__main__':
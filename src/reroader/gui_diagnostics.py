@@ -0,0 +1,176 @@
+import logging
+import time
+import tkinter as tk
+from tkinter import ttk
+from typing import Optional
+
+from .latency import FRAME_BUDGETS_MS, LatencyMonitor, monitor
+from .logbuffer import RingBufferHandler, format_record
+from .profiling import enabled, summary
+
+# Developer panels: diagnostics is hidden behind Ctrl+Shift+D, the log viewer
+# opens with Ctrl+L or a double-click on the status bar.
+
+
+class DiagnosticsWindow(tk.Toplevel):
+    refresh_ms: int = 1000
+
+    def __init__(self, master, latency_monitor: LatencyMonitor = monitor) -> None:
+        super().__init__(master)
+        self.title("Re-ROAder diagnostics")
+        self.geometry("900x420")
+        self.monitor: LatencyMonitor = latency_monitor
+        self.var_profile = tk.StringVar(self, value="")
+        self._after_id: Optional[str] = None
+
+        self.initwindow()
+        self.refresh()
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def initwindow(self) -> None:
+        columns = ['calls', 'mean', 'p95', 'max', *(f'over{b}' for b in FRAME_BUDGETS_MS), 'histogram']
+        self.tree = ttk.Treeview(self, columns=columns)
+        self.tree.heading('#0', text="Handler")
+        self.tree.column('#0', width=320)
+        for column, text in [('calls', "Calls"), ('mean', "Mean ms"), ('p95', "p95 ms"), ('max', "Max ms")]:
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=70, anchor=tk.E)
+        for budget in FRAME_BUDGETS_MS:
+            self.tree.heading(f'over{budget}', text=f">{budget}ms")
+            self.tree.column(f'over{budget}', width=60, anchor=tk.E)
+        self.tree.heading('histogram', text="Histogram")
+        self.tree.column('histogram', width=120)
+        self.tree.tag_configure('slow', foreground='red')
+        self.tree.tag_configure('janky', foreground='orange')
+
+        ttk.Label(self, text=f"Calls over {FRAME_BUDGETS_MS[-1]} ms").pack(side=tk.BOTTOM, anchor=tk.W)
+        self.list_slow = tk.Listbox(self, height=6)
+
+        frame_btns = tk.Frame(self)
+        ttk.Button(frame_btns, text="Refresh", command=self.refresh).pack(side=tk.LEFT)
+        ttk.Button(frame_btns, text="Reset", command=self.reset).pack(side=tk.LEFT)
+        ttk.Label(frame_btns, textvariable=self.var_profile).pack(side=tk.LEFT, fill='x')
+
+        frame_btns.pack(fill='x', side=tk.TOP)
+        self.list_slow.pack(fill='x', side=tk.BOTTOM)
+        self.tree.pack(fill='both', expand=1)
+
+    def refresh(self) -> None:
+        self.tree.delete(*self.tree.get_children())
+        for stats in self.monitor.handlers():
+            tags: tuple[str, ...] = ()
+            if stats.over_budget[-1]:
+                tags = ('slow',)
+            elif stats.over_budget[0]:
+                tags = ('janky',)
+            self.tree.insert('', tk.END, text=stats.name, tags=tags, values=[
+                stats.calls,
+                f"{stats.mean_ms:.1f}",
+                f"{stats.percentile_ms(0.95):.1f}",
+                f"{stats.max_ms:.1f}",
+                *stats.over_budget,
+                stats.histogram(),
+            ])
+
+        self.list_slow.delete(0, tk.END)
+        for when, name, ms in reversed(self.monitor.slow_calls):
+            self.list_slow.insert(tk.END, f"{time.strftime('%H:%M:%S', time.localtime(when))}  {ms:8.1f} ms  {name}")
+
+        self.var_profile.set(summary() if enabled() else "Profiling off (--profile or REROADER_PROFILE=1)")
+
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(self.refresh_ms, self.refresh)
+
+    def reset(self) -> None:
+        self.monitor.reset()
+        self.refresh()
+
+    def close(self) -> None:
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        self.destroy()
+
+
+class LogViewerWindow(tk.Toplevel):
+    refresh_ms: int = 500
+    levels: dict[str, int] = {
+        'Debug': logging.DEBUG,
+        'Info': logging.INFO,
+        'Warning': logging.WARNING,
+        'Error': logging.ERROR,
+    }
+
+    def __init__(self, master, log_buffer: RingBufferHandler) -> None:
+        super().__init__(master)
+        self.title("Re-ROAder log")
+        self.geometry("800x400")
+        self.log_buffer: RingBufferHandler = log_buffer
+        self.var_level = tk.StringVar(self, value='Info')
+        self.var_follow = tk.BooleanVar(self, value=True)
+        self.shown_seq: int = -1
+        self._after_id: Optional[str] = None
+
+        self.initwindow()
+        self.refresh()
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def initwindow(self) -> None:
+        frame_btns = tk.Frame(self)
+        ttk.Label(frame_btns, text="Level: ").pack(side=tk.LEFT)
+        picker = ttk.Combobox(frame_btns, values=list(self.levels), textvariable=self.var_level, state='readonly', width=8)
+        picker.bind("<<ComboboxSelected>>", self.rerender)
+        picker.pack(side=tk.LEFT)
+        ttk.Checkbutton(frame_btns, text="Follow", variable=self.var_follow).pack(side=tk.LEFT)
+        ttk.Button(frame_btns, text="Clear", command=self.clear).pack(side=tk.RIGHT)
+
+        self.text = tk.Text(self, wrap=tk.NONE, state=tk.DISABLED)
+        self.text.tag_configure('WARNING', foreground='orange')
+        self.text.tag_configure('ERROR', foreground='red')
+        self.text.tag_configure('CRITICAL', foreground='red')
+        scroll = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.text.yview)
+        self.text.configure(yscrollcommand=scroll.set)
+
+        frame_btns.pack(fill='x', side=tk.TOP)
+        scroll.pack(fill='y', side=tk.RIGHT)
+        self.text.pack(fill='both', expand=1)
+
+    def _append(self, records: list[logging.LogRecord]) -> None:
+        # Records are formatted here, only once they're shown
+        level = self.levels[self.var_level.get()]
+        self.text.configure(state=tk.NORMAL)
+        for record in records:
+            if record.levelno < level:
+                continue
+            stamp = time.strftime('%H:%M:%S', time.localtime(record.created))
+            self.text.insert(tk.END, f"{stamp} {record.levelname:<7} {format_record(record)}\n", (record.levelname,))
+        self.text.configure(state=tk.DISABLED)
+        if self.var_follow.get():
+            self.text.see(tk.END)
+
+    def refresh(self) -> None:
+        new_count = self.log_buffer.seq - self.shown_seq
+        if self.shown_seq < 0 or new_count > len(self.log_buffer.records):
+            self.rerender()
+        elif new_count > 0:
+            self.shown_seq = self.log_buffer.seq
+            self._append(list(self.log_buffer.records)[-new_count:])
+        self._after_id = self.after(self.refresh_ms, self.refresh)
+
+    def rerender(self, event=None) -> None:  # noqa: ARG002
+        self.shown_seq = self.log_buffer.seq
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        self.text.configure(state=tk.DISABLED)
+        self._append(list(self.log_buffer.records))
+
+    def clear(self) -> None:
+        self.log_buffer.clear()
+        self.rerender()
+
+    def close(self) -> None:
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        self.destroy()
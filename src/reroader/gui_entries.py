@@ -0,0 +1,97 @@
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+from .entryindex import REPAIRABLE, EntryIndex, EntryIssue, repair
+from .latency import paused, ui_handler
+from .layout import LayoutModel
+from .roa import RoaEntry
+
+# Entry check window: duplicate, shared-ID, orphaned and misfiled entries in
+# the current (unsaved) layout, with a one-click repair.
+
+
+class EntryCheckWindow(tk.Toplevel):
+    def __init__(self, master) -> None:
+        super().__init__(master)
+        self.app = master
+        self.title("Re-ROAder entry check")
+        self.geometry("800x400")
+        self.var_types = tk.BooleanVar(self, value=False)
+        self.var_summary = tk.StringVar(self, value="")
+        self.issues: list[EntryIssue] = []
+
+        self.initwindow()
+        self.refresh()
+
+    def initwindow(self) -> None:
+        frame_btns = tk.Frame(self)
+        ttk.Button(frame_btns, text="Check again", command=self.refresh).pack(side=tk.LEFT)
+        ttk.Checkbutton(frame_btns, text="Compare config.ini types", variable=self.var_types, command=self.refresh).pack(side=tk.LEFT)
+        ttk.Label(frame_btns, textvariable=self.var_summary).pack(side=tk.LEFT, fill='x')
+        ttk.Button(frame_btns, text="Repair", command=self.repair_all).pack(side=tk.RIGHT)
+
+        self.tree = ttk.Treeview(self, columns=['group', 'index', 'detail'], selectmode=tk.BROWSE)
+        self.tree.heading('#0', text="Entry")
+        self.tree.heading('group', text="Group")
+        self.tree.heading('index', text="#")
+        self.tree.heading('detail', text="Problem")
+        self.tree.column('#0', width=260)
+        self.tree.column('group', width=80)
+        self.tree.column('index', width=50, anchor=tk.E)
+        self.tree.column('detail', width=380)
+        self.tree.tag_configure('manual', foreground='gray')
+
+        frame_btns.pack(fill='x', side=tk.TOP)
+        self.tree.pack(fill='both', expand=1)
+
+    def current_groups(self) -> dict[str, list[RoaEntry]]:
+        # Characters as laid out in the GUI, which may not be saved yet
+        return {**self.app.order_roa.groups, 'characters': list(self.app.layout.entries())}
+
+    @staticmethod
+    def describe(issue: EntryIssue) -> str:
+        if issue.check == 'duplicate':
+            return f"Listed again, first at {issue.detail['first_group']} #{issue.detail['first_index']}"
+        if issue.check == 'same_id':
+            return f"Same workshop ID as {issue.detail['first_path']}"
+        if issue.check == 'orphan':
+            return "Folder doesn't exist"
+        return f"config.ini says {issue.detail['expected']}"
+
+    @ui_handler()
+    def refresh(self) -> None:
+        groups = self.current_groups()
+        index = EntryIndex(groups)
+        self.issues = list(index.issues(types=self.var_types.get()))
+
+        self.tree.delete(*self.tree.get_children())
+        for issue in self.issues:
+            entry = groups[issue.group][issue.index]
+            # Orphans have no config.ini to name them
+            text = entry.id if issue.check == 'orphan' else f"{entry.name} ({entry.id})"
+            self.tree.insert(
+                '', tk.END, text=text,
+                values=[issue.group, issue.index, self.describe(issue)],
+                tags=() if issue.check in REPAIRABLE else ('manual',)
+            )
+        repairable = sum(issue.check in REPAIRABLE for issue in self.issues)
+        self.var_summary.set(f"{len(index)} entries, {len(self.issues)} problems, {repairable} repairable")
+
+    @ui_handler()
+    def repair_all(self, event=None) -> None:  # noqa: ARG002
+        if not any(issue.check in REPAIRABLE for issue in self.issues):
+            return
+        with paused():
+            if not messagebox.askokcancel("Repair entries", "Drop duplicate and missing entries and move misfiled ones to their group? Nothing is saved until you export.", parent=self):
+                return
+        app = self.app
+        app.layout.to_roa(app.order_roa, app.categories_roa)
+        # Positions from the last check go stale if characters moved since
+        issues = EntryIndex(app.order_roa.groups).issues(types=self.var_types.get())
+        repaired = repair(app.order_roa, app.categories_roa, issues)
+        app.layout = LayoutModel.from_roa(app.order_roa, app.categories_roa)
+        app.search_index_stale = True
+        app.is_dirty = True
+        app.load_gui_from_state()
+        app.log("Repaired %d entries", repaired)
+        self.refresh()
@@ -1,17 +1,15 @@
-from dataclasses import dataclass
+import bisect
+from dataclasses import dataclass, field
 import tkinter as tk
 from abc import abstractmethod
-from functools import lru_cache
 from tkinter import ttk
-from typing import ClassVar, Generic, Literal, Sequence, TypeAlias, TypeVar, Union
-from PIL import ImageTk
-from PIL import Image, ImageFile
+from typing import Any, Callable, ClassVar, Collection, Generic, Hashable, Mapping, Optional, Sequence, TypeAlias, TypeVar, Union
 
+from .diskusage import format_size
+from .profiling import timed
+from .reorder import Direction, build_positions, move_by, move_to, sorted_by_position, stable_indices
 from .roa import RoaEntry
-
-ImageFile.LOAD_TRUNCATED_IMAGES = True
-
-Direction: TypeAlias = Union[Literal[1], Literal[-1]]
+from .sorting import natural_key, sort_author, sort_name
 
 T = TypeVar('T')
 
@@ -22,6 +20,8 @@ tkid: TypeAlias = str
 class CatInfo():
     name: str
     length: int
+    # Index of the first character in the flat character list
+    offset: int = 0
 
     @property
     def label(self) -> str:
@@ -40,20 +40,32 @@ class CatInfo():
         return (16 - cat_length) % 16
 
 
-@lru_cache(maxsize=None)
-def photoimage(path: str) -> tk.PhotoImage:
-    try:
-        return tk.PhotoImage(file=path)
-    except tk.TclError as e:
-        if e.args[0] == 'CRC check failed':
-            pilimg = Image.open(path, formats=('png',))
-            return ImageTk.PhotoImage(pilimg)  # type: ignore
-        else:
-            raise e
+@dataclass
+class ListView(Generic[T]):
+    # Saved state of an ItemListFrame for one key (e.g. one category). Holds
+    # references, not copies, so saving and restoring don't depend on size.
+    source: Sequence[T]
+    items: list[T]
+    positions: dict[T, int]
+    selection: set[T]
+    offset: int
+    cursor: int
+    sort_columns: list[tuple[str, bool]] = field(default_factory=list)
 
 
 class ItemListFrame(tk.Frame, Generic[T]):
+    # Virtualized list: the Treeview only ever holds one screenful of rows.
+    # `items` and `selection` are the source of truth; scrolling re-points the
+    # pooled rows at a different window of `items`, so opening a list costs
+    # the same regardless of how many items it holds.
+    #
+    # A filter narrows the display to `shown`, the filtered items in list
+    # order. Rows, scrolling, `offset` and `cursor` work on `shown`; sorts and
+    # moves still reorder the full `items`.
+
     columns: ClassVar[tuple[str, ...]] = ('Value',)
+    values_depend_on_index: ClassVar[bool] = False
+    default_page_size: ClassVar[int] = 40
 
     @staticmethod
     @abstractmethod
@@ -67,118 +79,511 @@ class ItemListFrame(tk.Frame, Generic[T]):
     ) -> None:
         super().__init__(parent)
         self.items: list[T] = []
+        self.positions: dict[T, int] = {}
+        self.selection: set[T] = set()
+        # None shows every item
+        self.filter: Optional[Collection[T]] = None
+        self.shown: Sequence[T] = self.items
+        self.shown_positions: dict[T, int] = self.positions
+
+        # Only the rows currently materialized
         self.map_ids: dict[T, tkid] = {}
         self.map_items: dict[tkid, T] = {}
 
+        self.multiple: bool = multiple
+        self.icon_size: tuple[int, int] = icon_size
+        self.offset: int = 0
+        self.page_size: int = self.default_page_size
+        self.cursor: int = 0
+
+        self._rows: list[tkid] = []
+        self._row_contents: dict[tkid, tuple[T, int]] = {}
+        self._row_images: dict[tkid, tk.PhotoImage] = {}
+        self._row_height: int = icon_size[1]
+        self._header_height: int = icon_size[1]
+        self._select_callbacks: list[Callable] = []
+        self._views: dict[Hashable, ListView[T]] = {}
+        self._sort_callbacks: list[Callable[[list[T]], None]] = []
+
+        # Most significant first: (column, descending)
+        self.sort_columns: list[tuple[str, bool]] = []
+        self._view_key: Optional[Hashable] = None
+        self._replace_selection: bool = False
+
         style_id = f"height{icon_size[1]}.Treeview"
         s = ttk.Style()
         s.configure(style_id, rowheight=icon_size[1])
         s.configure(style_id + ".padding", border=0)
         s.configure(style_id + ".treearea", border=0)
 
-        myscroll = tk.Scrollbar(self)
-        myscroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         self.tree: ttk.Treeview = ttk.Treeview(
             self,
             selectmode=('extended' if multiple else 'browse'),
-            yscrollcommand=myscroll.set,
             columns=self.columns,
             style=style_id
         )
-        myscroll.config(command=self.tree.yview)
 
         self.tree.column('#0', width=0, minwidth=icon_size[0] + (20 if icon_size[0] > 0 else 0))
         for i, header in enumerate(self.columns):
             widths = {
                 'Length': 50,
+                'Start': 50,
                 'Waste4': 36,
                 'Waste16': 40,
+                'Size': 70,
             }
             self.tree.column(i, width=widths.get(header, 120), minwidth=40)
             self.tree.heading(column=i, text=header)
+            if self.column_sort_key(header) is not None:
+                self.tree.heading(column=i, command=lambda h=header: self.sort_by_column(h))
 
         self.tree.pack(side=tk.TOP, fill=tk.BOTH, expand=1)
 
-    def set_items(self, items: Sequence[T]) -> None:
-        self.items = list(items)
-        self.tree.delete(*self.tree.get_children(''))
-        for item_index, item in enumerate(items):
-            values: tuple[str, ...] = self.item_to_values(item, item_index=item_index)
-            if isinstance(item, RoaEntry):
-                try:
-                    self.map_ids[item] = self.tree.insert(
-                        '', tk.END,
-                        image=photoimage(str(item.image_path())),
-                        values=values
-                    )
-
-                    continue
-                except NotImplementedError:
-                    continue
-                except tk.TclError as e:
-                    print(item, item.image_path(), e)
-
-            self.map_ids[item] = self.tree.insert(
-                '', tk.END,
-                values=values
+        self.tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self.tree.bind('<ButtonPress-1>', self._on_click)
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_by(-3))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_by(3))
+        self.tree.bind('<Up>', lambda e: self._on_arrow(e, -1))
+        self.tree.bind('<Down>', lambda e: self._on_arrow(e, 1))
+        self.tree.bind('<Prior>', lambda e: self._on_arrow(e, -self.page_size))
+        self.tree.bind('<Next>', lambda e: self._on_arrow(e, self.page_size))
+
+    # Rendering
+
+    def row_image(self, item: T) -> Optional[tk.PhotoImage]:
+        # Thumbnails decode in the background; rows show a placeholder until
+        # the image arrives, then get patched if they still show the item.
+        if not isinstance(item, RoaEntry):
+            return None
+        try:
+            path = str(item.image_path())
+        except NotImplementedError:
+            return None
+
+        def on_ready(photo: tk.PhotoImage) -> None:
+            iid = self.map_ids.get(item)  # type: ignore
+            if iid is not None:
+                self.tree.item(iid, image=photo)
+                self._row_images[iid] = photo
+
+        from .thumbnails import get_thumbnail_cache  # PIL, deferred to the first row with an icon
+
+        return get_thumbnail_cache(self).get(path, self.icon_size, on_ready)
+
+    @timed('list.render')
+    def _render(self) -> None:
+        # Reconcile the visible window against the rows already in the tree.
+        # Rows keep following their item; rows whose item left the window are
+        # recycled for new items, and only rows outside the longest run that is
+        # already in order get moved.
+        window = self.shown[self.offset:self.offset + self.page_size]
+        window_set = set(window)
+
+        recycled: list[tkid] = [
+            iid for iid in self._rows
+            if self.map_items[iid] not in window_set
+        ]
+        for iid in recycled:
+            del self.map_ids[self.map_items.pop(iid)]
+
+        old_slots: dict[tkid, int] = {iid: slot for slot, iid in enumerate(self._rows)}
+
+        new_rows: list[tkid] = []
+        for item in window:
+            iid = self.map_ids.get(item)  # type: ignore
+            if iid is None:
+                iid = recycled.pop() if recycled else self.tree.insert('', tk.END)
+                self.map_ids[item] = iid
+                self.map_items[iid] = item
+            new_rows.append(iid)
+
+        if recycled:
+            self.tree.delete(*recycled)
+            for iid in recycled:
+                self._row_contents.pop(iid, None)
+                self._row_images.pop(iid, None)
+
+        in_place = stable_indices([old_slots.get(iid, -1) for iid in new_rows])
+        for slot, iid in enumerate(new_rows):
+            if slot not in in_place:
+                self.tree.move(iid, '', (self.tree.index(new_rows[slot - 1]) + 1) if slot else 0)
+
+            item = self.map_items[iid]
+            item_index = self.positions[item]
+            contents = (item, item_index)
+            previous = self._row_contents.get(iid)
+            if previous is None or previous[0] is not item:
+                image = self.row_image(item)
+                self.tree.item(
+                    iid,
+                    values=self.item_to_values(item, item_index=item_index),
+                    image=(image if image is not None else '')
+                )
+                if image is not None:
+                    self._row_images[iid] = image
+                else:
+                    self._row_images.pop(iid, None)
+            elif previous != contents and self.values_depend_on_index:
+                self.tree.item(iid, values=self.item_to_values(item, item_index=item_index))
+            self._row_contents[iid] = contents
+
+        self._rows = new_rows
+
+        self.tree.selection_set([
+            iid for item, iid in self.map_ids.items()
+            if item in self.selection
+        ])
+        self.tree.yview_moveto(0)
+
+        if self.shown:
+            self.scrollbar.set(
+                self.offset / len(self.shown),
+                (self.offset + len(window)) / len(self.shown)
             )
-            continue
-        self.map_items = {v: k for k, v in self.map_ids.items()}
+        else:
+            self.scrollbar.set(0, 1)
+
+    def redraw_values(self) -> None:
+        # After the data behind the columns changed, e.g. sizes came in
+        for iid, (item, item_index) in self._row_contents.items():
+            self.tree.item(iid, values=self.item_to_values(item, item_index=item_index))
+
+    def show_view(self, key: Hashable, items: Sequence[T], positions: Optional[dict[T, int]] = None) -> None:
+        # Switch to the items for `key`. If `items` is the same list object as
+        # when the view was last shown (or the list this frame handed back
+        # after a move), the cached items, position index, scroll position and
+        # selection are reused and only the visible rows are redrawn.
+        #
+        # With `positions`, the frame displays `items` by reference instead of
+        # copying it, sharing the owner's list and position index, so that the
+        # owner can reorder them and just call refresh().
+        self._save_view()
+        self._view_key = key
+
+        view = self._views.get(key)
+        if view is not None and (items is view.source or items is view.items):
+            self.items = view.items
+            self.positions = positions if positions is not None else view.positions
+            self.selection = {item for item in view.selection if item in self.positions}
+            self.sort_columns = view.sort_columns
+            self._project()
+            self.offset = min(view.offset, max(0, len(self.shown) - self.page_size))
+            self.cursor = min(view.cursor, max(0, len(self.shown) - 1))
+        else:
+            if positions is not None:
+                self.items = items  # type: ignore
+                self.positions = positions
+            else:
+                self.items = list(items)
+                self.positions = build_positions(self.items)
+            self.selection = set()
+            self.sort_columns = []
+            self._project()
+            self.offset = 0
+            self.cursor = 0
+            self._views[key] = ListView(items, self.items, self.positions, self.selection, 0, 0)
+        self._draw_headings()
+        self._render()
+
+    def _save_view(self) -> None:
+        view = self._views.get(self._view_key)  # type: ignore
+        if view is not None and view.items is self.items:
+            view.positions = self.positions
+            view.selection = self.selection
+            view.offset = self.offset
+            view.cursor = self.cursor
+            view.sort_columns = self.sort_columns
+
+    def invalidate_views(self) -> None:
+        self._views.clear()
+        self._view_key = None
+
+    @timed('list.set_items')
+    def set_items(self, items: Sequence[T], keep_sort: bool = False) -> None:
+        # A new list isn't in the order of the sorted column any more, unless
+        # it's a reorder of the same items or the caller says it is
+        # (`keep_sort`)
+        old_items = self.items
+        old_shown = self.shown
+        self.items = list(items)
+        self.positions = build_positions(self.items)
+        self._project()
+
+        reordered = len(self.positions) == len(old_items) and all(item in self.positions for item in old_items)
+        if reordered:
+            # Stay where we were
+            pass
+        elif self.map_ids and (anchor := old_shown[self.offset]) in self.shown_positions:
+            self.offset = self.shown_positions[anchor]
+        else:
+            self.offset = 0
+        self.offset = min(self.offset, max(0, len(self.shown) - self.page_size))
+
+        if not (reordered or keep_sort):
+            self.sort_columns = []
+        self.selection = {item for item in self.selection if item in self.positions}
+        self.cursor = min(self.cursor, max(0, len(self.shown) - 1))
+        self._draw_headings()
+        self._render()
+
+    # Filtering
+
+    def set_filter(self, matches: Optional[Collection[T]]) -> int:
+        # Show only the items in `matches`, or all of them with None. Returns
+        # the number shown. The selection is kept; while filtered, actions
+        # apply to the selected items that are shown. The item under the
+        # cursor stays under it if it's still shown.
+        if matches is None and self.filter is None:
+            return len(self.shown)
+        anchor = self.shown[self.cursor] if self.cursor < len(self.shown) else None
+        self.filter = matches
+        self._project()
+        self.cursor = self.shown_positions.get(anchor, 0)  # type: ignore
+        self.offset = max(0, min(self.cursor, len(self.shown) - self.page_size))
+        self._render()
+        return len(self.shown)
+
+    def _project(self) -> None:
+        # Recompute `shown` after `items` or the filter changed. O(k log k)
+        # for k matches, not a pass over `items`.
+        if self.filter is None:
+            self.shown = self.items
+            self.shown_positions = self.positions
+        else:
+            self.shown = sorted_by_position([m for m in self.filter if m in self.positions], self.positions)
+            self.shown_positions = build_positions(self.shown)
+
+    # Scrolling
+
+    def scroll_to(self, offset: int) -> None:
+        max_offset = max(0, len(self.shown) - self.page_size)
+        offset = min(max(0, offset), max_offset)
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _scroll_by(self, rows: int) -> str:
+        self.scroll_to(self.offset + rows)
+        return "break"
+
+    def see(self, item_index: int) -> None:
+        if item_index < self.offset:
+            self.scroll_to(item_index)
+        elif item_index >= self.offset + self.page_size:
+            self.scroll_to(item_index - self.page_size + 1)
+
+    def yview(self, *args) -> None:
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.shown)))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.page_size
+            self.scroll_to(self.offset + amount)
+
+    def _on_mousewheel(self, event) -> str:
+        return self._scroll_by(-3 * int(event.delta / 120))
+
+    def _on_configure(self, event) -> None:
+        if self._rows:
+            bbox = self.tree.bbox(self._rows[0])
+            if bbox:
+                self._header_height = bbox[1]
+        page_size = max(1, (event.height - self._header_height) // max(1, self._row_height))
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self.offset = min(self.offset, max(0, len(self.shown) - self.page_size))
+            self._render()
+
+    # Selection
 
     def bind_select(self, callback) -> None:
-        self.tree.bind('<<TreeviewSelect>>', callback)
+        self._select_callbacks.append(callback)
+
+    def _fire_select(self, event=None) -> None:
+        for callback in self._select_callbacks:
+            callback(event)
+
+    def _on_click(self, event) -> None:
+        # Plain clicks replace the selection, including rows scrolled out of view
+        shift_or_control = 0x0001 | 0x0004
+        self._replace_selection = not (event.state & shift_or_control)
+
+    def _on_tree_select(self, event=None) -> None:
+        visible_selected = {
+            self.map_items[iid]
+            for iid in self.tree.selection()
+            if iid in self.map_items
+        }
+        if self._replace_selection or not self.multiple:
+            new_selection = visible_selected or self.selection
+        else:
+            new_selection = (self.selection - self.map_ids.keys()) | visible_selected
+        self._replace_selection = False
+
+        if new_selection != self.selection:
+            self.selection = new_selection
+            if visible_selected:
+                self.cursor = self.offset + self._rows.index(self.map_ids[next(iter(visible_selected))])
+            self._fire_select(event)
+
+    def _on_arrow(self, event, delta: int) -> str:
+        if not self.shown:
+            return "break"
+        self.cursor = min(max(0, self.cursor + delta), len(self.shown) - 1)
+        item = self.shown[self.cursor]
+        if self.multiple and event.state & 0x0001:
+            self.selection = self.selection | {item}
+        else:
+            self.selection = {item}
+        self.see(self.cursor)
+        self._render()
+        self._fire_select(event)
+        return "break"
 
     def select_items(self, items: Union[T, tuple[T, ...]]) -> None:
         if not isinstance(items, tuple):
             items = (items,)
-        ids: list[tkid] = [
-            self.map_ids[entry]  # type: ignore
-            for entry in items
-        ]
-        self.tree.selection_set(ids)
+        self.selection = set(items)
+        if items and items[0] in self.shown_positions:
+            self.cursor = self.shown_positions[items[0]]
+            self.see(self.cursor)
+        self._render()
+        self._fire_select()
+
+    def select_next_match(self, matches: Collection[T]) -> bool:
+        # Move the cursor to the next shown matching item after it, wrapping
+        # around
+        match_positions = sorted(self.shown_positions[m] for m in matches if m in self.shown_positions)
+        if not match_positions:
+            return False
+        i = bisect.bisect_right(match_positions, self.cursor)
+        self.select_items(self.shown[match_positions[i % len(match_positions)]])
+        return True
 
-    def move_items(self, selected_items: Sequence[T], direction: Direction) -> list[T]:
-        if direction == 1:
-            selected_items = list(reversed(selected_items))
-        for item in selected_items:
-            i = self.items.index(item)
-            if (i + direction) < 0 or (i + direction) >= len(self.items):
-                continue
+    def selected_items(self) -> list[T]:
+        return sorted_by_position(
+            self.selection if self.filter is None else [item for item in self.selection if item in self.shown_positions],
+            self.positions
+        )
+
+    # Sorting
+    # Sorts happen in place on `items`; rows are then reconciled, not rebuilt.
 
-            self.items[i], self.items[i + direction] = self.items[i + direction], self.items[i]
+    def column_sort_key(self, column: str) -> Optional[Callable[[T], Any]]:  # noqa: ARG002
+        return None
 
-            self.tree.move(self.map_ids[item], '', i + direction)
+    def bind_sort(self, callback: Callable[[list[T]], None]) -> None:
+        self._sort_callbacks.append(callback)
 
+    def _draw_headings(self) -> None:
+        # Arrow on the primary sort column
+        for i, header in enumerate(self.columns):
+            arrow = ''
+            if self.sort_columns and self.sort_columns[0][0] == header:
+                arrow = ' ▼' if self.sort_columns[0][1] else ' ▲'
+            self.tree.heading(column=i, text=header + arrow)
+
+    def _after_sort(self) -> None:
+        # In place, as the position index may be shared with the owner
+        self.positions.clear()
+        self.positions.update(build_positions(self.items))
+        self._project()
+        self._draw_headings()
+        self._render()
+        for callback in self._sort_callbacks:
+            callback(self.items)
+
+    def sort_by_column(self, column: str) -> None:
+        # Clicking the primary column flips its direction; clicking another
+        # makes it primary and keeps the previous ones as tie-breakers
+        if self.sort_columns and self.sort_columns[0][0] == column:
+            self.sort_columns[0] = (column, not self.sort_columns[0][1])
+        else:
+            self.sort_columns = [(column, False), *(c for c in self.sort_columns if c[0] != column)]
+
+        # Stable sorts from least to most significant give a multi-key order.
+        # Keys are taken before the first pass, as some (Waste4, Waste16)
+        # depend on positions that the passes change.
+        snapshots = [
+            ({item: key_fn(item) for item in self.items}, descending)
+            for sort_column, descending in reversed(self.sort_columns)
+            if (key_fn := self.column_sort_key(sort_column)) is not None
+        ]
+        for values, descending in snapshots:
+            self.items.sort(key=values.__getitem__, reverse=descending)
+        self._after_sort()
+
+    def sort_items(self, key_fn: Callable[[T], Any], reverse: bool = False) -> None:
+        self.items.sort(key=key_fn, reverse=reverse)
+        self.sort_columns = []
+        self._after_sort()
+
+    # Ordering
+    # Moves reorder `items` through the shared position index, then reconcile
+    # the visible rows once.
+
+    def refresh(self, moved: Sequence[T] = ()) -> list[T]:
+        # Redraw after `items` was reordered in place, keeping `moved` in view
+        self._project()
+        if shown_moved := [self.shown_positions[item] for item in moved if item in self.shown_positions]:
+            self.see(max(shown_moved))
+        self._render()
         return self.items
 
+    def move_items(self, selected_items: Sequence[T], direction: Direction) -> list[T]:
+        move_by(self.items, self.positions, selected_items, direction)
+        return self.refresh(selected_items)
+
+    def move_items_to(self, selected_items: Sequence[T], index: int) -> list[T]:
+        move_to(self.items, self.positions, selected_items, index)
+        return self.refresh(selected_items)
+
     def move_selected_items(self, direction: Direction) -> list[T]:
         return self.move_items(self.selected_items(), direction)
 
-    def selected_items(self) -> list[T]:
-        selection = self.tree.selection()
-        try:
-            return [self.map_items[v] for v in selection]
-        except KeyError:
-            registered_items = {k: self.tree.item(k) for k in self.tree.get_children()}
-            print("Couldn't map selected tree items!")
-            print(f"{selection=}")
-            print(f"{self.map_items=}")
-            print(f"{registered_items=}")
-            raise
+    def move_selected_items_to(self, index: int) -> list[T]:
+        return self.move_items_to(self.selected_items(), index)
 
 
 class ItemListFrameRoa(ItemListFrame[RoaEntry]):
-    columns: ClassVar[tuple[str, ...]] = ('Name', 'Author')
+    columns: ClassVar[tuple[str, ...]] = ('Name', 'Author', 'Size')
 
-    @staticmethod
-    def item_to_values(item: RoaEntry, item_index: int) -> tuple[str, ...]:
-        return (item.name, item.author)
+    def __init__(self, parent, *args, sizes: Optional[Mapping[str, int]] = None, **kwargs) -> None:
+        # sizes: entry folder -> bytes, filled in by a background scan
+        self.sizes: Mapping[str, int] = sizes if sizes is not None else {}
+        super().__init__(parent, *args, **kwargs)
+
+    def column_sort_key(self, column: str) -> Optional[Callable[[RoaEntry], Any]]:
+        return {
+            'Name': sort_name,
+            'Author': sort_author,
+            # Not scanned yet sorts as smallest
+            'Size': lambda e: self.sizes.get(e.decode(), -1),
+        }.get(column)
+
+    def item_to_values(self, item: RoaEntry, item_index: int) -> tuple[str, ...]:  # type: ignore[override]
+        size = self.sizes.get(item.decode())
+        return (item.name, item.author, format_size(size) if size is not None else '')
 
 
 class ItemListFrameCats(ItemListFrame[CatInfo]):
-    columns: ClassVar[tuple[str, ...]] = ('Name', 'Length', 'Waste4', 'Waste16')
+    columns: ClassVar[tuple[str, ...]] = ('Name', 'Length', 'Start', 'Waste4', 'Waste16')
+    values_depend_on_index: ClassVar[bool] = True
+
+    def column_sort_key(self, column: str) -> Optional[Callable[[CatInfo], Any]]:
+        return {
+            'Name': lambda c: natural_key(c.name),
+            'Length': lambda c: c.length,
+            'Waste4': lambda c: c.slot_waste_4(self.positions[c]),
+            'Waste16': lambda c: c.slot_waste_16(self.positions[c]),
+        }.get(column)
 
     @staticmethod
     def item_to_values(item: CatInfo, item_index: int) -> tuple[str, ...]:
-        return (item.name, str(item.length), str(item.slot_waste_4(item_index)), str(item.slot_waste_16(item_index)))
+        return (item.name, str(item.length), str(item.offset + 1), str(item.slot_waste_4(item_index)), str(item.slot_waste_16(item_index)))
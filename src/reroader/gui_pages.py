@@ -1,22 +1,29 @@
 import abc
 import os
 import tkinter as tk
-import webbrowser
 from abc import abstractmethod
-from collections import OrderedDict
-from tkinter import ttk
-from tkinter.simpledialog import Dialog, askstring
-from typing import Callable, Optional
+from pathlib import Path
+from tkinter import filedialog, ttk
+from tkinter.simpledialog import Dialog, askinteger, askstring
+from typing import Callable, Optional, Sequence
 
 from .gui_itemlists import CatInfo, Direction, ItemListFrameCats, ItemListFrameRoa
+from .latency import paused, ui_handler
+from .layout_optimizer import LayoutPlan, apply_plan, optimize_layout, slot_waste
 from .roa import RoaEntry
+from .rules import apply_rules, load_rules
+from .sorting import sort_name
 
 
-def sort_name(entry: RoaEntry) -> str:
-    try:
-        return entry.name.upper()
-    except:
-        return 'ERROR'
+def ask_position(items: list) -> Optional[int]:
+    with paused():
+        position = askinteger(
+            title=None, prompt=f"Move to position (1-{len(items)})",
+            minvalue=1, maxvalue=max(1, len(items))
+        )
+    if position is None:
+        return None
+    return position - 1
 
 
 class Counter():
@@ -74,6 +81,59 @@ class MultiSelectDialog(Dialog):
         self.results = [self.pickers[i].get() for i in self.range]
 
 
+class OptimizeLayoutDialog(Dialog):
+
+    def __init__(self, parent, categories: list[tuple[str, int]]):
+        self.categories = categories
+        self.plan: Optional[LayoutPlan] = None
+        self.results: Optional[LayoutPlan] = None
+        super().__init__(parent=parent, title="Optimize category layout")
+
+    def body(self, master) -> None:
+        self.var_width = tk.StringVar(master, value="4")
+        self.var_merge = tk.BooleanVar(master, value=False)
+        self.var_summary = tk.StringVar(master, value="")
+
+        ttk.Label(master, text="Grid width: ").grid(column=0, row=0, sticky=tk.W)
+        picker = ttk.Combobox(master, values=["4", "16"], textvariable=self.var_width, state='readonly', width=4)
+        picker.grid(column=1, row=0, sticky=tk.W)
+        check_merge = ttk.Checkbutton(master, text="Allow merging categories", variable=self.var_merge)
+        check_merge.grid(column=0, row=1, columnspan=2, sticky=tk.W)
+
+        self.list_preview = tk.Listbox(master, width=60, height=16)
+        self.list_preview.grid(column=0, row=2, columnspan=2, sticky=tk.NSEW)
+        ttk.Label(master, textvariable=self.var_summary).grid(column=0, row=3, columnspan=2, sticky=tk.W)
+
+        self.var_width.trace_add('write', self.update_preview)
+        self.var_merge.trace_add('write', self.update_preview)
+        self.update_preview()
+
+        master.columnconfigure(1, weight=1)
+        master.rowconfigure(2, weight=1)
+        master.pack(padx=5, pady=5, fill="both", expand=1)
+
+    @ui_handler()
+    def update_preview(self, *args) -> None:  # noqa: ARG002
+        self.plan = optimize_layout(
+            self.categories,
+            width=int(self.var_width.get()),
+            allow_merge=self.var_merge.get()
+        )
+        lengths = dict(self.categories)
+        self.list_preview.delete(0, tk.END)
+        for i, (label, group) in enumerate(zip(self.plan.labels, self.plan.groups)):
+            length = sum(lengths[name] for name in group)
+            waste = slot_waste(length, self.plan.width, first=(i == 0))
+            self.list_preview.insert(tk.END, f"{label} ({length}, waste {waste})")
+        self.var_summary.set(
+            f"Waste {self.plan.waste_before} -> {self.plan.waste_after}, "
+            f"{self.plan.merges} merges ({'exact' if self.plan.exact else 'heuristic'})"
+        )
+
+    def apply(self) -> None:
+        self.results = self.plan
+
+
 class DrivenFrame(tk.Frame, abc.ABC):
     def __init__(self, master, *args, **kwargs) -> None:
         super().__init__(master, *args, **kwargs)
@@ -88,6 +148,15 @@ class DrivenFrame(tk.Frame, abc.ABC):
     @abstractmethod
     def load_gui_from_state(self) -> None: pass
 
+    @abstractmethod
+    def show_search_hits(self, hits: Optional[set[RoaEntry]]) -> None: pass
+
+    @abstractmethod
+    def goto_next_search_hit(self, hits: set[RoaEntry]) -> None: pass
+
+    @abstractmethod
+    def redraw_values(self) -> None: pass
+
 
 class ListManagerFrame(DrivenFrame):
     def __init__(self, master, list_name: str, *args, **kwargs) -> None:
@@ -100,14 +169,11 @@ class ListManagerFrame(DrivenFrame):
         self.list_items: ItemListFrameRoa = ItemListFrameRoa(
             self,
             multiple=True,
-            icon_size=RoaEntry.image_sizes.get(self.list_name, (0, 20))
+            icon_size=RoaEntry.image_sizes.get(self.list_name, (0, 20)),
+            sizes=self.app.disk_usage
         )
 
-        # for col in self.list_items.columns:
-        #     self.list_items.tree.heading(
-        #         col, text=col,
-        #         command=lambda: treeview_sort_column(self.list_items.tree, col, False)
-        #     )
+        self.list_items.bind_sort(self.items_sorted)
 
         def frame_buttons_chars() -> tk.Frame:
             frame_buttons_chars = tk.Frame(self)
@@ -115,16 +181,28 @@ class ListManagerFrame(DrivenFrame):
 
             def frame_updown():
                 frame_updown = tk.Frame(frame_buttons_chars)
+                btn_move_top = ttk.Button(
+                    frame_updown, text="⤒", width=3,
+                    command=self.fac_move_selected_to('top', lambda: 0))
                 btn_move_up = ttk.Button(
                     frame_updown, text="^",
                     command=self.fac_move_selected(-1))
                 btn_move_down = ttk.Button(
                     frame_updown, text="v",
                     command=self.fac_move_selected(1))
-                btn_move_up.grid(row=0, column=0)
-                btn_move_down.grid(row=0, column=1)
+                btn_move_bottom = ttk.Button(
+                    frame_updown, text="⤓", width=3,
+                    command=self.fac_move_selected_to('bottom', lambda: len(self.list_items.items)))
+                btn_move_top.grid(row=0, column=0)
+                btn_move_up.grid(row=0, column=1)
+                btn_move_down.grid(row=0, column=2)
+                btn_move_bottom.grid(row=0, column=3)
                 return frame_updown
 
+            btn_move_index = ttk.Button(
+                frame_buttons_chars, text="Move to #...",
+                command=self.fac_move_selected_to('position', lambda: ask_position(self.list_items.items))
+            )
             btn_sort_alpha = ttk.Button(
                 master=frame_buttons_chars, text="Sort: A-Z",
                 command=self.fac_sort_by(sort_name)
@@ -139,6 +217,7 @@ class ListManagerFrame(DrivenFrame):
             )
 
             frame_updown().grid(row=y.inc(), sticky=tk.EW)
+            btn_move_index.grid(row=y.inc(), sticky=tk.EW)
             btn_sort_alpha.grid(row=y.inc(), sticky=tk.EW)
             btn_char_info.grid(row=y.inc(), sticky=tk.EW)
             btn_char_folder.grid(row=y.inc(), sticky=tk.EW)
@@ -153,33 +232,68 @@ class ListManagerFrame(DrivenFrame):
     def load_gui_from_state(self) -> None:
         self.list_items.set_items(self.app.order_roa.groups[self.list_name])
 
+    def redraw_values(self) -> None:
+        self.list_items.redraw_values()
+
+    # Search
+
+    def show_search_hits(self, hits: Optional[set[RoaEntry]]) -> None:
+        # Filters the list; None shows everything again
+        count = self.list_items.set_filter(hits)
+        if hits is not None:
+            self.app.log("%d matching %s", count, self.list_name)
+
+    def goto_next_search_hit(self, hits: set[RoaEntry]) -> None:
+        self.list_items.select_next_match(hits)
+
     # Data ordering
 
+    # Handlers made by the factories are named explicitly, as they all share
+    # the qualname of the inner function
+
     def fac_move_selected(self, d: Direction) -> Callable[..., None]:
+        @ui_handler(f"{self.list_name}.move_{'up' if d < 0 else 'down'}")
         def do_move(event=None):  # noqa: ARG001
-            prev_order = tuple(self.app.order_roa.groups[self.list_name])
             reordered_items: list[RoaEntry] = self.list_items.move_selected_items(d)
             self.app.order_roa.groups[self.list_name] = reordered_items
-            self.app.log(f"Reordered {self.list_name} from {prev_order} to {reordered_items}")
+            self.app.log("Moved %d %s %s", len(self.list_items.selection), self.list_name, "up" if d < 0 else "down")
 
         return do_move
 
-    def fac_sort_by(self, key_fn) -> Callable[..., None]:
+    def fac_move_selected_to(self, where: str, index_fn: Callable[[], Optional[int]]) -> Callable[..., None]:
+        @ui_handler(f"{self.list_name}.move_to_{where}")
         def do_move(event=None):  # noqa: ARG001
-            group = self.app.order_roa.groups[self.list_name]
-            sorted_group = sorted(group, key=key_fn)
-            self.app.order_roa.groups[self.list_name] = sorted_group
+            index = index_fn()
+            if index is None:
+                return
+            reordered_items: list[RoaEntry] = self.list_items.move_selected_items_to(index)
+            self.app.order_roa.groups[self.list_name] = reordered_items
+            self.app.log("Moved %d %s to position %d", len(self.list_items.selection), self.list_name, index + 1)
 
-            self.load_gui_from_state()
         return do_move
 
+    def fac_sort_by(self, key_fn) -> Callable[..., None]:
+        @ui_handler(f"{self.list_name}.{key_fn.__name__}")
+        def do_sort(event=None):  # noqa: ARG001
+            self.list_items.sort_items(key_fn)
+        return do_sort
+
+    @ui_handler()
+    def items_sorted(self, items: list[RoaEntry]) -> None:
+        self.app.order_roa.groups[self.list_name] = items
+        self.app.log("Sorted %d %s", len(items), self.list_name)
+
     # Selection actions
 
+    @ui_handler()
     def open_info(self, event=None) -> None:  # noqa: ARG002
+        import webbrowser
+
         for char in self.list_items.selected_items():
             url = f"steam://openurl/https://steamcommunity.com/sharedfiles/filedetails/?id={char.id}"
             webbrowser.open(url, autoraise=True)
 
+    @ui_handler()
     def open_folder(self, event=None) -> None:  # noqa: ARG002
         for char in self.list_items.selected_items():
             path = char.value.decode('utf-8')
@@ -220,10 +334,16 @@ class CharacterManagerFrame(DrivenFrame):
                 command=self.interactive_rename_category
             )
 
+            btn_optimize = ttk.Button(
+                frame, text="Optimize...",
+                command=self.interactive_optimize_layout
+            )
+
             frame_updown().grid(row=y.inc(), sticky=tk.EW)
             btn_add.grid(row=y.inc(), sticky=tk.EW)
             btn_del.grid(row=y.inc(), sticky=tk.EW)
             btn_rename.grid(row=y.inc(), sticky=tk.EW)
+            btn_optimize.grid(row=y.inc(), sticky=tk.EW)
 
             return frame
 
@@ -233,16 +353,28 @@ class CharacterManagerFrame(DrivenFrame):
 
             def frame_updown():
                 frame_updown = tk.Frame(frame)
+                btn_move_top = ttk.Button(
+                    frame_updown, text="⤒", width=3,
+                    command=self.fac_move_selected_chars_to('top', lambda: 0))
                 btn_move_up = ttk.Button(
                     frame_updown, text="^",
                     command=self.fac_move_selected_chars(-1))
                 btn_move_down = ttk.Button(
                     frame_updown, text="v",
                     command=self.fac_move_selected_chars(1))
-                btn_move_up.grid(row=0, column=0)
-                btn_move_down.grid(row=0, column=1)
+                btn_move_bottom = ttk.Button(
+                    frame_updown, text="⤓", width=3,
+                    command=self.fac_move_selected_chars_to('bottom', lambda: len(self.list_chars.items)))
+                btn_move_top.grid(row=0, column=0)
+                btn_move_up.grid(row=0, column=1)
+                btn_move_down.grid(row=0, column=2)
+                btn_move_bottom.grid(row=0, column=3)
                 return frame_updown
 
+            btn_move_index = ttk.Button(
+                frame, text="Move to #...",
+                command=self.fac_move_selected_chars_to('position', lambda: ask_position(self.list_chars.items)))
+
             btn_sort_alpha = ttk.Button(
                 frame, text="Sort: A-Z",
                 command=self.fac_sort_chars_by(sort_name))
@@ -258,6 +390,10 @@ class CharacterManagerFrame(DrivenFrame):
                 frame, text="Move to...",
                 command=self.interactive_move_sel_to_cat)
 
+            btn_rules = ttk.Button(
+                frame, text="Apply rules...",
+                command=self.interactive_apply_rules)
+
             # btn_char_movecat = ttk.Button(
             #     frame, text="TODO Move to...",
             #     # command=
@@ -271,12 +407,14 @@ class CharacterManagerFrame(DrivenFrame):
             frame_updown().grid(row=y.inc(), column=c, sticky=tk.EW)
             btn_sort_alpha.grid(row=y.inc(), column=c, sticky=tk.EW)
             btn_moveto.grid(row=y.inc(), column=c, sticky=tk.EW)
+            btn_rules.grid(row=y.inc(), column=c, sticky=tk.EW)
 
             y.value = 0
             c = 1
             btn_char_info.grid(row=y.inc(), column=c, sticky=tk.EW)
             btn_char_folder.grid(row=y.inc(), column=c, sticky=tk.EW)
             self.combo_cats.grid(row=y.inc(), column=c, sticky=tk.EW)
+            btn_move_index.grid(row=y.inc(), column=c, sticky=tk.EW)
             # btn_char_movecat.grid(row=y.inc(), sticky=tk.EW)
 
             return frame
@@ -290,8 +428,9 @@ class CharacterManagerFrame(DrivenFrame):
         lab_chars = ttk.Label(self, text="Characters")
         self.list_chars: ItemListFrameRoa = ItemListFrameRoa(
             self, multiple=True,
-            icon_size=RoaEntry.image_sizes['characters']
+            icon_size=RoaEntry.image_sizes['characters'],
             # icon_size=(48, 32)
+            sizes=self.app.disk_usage
         )
 
         self.grid_rowconfigure(0, weight=0)
@@ -310,9 +449,12 @@ class CharacterManagerFrame(DrivenFrame):
         widget_buttons_chars().grid(row=2, column=2)
 
         self.list_cats.bind_select(self.open_selected_category)
+        self.list_cats.bind_sort(self.cats_sorted)
+        self.list_chars.bind_sort(self.chars_sorted)
         self.list_chars.tree.bind('m', self.interactive_move_sel_to_cat)
 
     def load_gui_from_state(self):
+        self.list_chars.invalidate_views()
         category_items: list[CatInfo] = self.gen_listitems_categories()
         self.list_cats.set_items(category_items)
 
@@ -324,10 +466,13 @@ class CharacterManagerFrame(DrivenFrame):
             *[c.label for c in category_items],
             "<NEW>"
         ])
-        self.app.log(f"Loaded {len(category_items)} categories")
+        self.app.log("Loaded %d categories", len(category_items))
 
         # self.open_selected_category()  # done by select
 
+    def redraw_values(self) -> None:
+        self.list_chars.redraw_values()
+
     # Helpers
 
     def get_selected_category(self) -> CatInfo:
@@ -338,68 +483,130 @@ class CharacterManagerFrame(DrivenFrame):
         return selected_cat
 
     def gen_listitems_categories(self) -> list[CatInfo]:
+        layout = self.app.layout
         return [
-            CatInfo(category, len(chars))
-            for category, chars in self.app._inorder_items()
+            CatInfo(category, len(chars), layout.offset_of(category))
+            for category, chars in layout.items()
         ]
 
+    # Search
+
+    def show_search_hits(self, hits: Optional[set[RoaEntry]]) -> None:
+        # Filters the character list of every category; None shows
+        # everything again
+        count = self.list_chars.set_filter(hits)
+        if hits is not None:
+            self.app.log("%d matching characters in %s, %d in total", count, self.get_selected_category().name, len(hits))
+
+    def goto_next_search_hit(self, hits: set[RoaEntry]) -> None:
+        if not hits:
+            return
+        if self.list_chars.select_next_match(
+            [h for h in hits if self.list_chars.shown_positions.get(h, -1) > self.list_chars.cursor]
+        ):
+            return
+
+        # No more hits below the cursor: jump to the first hit in the
+        # following categories, wrapping around to the current one
+        layout = self.app.layout
+        category_indexes = {name: i for i, name in enumerate(layout.order)}
+        current = category_indexes[self.get_selected_category().name]
+        hits = {h for h in hits if layout.has_entry(h)}
+        if not hits:
+            return
+
+        def hit_order(hit: RoaEntry) -> tuple[int, int]:
+            cat_name, position = layout.position_of(hit)
+            return ((category_indexes[cat_name] - current - 1) % len(category_indexes), position)
+
+        next_hit: RoaEntry = min(hits, key=hit_order)
+        self.open_category(layout.category_of(next_hit))
+        self.list_chars.select_items(next_hit)
+
     # Category ordering
 
     def fac_move_selected_cat(self, d: Direction) -> Callable[..., None]:
+        @ui_handler(f"categories.move_{'up' if d < 0 else 'down'}")
         def do_move(event=None):  # noqa: ARG001
-            selected_cat = self.get_selected_category()
-            si: int = self.list_cats.items.index(selected_cat)
-            if (si + d) < 0 or (si + d) >= len(self.app.category_order):
-                return
-
             reordered_items: list[CatInfo] = self.list_cats.move_selected_items(d)
+            self.app.layout.set_order(c.name for c in reordered_items)
+            self.app.is_dirty = True
+            # Start offsets changed
+            category = self.get_selected_category().name
+            self.refresh_categories(open_cat=category, keep_sort=True)
 
-            self.app.category_order[si], self.app.category_order[si + d] = self.app.category_order[si + d], self.app.category_order[si]
-            self.app.dirty = True
-
-            self.app.log(f"New key order: {self.app.category_order}")
-            assert [v.name for v in reordered_items] == self.app.category_order
+            self.app.log("Moved %s %s", category, "up" if d < 0 else "down")
         return do_move
 
     # Character ordering
 
+    # The character list shares the layout's list and position index for the
+    # open category, so reorders go through the layout and the list redraws.
+
     def fac_sort_chars_by(self, key_fn) -> Callable[..., None]:
+        @ui_handler(f"characters.{key_fn.__name__}")
         def do_sort(event=None):  # noqa: ARG001
-            category: CatInfo = self.get_selected_category()
-            characters = self.app.nested_state[category.name]
-
-            sorted_group = sorted(characters, key=key_fn)
-            self.app.nested_state[category.name] = sorted_group
+            category = self.get_selected_category()
+            self.app.layout.sort_category(category.name, key_fn)
             self.app.is_dirty = True
-            self.open_category(category.name)
+            self.list_chars.refresh()
+            self.app.log("Sorted %d characters in %s", category.length, category.name)
+        return do_sort
 
-            assert self.list_chars.items == self.app.nested_state[category.name]
+    @ui_handler()
+    def chars_sorted(self, items: list[RoaEntry]) -> None:
+        category: CatInfo = self.get_selected_category()
+        self.app.layout.set_entries(category.name, items)
+        self.app.is_dirty = True
+        self.app.log("Sorted %d characters in %s", len(items), category.name)
 
-        return do_sort
+    @ui_handler()
+    def cats_sorted(self, items: list[CatInfo]) -> None:
+        self.app.layout.set_order(c.name for c in items)
+        self.app.is_dirty = True
+        self.refresh_categories(open_cat=self.get_selected_category().name, keep_sort=True)
+        self.app.log("Sorted %d categories", len(items))
 
     def fac_move_selected_chars(self, direction: Direction) -> Callable[..., None]:
+        @ui_handler(f"characters.move_{'up' if direction < 0 else 'down'}")
         def do_move(event=None):  # noqa: ARG001
             category = self.get_selected_category()
-            prev_order = tuple(self.app.nested_state[category.name])
+            selected = self.list_chars.selected_items()
 
-            reordered_items: list[RoaEntry] = self.list_chars.move_selected_items(direction)
-            self.app.nested_state[category.name] = reordered_items
+            self.app.layout.move_within(category.name, selected, direction)
             self.app.is_dirty = True
+            self.list_chars.refresh(selected)
 
-            self.app.log(f"Reordered {category.name} from {prev_order} to {reordered_items}")
-            assert self.list_chars.items == reordered_items
+            self.app.log("Moved %d characters in %s", len(selected), category.name)
+        return do_move
+
+    def fac_move_selected_chars_to(self, where: str, index_fn: Callable[[], Optional[int]]) -> Callable[..., None]:
+        @ui_handler(f"characters.move_to_{where}")
+        def do_move(event=None):  # noqa: ARG001
+            index = index_fn()
+            if index is None:
+                return
+            category = self.get_selected_category()
+            selected = self.list_chars.selected_items()
+
+            self.app.layout.move_within_to(category.name, selected, index)
+            self.app.is_dirty = True
+            self.list_chars.refresh(selected)
+
+            self.app.log("Moved %d characters in %s to position %d", len(selected), category.name, index + 1)
         return do_move
 
     # Category actions
 
+    @ui_handler()
     def open_selected_category(self, event=None) -> None:  # noqa: ARG002
         self.open_category(self.get_selected_category().name)
 
     def open_category(self, cat_name: str) -> None:
         if cat_name == self.get_selected_category().name:
-            group_items: list[RoaEntry] = self.app.nested_state[cat_name]
-            self.list_chars.set_items(group_items)
-            self.app.log(f"Loaded {len(group_items)} chars from group {cat_name!r}")
+            group_items: list[RoaEntry] = self.app.layout[cat_name]
+            self.list_chars.show_view(cat_name, group_items, self.app.layout.positions(cat_name))
+            self.app.log("Loaded %d chars from group %r", len(group_items), cat_name)
         else:
             # Update UI in case category was opened programatically
             self.list_cats.select_items(tuple(
@@ -407,43 +614,55 @@ class CharacterManagerFrame(DrivenFrame):
                 if c.name == cat_name
             ))
 
+    @ui_handler()
     def interactive_rename_category(self) -> None:
         cur_cat_name = self.get_selected_category().name
-        new_name = askstring(title=None, prompt=f"New name for {cur_cat_name!r}")
+        with paused():
+            new_name = askstring(title=None, prompt=f"New name for {cur_cat_name!r}")
         if new_name:
             self.rename_category(cur_cat_name, new_name)
             self.open_category(new_name)
 
     def rename_category(self, cat: str, new_name: str) -> None:
-        tups = list(self.app.nested_state.items())
-        for i, t in enumerate(tups):
-            label, charlist = t
-            if label == cat:
-                tups[i] = (new_name, charlist)
-                break
-            self.app.log(f"Couldn't find {cat} in {tups}")
-
-        self.app.nested_state = OrderedDict(tups)
-        self.app.category_order[self.app.category_order.index(cat)] = new_name
+        try:
+            self.app.layout.rename_category(cat, new_name)
+        except (KeyError, ValueError) as e:
+            self.app.log("Couldn't rename %r: %s", cat, e)
+            return
         self.app.is_dirty = True
 
         self.load_gui_from_state()
 
+    @ui_handler()
+    def interactive_optimize_layout(self) -> None:
+        categories = [(c.name, c.length) for c in self.gen_listitems_categories()]
+        with paused():
+            plan: Optional[LayoutPlan] = OptimizeLayoutDialog(self, categories).results
+        if plan is None:
+            return
+
+        self.app.layout.replace(apply_plan(self.app.layout, plan))
+        self.app.is_dirty = True
+        self.load_gui_from_state()
+        self.app.log("Applied layout: waste %d -> %d", plan.waste_before, plan.waste_after)
+
+    @ui_handler()
     def delete_category(self) -> None:
         cat_name: str = self.get_selected_category().name
-        if cat_name is not None and len(self.app.nested_state[cat_name]) == 0:
-            self.app.nested_state.pop(cat_name)
-            self.app.category_order.remove(cat_name)
-            self.app.is_dirty = True
-            self.load_gui_from_state()
-        else:
+        try:
+            self.app.layout.delete_category(cat_name)
+        except ValueError:
             self.app.log("Can only remove empty categories")
+            return
+        self.app.is_dirty = True
+        self.load_gui_from_state()
 
+    @ui_handler()
     def add_category(self) -> Optional[str]:
-        new_name = askstring(title=None, prompt="Name for new category")
-        if new_name and new_name not in self.app.nested_state.keys():
-            self.app.nested_state[new_name] = []
-            self.app.category_order.append(new_name)
+        with paused():
+            new_name = askstring(title=None, prompt="Name for new category")
+        if new_name and new_name not in self.app.layout:
+            self.app.layout.add_category(new_name)
             self.app.is_dirty = True
 
             self.load_gui_from_state()
@@ -454,16 +673,21 @@ class CharacterManagerFrame(DrivenFrame):
 
     # Character actions
 
+    @ui_handler()
     def open_info(self, event=None) -> None:  # noqa: ARG002
+        import webbrowser
+
         for char in self.list_chars.selected_items():
             url = f"steam://openurl/https://steamcommunity.com/sharedfiles/filedetails/?id={char.id}"
             webbrowser.open(url, autoraise=True)
 
+    @ui_handler()
     def open_folder(self, event=None) -> None:  # noqa: ARG002
         for char in self.list_chars.selected_items():
             path = char.value.decode('utf-8')
             os.startfile(path)  # noqa: S606
 
+    @ui_handler()
     def interactive_move_sel_to_cat(self, event=None) -> None:  # noqa: ARG002
         # TODO mirror move char to category via message prommpt
         # ALSO bind this to the listbox as a key
@@ -471,16 +695,9 @@ class CharacterManagerFrame(DrivenFrame):
         src_cat: str = self.get_selected_category().name
         chars_to_move = self.list_chars.selected_items()
 
-        results: Optional[list[str]] = MultiSelectDialog(
-            self,
-            ["New category: "],
-            [
-                [
-                    *[c.label for c in self.gen_listitems_categories()],
-                    "<NEW>"
-                ]
-            ]
-        ).results
+        options = [*[c.label for c in self.gen_listitems_categories()], "<NEW>"]
+        with paused():
+            results: Optional[list[str]] = MultiSelectDialog(self, ["New category: "], [options]).results
 
         if results:
             dest_cat_label = results[0]
@@ -494,19 +711,58 @@ class CharacterManagerFrame(DrivenFrame):
                     self.gen_listitems_categories()
                 }[dest_cat_label]
 
-            for char in chars_to_move:
-                self.move_char_to_category(src_cat, dest_cat, char)
-
-        self.load_gui_from_state()
+            self.move_chars_to_category(src_cat, dest_cat, chars_to_move)
 
-    def move_char_to_category(self, src_cat: str, dest_cat: str, char: RoaEntry) -> None:
-        self.app.log(f"Moving {char} from {src_cat} to {dest_cat}")
-        self.app.nested_state[src_cat].remove(char)
-        self.app.nested_state[dest_cat].append(char)
+    def move_chars_to_category(self, src_cat: str, dest_cat: str, chars: Sequence[RoaEntry]) -> None:
+        # One pass over the source category, one refresh for the whole batch
+        moved = self.app.layout.move_entries(chars, dest_cat)
+        if not moved:
+            return
         self.app.is_dirty = True
 
+        self.app.log("Moved %d characters from %s to %s", moved, src_cat, dest_cat)
+        self.refresh_categories(open_cat=src_cat)
+
+    def refresh_categories(self, open_cat: str, keep_sort: bool = False) -> None:
+        # Unchanged categories compare equal, so their rows are left alone and
+        # only the affected rows are redrawn. After reordering the categories
+        # only their offsets changed, so `keep_sort` keeps the column sort.
+        category_items: list[CatInfo] = self.gen_listitems_categories()
+        self.list_cats.set_items(category_items, keep_sort=keep_sort)
+        self.combo_cats.configure(values=[
+            *[c.label for c in category_items],
+            "<NEW>"
+        ])
+        self.list_cats.select_items(tuple(
+            c for c in category_items
+            if c.name == open_cat
+        ))
+
+    @ui_handler()
+    def interactive_apply_rules(self, event=None) -> None:  # noqa: ARG002
+        with paused():
+            path = filedialog.askopenfilename(
+                title="Open rules file",
+                filetypes=[("YAML", "*.yaml *.yml"), ("All files", "*.*")]
+            )
+        if not path:
+            return
+
+        try:
+            ruleset = load_rules(Path(path))
+        except (OSError, ValueError) as e:
+            self.app.log("Couldn't load rules from %s: %s", path, e)
+            return
+
+        new_state, moved = apply_rules(self.app.layout, ruleset)
+        self.app.layout.replace(new_state)
+        if moved:
+            self.app.is_dirty = True
+
         self.load_gui_from_state()
+        self.app.log("Rules moved %d characters", moved)
 
+    @ui_handler()
     def move_chars_to_combobox_cat(self, event=None) -> None:  # noqa: ARG002
         src_cat: str = self.get_selected_category().name
         dest_cat_label: str = self.combo_cats.get()
@@ -523,8 +779,5 @@ class CharacterManagerFrame(DrivenFrame):
                 self.gen_listitems_categories()
             }[dest_cat_label]
 
-        for char in chars_to_move:
-            self.move_char_to_category(src_cat, dest_cat, char)
-
-        self.open_category(src_cat)
+        self.move_chars_to_category(src_cat, dest_cat, chars_to_move)
         self.combo_cats.set("Move to category...")
@@ -0,0 +1,158 @@
+import itertools
+import tkinter as tk
+from pathlib import Path
+from tkinter import messagebox, ttk
+from tkinter.simpledialog import askstring
+from typing import Optional
+
+from .latency import paused, ui_handler
+from .layout import diff_layouts, read_flat_layout
+from .profiles import ProfileStore
+from .roa import RoaEntry
+
+# Profiles window: snapshot the ROA files under a name, compare snapshots
+# with what's live, and swap them in.
+
+
+class ProfilesWindow(tk.Toplevel):
+    def __init__(self, master, store: Optional[ProfileStore] = None) -> None:
+        super().__init__(master)
+        self.app = master
+        self.title("Re-ROAder profiles")
+        self.geometry("700x450")
+        self.store: ProfileStore = store or ProfileStore()
+
+        self.initwindow()
+        self.refresh()
+
+    @property
+    def roa_dir(self) -> Path:
+        return self.app.order_roa.roa_path.parent
+
+    def initwindow(self) -> None:
+        frame_btns = tk.Frame(self)
+        ttk.Button(frame_btns, text="Save current as...", command=self.save_current).pack(side=tk.LEFT)
+        ttk.Button(frame_btns, text="Activate", command=self.activate_selected).pack(side=tk.LEFT)
+        ttk.Button(frame_btns, text="Diff with exported", command=self.diff_selected).pack(side=tk.LEFT)
+        ttk.Button(frame_btns, text="Delete", command=self.delete_selected).pack(side=tk.RIGHT)
+
+        self.tree = ttk.Treeview(self, columns=['created', 'size', 'chunks'], height=8, selectmode=tk.BROWSE)
+        self.tree.heading('#0', text="Profile")
+        self.tree.heading('created', text="Saved")
+        self.tree.heading('size', text="Size")
+        self.tree.heading('chunks', text="Chunks")
+        self.tree.column('size', width=80, anchor=tk.E)
+        self.tree.column('chunks', width=60, anchor=tk.E)
+        self.tree.tag_configure('active', font=('TkDefaultFont', 9, 'bold'))
+        self.tree.bind("<Double-Button-1>", self.activate_selected)
+
+        self.text = tk.Text(self, height=10, wrap=tk.NONE, state=tk.DISABLED)
+
+        frame_btns.pack(fill='x', side=tk.TOP)
+        self.tree.pack(fill='both', expand=1)
+        self.text.pack(fill='both', expand=1)
+
+    def refresh(self) -> None:
+        active = self.store.active(self.roa_dir)
+        self.tree.delete(*self.tree.get_children())
+        for profile in self.store.profiles():
+            record = profile.record()
+            is_active = profile.name == active
+            self.tree.insert(
+                '', tk.END, iid=profile.name,
+                text=profile.name + (" (active)" if is_active else ""),
+                values=[record['created'], f"{record['bytes'] // 1024} KB", record['chunks']],
+                tags=('active',) if is_active else ()
+            )
+
+    def selected_name(self) -> Optional[str]:
+        selection = self.tree.selection()
+        return selection[0] if selection else None
+
+    def show_text(self, lines: list[str]) -> None:
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        self.text.insert(tk.END, '\n'.join(lines))
+        self.text.configure(state=tk.DISABLED)
+
+    @ui_handler()
+    def save_current(self, event=None) -> None:  # noqa: ARG002
+        if self.app.has_unsaved_changes():
+            with paused():
+                resp = messagebox.askyesnocancel("Unsaved changes", "Profiles snapshot the exported files. Save and export your changes first?", parent=self)
+            if resp is None:
+                return
+            if resp:
+                self.app.save_state_to_roas()
+        with paused():
+            name = askstring("Save profile", "Profile name:", parent=self)
+        if not name:
+            return
+        if name in self.store.names():
+            with paused():
+                if not messagebox.askokcancel("Save profile", f"Replace profile {name!r}?", parent=self):
+                    return
+        try:
+            profile, new_chunks = self.store.save(name, self.roa_dir)
+        except (OSError, ValueError) as e:
+            self.app.log("Couldn't save profile %s: %s", name, e)
+            return
+        self.app.log("Saved profile %s (%d new of %d chunks)", name, new_chunks, profile.record()['chunks'])
+        self.refresh()
+
+    @ui_handler()
+    def activate_selected(self, event=None) -> None:  # noqa: ARG002
+        name = self.selected_name()
+        if name is None:
+            return
+        if self.app.has_unsaved_changes():
+            with paused():
+                if not messagebox.askokcancel("Unsaved changes", f"Discard your unsaved changes and switch to {name!r}?", parent=self):
+                    return
+        try:
+            self.store.activate(name, self.roa_dir)
+        except (OSError, ValueError) as e:
+            self.app.log("Couldn't activate profile %s: %s", name, e)
+            return
+        self.app.load_state_from_roa()
+        self.app.is_dirty = False
+        self.app.log("Activated profile %s", name)
+        self.refresh()
+
+    @ui_handler()
+    def diff_selected(self, event=None) -> None:  # noqa: ARG002
+        name = self.selected_name()
+        if name is None:
+            return
+        entries: dict[bytes, RoaEntry] = {
+            e.value: e for e in itertools.chain(*self.app.order_roa.groups.values())
+        }
+
+        def describe(path: str) -> str:
+            entry = entries.get(path.encode('utf-8'))
+            return f"{entry.name} ({entry.id})" if entry is not None else Path(path).name
+
+        lines = [f"From {name!r} to the exported files:"]
+        for record in diff_layouts(self.store.layout(name), read_flat_layout(self.roa_dir)):
+            kind = record['kind']
+            if kind == 'recategorized':
+                lines.append(f"{kind:<14} {describe(record['path'])}: {record['from']} -> {record['to']}")
+            elif kind == 'moved':
+                lines.append(f"{kind:<14} {record['group']} {describe(record['path'])}: {record['from']} -> {record['to']}")
+            else:
+                lines.append(f"{kind:<14} {record['group']} {describe(record['path'])}")
+        if len(lines) == 1:
+            lines.append("No differences")
+        self.show_text(lines)
+
+    @ui_handler()
+    def delete_selected(self, event=None) -> None:  # noqa: ARG002
+        name = self.selected_name()
+        if name is None:
+            return
+        with paused():
+            if not messagebox.askokcancel("Delete profile", f"Delete profile {name!r}?", parent=self):
+                return
+        freed = self.store.delete(name)
+        self.app.log("Deleted profile %s (%d chunks freed)", name, freed)
+        self.refresh()
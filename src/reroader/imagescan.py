@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Literal, Optional, TypeAlias
+
+from PIL import Image, ImageFile
+
+from .cache import cache_dir, load_json, save_json
+from .profiling import count, timed
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+ImageHealth: TypeAlias = Literal['ok', 'pil', 'broken']
+
+# ok:     clean PNG, any decoder works
+# pil:    fails checksum validation (Tk's "CRC check failed") but PIL recovers it
+# broken: can't be decoded at all, or is missing
+OK: ImageHealth = 'ok'
+NEEDS_PIL: ImageHealth = 'pil'
+BROKEN: ImageHealth = 'broken'
+
+
+def check_image(path: str) -> ImageHealth:
+    # Runs in a worker process
+    try:
+        with Image.open(path, formats=('png',)) as img:
+            img.verify()
+        return OK
+    except Exception:  # noqa: S110
+        pass
+    try:
+        with Image.open(path, formats=('png',)) as img:
+            img.load()
+        return NEEDS_PIL
+    except Exception:
+        return BROKEN
+
+
+class ImageHealthCache():
+    # path -> [mtime_ns, health]. Entries of images that no longer exist are
+    # dropped by the next scan.
+
+    def __init__(self, cache_path: Optional[Path] = None) -> None:
+        self.cache_path: Path = cache_path or cache_dir() / 'image_health.json'
+        self.entries: dict[str, list] = load_json(self.cache_path, {})
+
+    @timed('images.scan')
+    def scan(self, paths: Iterable[str], workers: Optional[int] = None) -> dict[str, ImageHealth]:
+        results: dict[str, ImageHealth] = {}
+        to_check: dict[str, int] = {}
+        changed = False
+        for path in paths:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                results[path] = BROKEN
+                changed |= self.entries.pop(path, None) is not None
+                continue
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == mtime_ns:
+                results[path] = entry[1]
+            else:
+                to_check[path] = mtime_ns
+
+        # Images not asked about, e.g. of entries removed since, only cost a
+        # stat each
+        for path in [p for p in self.entries.keys() - results.keys() - to_check.keys() if not os.path.exists(p)]:
+            del self.entries[path]
+            changed = True
+
+        if to_check:
+            count('images.checked', len(to_check))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                checked = pool.map(check_image, to_check.keys(), chunksize=32)
+                for path, health in zip(to_check.keys(), checked):
+                    results[path] = health
+                    self.entries[path] = [to_check[path], health]
+            changed = True
+        if changed:
+            self.save()
+
+        return results
+
+    def save(self) -> None:
+        save_json(self.cache_path, self.entries)
+
+
+def scan_images(paths: Iterable[str], workers: Optional[int] = None) -> dict[str, ImageHealth]:
+    return ImageHealthCache().scan(paths, workers=workers)
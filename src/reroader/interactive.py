@@ -3,7 +3,7 @@ from prompt_toolkit import completion
 
 import pprint
 
-from .roa import RoaCategoriesFile, RoaOrderFile
+from .roa import RoaCategoriesFile, RoaOrderFile, default_roa_dir
 from .yaml_sync import load_yaml_state
 
 
@@ -63,8 +63,8 @@ def edit_interactive(yaml_state: dict[str, list[str]]):
 
 
 if __name__ == '__main__':
-    from src.main import ROA_DIR
-    order_roa = RoaOrderFile(ROA_DIR / 'order.roa')
-    categories_roa = RoaCategoriesFile(ROA_DIR / 'categories.roa')
+    roa_dir = default_roa_dir()
+    order_roa = RoaOrderFile(roa_dir / 'order.roa')
+    categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
     yaml_state = load_yaml_state(order_roa, categories_roa)
     edit_interactive(yaml_state)
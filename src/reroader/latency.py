@@ -0,0 +1,135 @@
+import bisect
+import functools
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from .profiling import span
+
+# Latency of Tk event handlers, i.e. how long the UI stays frozen per event.
+# Handlers are wrapped with @ui_handler(); modal dialogs they open should be
+# wrapped in `with paused():` so time spent waiting on the user isn't
+# counted. Everything here runs on the Tk thread.
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# One frame at 60 Hz, and the point where a UI feels unresponsive
+FRAME_BUDGETS_MS: tuple[int, ...] = (16, 100)
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended
+BUCKET_BOUNDS_MS: tuple[float, ...] = (1, 2, 4, 8, 16, 33, 66, 100, 250, 500, 1000, 2500)
+
+_spark = ' ▁▂▃▄▅▆▇█'
+
+
+@dataclass
+class HandlerStats():
+    name: str
+    calls: int = 0
+    total_ns: int = 0
+    max_ns: int = 0
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(BUCKET_BOUNDS_MS) + 1))
+    over_budget: list[int] = field(default_factory=lambda: [0] * len(FRAME_BUDGETS_MS))
+
+    def record(self, ns: int) -> None:
+        ms = ns / 1e6
+        self.calls += 1
+        self.total_ns += ns
+        self.max_ns = max(self.max_ns, ns)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        for i, budget in enumerate(FRAME_BUDGETS_MS):
+            if ms > budget:
+                self.over_budget[i] += 1
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ns / self.calls / 1e6 if self.calls else 0.0
+
+    @property
+    def max_ms(self) -> float:
+        return self.max_ns / 1e6
+
+    def percentile_ms(self, fraction: float) -> float:
+        # Upper bound of the bucket holding the percentile, capped at the max
+        rank = fraction * self.calls
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                bound = BUCKET_BOUNDS_MS[i] if i < len(BUCKET_BOUNDS_MS) else self.max_ms
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def histogram(self) -> str:
+        peak = max(self.buckets) or 1
+        return ''.join(_spark[-(-n * (len(_spark) - 1) // peak)] for n in self.buckets)
+
+
+class LatencyMonitor():
+    def __init__(self, slow_log_size: int = 200) -> None:
+        self.stats: dict[str, HandlerStats] = {}
+        # (time.time(), name, ms) of recent calls over the largest budget
+        self.slow_calls: deque[tuple[float, str, float]] = deque(maxlen=slow_log_size)
+        # Paused ns for every handler currently running, outermost first
+        self._active: list[list[int]] = []
+
+    def record(self, name: str, ns: int) -> None:
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = HandlerStats(name)
+        stats.record(ns)
+        ms = ns / 1e6
+        if ms > FRAME_BUDGETS_MS[-1]:
+            self.slow_calls.append((time.time(), name, ms))
+
+    def wrap(self, fn: F, name: str) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            paused_ns = [0]
+            self._active.append(paused_ns)
+            start = time.perf_counter_ns()
+            try:
+                with span(name):
+                    return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start - paused_ns[0]
+                self._active.pop()
+                self.record(name, elapsed)
+        return wrapper  # type: ignore
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            for paused_ns in self._active:
+                paused_ns[0] += elapsed
+
+    def handlers(self) -> list[HandlerStats]:
+        # Worst first
+        return sorted(self.stats.values(), key=lambda s: s.max_ns, reverse=True)
+
+    def reset(self) -> None:
+        self.stats.clear()
+        self.slow_calls.clear()
+
+
+monitor = LatencyMonitor()
+
+
+def handler_name(fn: Callable) -> str:
+    return fn.__qualname__.replace('.<locals>', '')
+
+
+def ui_handler(name: Optional[str] = None) -> Callable[[F], F]:
+    def decorate(fn: F) -> F:
+        return monitor.wrap(fn, name or handler_name(fn))
+    return decorate
+
+
+def paused() -> Any:
+    return monitor.paused()
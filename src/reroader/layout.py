@@ -0,0 +1,376 @@
+import itertools
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Callable, Collection, Iterable, Iterator, Optional
+
+from .profiling import timed
+from .reorder import Direction, build_positions, move_by, move_to, stable_indices
+from .roa import RoaCategoriesFile, RoaCategory, RoaEntry, RoaOrderFile
+
+# In-memory character layout: ordered categories of entries, with an
+# entry -> category index and lazily built per-category position indexes.
+# Independent of Tk, so the GUI, the CLI and the yaml sync can all drive it
+# and it can be benchmarked headless.
+#
+# Time bounds, for c categories, n entries in a category, k entries moved:
+#   rename_category, add_category, category_of     O(1)
+#   position_of                                    O(1), O(n) to rebuild after a replace
+#   move_within / move_within_to                   O(k log k) / O(n)
+#   move_entries                                   O(k), plus O(n) per source category
+#   set_order, delete_category                     O(c)
+#   offset_of                                      O(1), O(c) to rebuild after a change
+#   reconcile                                      O(N) for N characters in total
+#
+# On disk the layout is flat: one character list, and categories that each
+# start at an index into it. Conversions work on (label, start, end) spans
+# over that list, so each category is a single slice.
+
+
+class _Category():
+    __slots__ = ('name', 'entries', 'positions')
+
+    def __init__(self, name: str, entries: list[RoaEntry]) -> None:
+        self.name: str = name
+        self.entries: list[RoaEntry] = entries
+        self.positions: Optional[dict[RoaEntry, int]] = None
+
+
+# A layout as stored: the entry paths of each group, and the category headers
+FlatLayout = tuple[Mapping[str, list[bytes]], list[RoaCategory]]
+
+
+def category_spans(categories: Iterable[RoaCategory], count: int) -> list[tuple[str, int, int]]:
+    """
+    >>> category_spans([RoaCategory(2, b'a'), RoaCategory(2, b'b'), RoaCategory(9, b'c')], 5)
+    [('', 0, 2), ('b', 2, 5)]
+    """
+    # (label, start, end) for every nonempty category over `count` characters.
+    # Characters before the first category are labeled ''; of several
+    # categories starting at the same index, the last one wins.
+    starts: dict[int, str] = {
+        c.index: c.label.decode('utf-8')
+        for c in categories
+        if 0 <= c.index < count
+    }
+    spans: list[tuple[str, int, int]] = []
+    label, start = '', 0
+    for index in sorted(starts):
+        if index > start:
+            spans.append((label, start, index))
+        label, start = starts[index], index
+    if count > start:
+        spans.append((label, start, count))
+    return spans
+
+
+def roa_zip_chars(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile) -> dict[str, list[RoaEntry]]:
+    """
+    >>> order_roa = RoaOrderFile(Path('order.roa'), load=False)
+    >>> categories_roa = RoaCategoriesFile(Path('categories.roa'), load=False)
+    >>> characters = order_roa.groups['characters'] = [RoaEntry(b'/workshop/%d' % i) for i in range(5)]
+    >>> categories = categories_roa.categories = [RoaCategory(0, b'a'), RoaCategory(3, b'b')]
+    >>> groups = roa_zip_chars(order_roa, categories_roa)
+    >>> {label: [e.id for e in entries] for label, entries in groups.items()}
+    {'a': ['0', '1', '2'], 'b': ['3', '4']}
+    >>> roa_unzip_chars(LayoutModel(groups).spans(), groups.values()) == (characters, categories)
+    True
+    """
+    characters: list[RoaEntry] = order_roa.groups['characters']
+    data: OrderedDict[str, list[RoaEntry]] = OrderedDict()
+    for label, start, end in category_spans(categories_roa.categories, len(characters)):
+        if label in data:
+            data[label].extend(characters[start:end])
+        else:
+            data[label] = characters[start:end]
+    return data
+
+
+def roa_unzip_chars(spans: Iterable[tuple[str, int, int]], groups: Iterable[list[RoaEntry]]) -> tuple[list[RoaEntry], list[RoaCategory]]:
+    # Inverse of roa_zip_chars: flat character list and category headers
+    categories = [
+        RoaCategory(start, label.encode('utf-8'))
+        for label, start, end in spans
+        if end > start
+    ]
+    return list(itertools.chain.from_iterable(groups)), categories
+
+
+class LayoutModel(Mapping):
+    """
+    >>> a, b, c, d = (RoaEntry(b'/workshop/%d' % i) for i in range(1, 5))
+    >>> layout = LayoutModel({'x': [a, b, c], 'y': [d]})
+    >>> ids = lambda: {name: [e.id for e in entries] for name, entries in layout.items()}
+    >>> layout.move_within('x', [c], -1); ids()
+    {'x': ['1', '3', '2'], 'y': ['4']}
+    >>> layout.move_within_to('x', [a, b], 1); ids()
+    {'x': ['3', '1', '2'], 'y': ['4']}
+    >>> layout.move_entries([b, d], 'y'), ids()
+    (1, {'x': ['3', '1'], 'y': ['4', '2']})
+    >>> layout.position_of(b), layout.offset_of('y')
+    (('y', 1), 2)
+    """
+
+    def __init__(self, categories: Optional[Mapping[str, Iterable[RoaEntry]]] = None) -> None:
+        self._order: list[_Category] = []
+        self._by_name: dict[str, _Category] = {}
+        self._category_of: dict[RoaEntry, _Category] = {}
+        # Category name -> offset of its first character, dropped whenever
+        # a length, name or the order changes
+        self._offsets: Optional[dict[str, int]] = None
+        if categories is not None:
+            self.replace(categories)
+
+    @classmethod
+    @timed('layout.zip')
+    def from_roa(cls, order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile) -> 'LayoutModel':
+        return cls(roa_zip_chars(order_roa, categories_roa))
+
+    @timed('layout.unzip')
+    def to_roa(self, order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile) -> None:
+        characters, categories = roa_unzip_chars(self.spans(), (c.entries for c in self._order))
+        categories_roa.categories[:] = categories
+        order_roa.groups['characters'] = characters
+
+    # Mapping interface: category name -> entries, in category order
+
+    def __getitem__(self, name: str) -> list[RoaEntry]:
+        return self._by_name[name].entries
+
+    def __iter__(self) -> Iterator[str]:
+        return (c.name for c in self._order)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._by_name
+
+    # Queries
+
+    @property
+    def order(self) -> list[str]:
+        return [c.name for c in self._order]
+
+    def entries(self) -> Iterator[RoaEntry]:
+        for category in self._order:
+            yield from category.entries
+
+    def has_entry(self, entry: RoaEntry) -> bool:
+        return entry in self._category_of
+
+    def category_of(self, entry: RoaEntry) -> str:
+        return self._category_of[entry].name
+
+    def positions(self, name: str) -> dict[RoaEntry, int]:
+        # Shared, kept up to date in place by moves within the category
+        category = self._by_name[name]
+        if category.positions is None:
+            category.positions = build_positions(category.entries)
+        return category.positions
+
+    def position_of(self, entry: RoaEntry) -> tuple[str, int]:
+        category = self._category_of[entry]
+        return (category.name, self.positions(category.name)[entry])
+
+    def offset_of(self, name: str) -> int:
+        # Index of the category's first character in the flat character list
+        if self._offsets is None:
+            self._offsets = {}
+            offset = 0
+            for category in self._order:
+                self._offsets[category.name] = offset
+                offset += len(category.entries)
+        return self._offsets[name]
+
+    def spans(self) -> list[tuple[str, int, int]]:
+        # (name, start, end) of every category over the flat character list
+        spans: list[tuple[str, int, int]] = []
+        offset = 0
+        for category in self._order:
+            spans.append((category.name, offset, offset + len(category.entries)))
+            offset += len(category.entries)
+        return spans
+
+    # Category operations
+
+    def add_category(self, name: str, entries: Iterable[RoaEntry] = ()) -> None:
+        if name in self._by_name:
+            raise ValueError(f"Category {name!r} already exists")
+        category = _Category(name, [])
+        self._order.append(category)
+        self._by_name[name] = category
+        self.set_entries(name, entries if isinstance(entries, list) else list(entries))
+
+    def delete_category(self, name: str) -> None:
+        category = self._by_name[name]
+        if category.entries:
+            raise ValueError(f"Category {name!r} isn't empty")
+        self._order.remove(category)
+        del self._by_name[name]
+        self._offsets = None
+
+    def rename_category(self, name: str, new_name: str) -> None:
+        if new_name in self._by_name:
+            raise ValueError(f"Category {new_name!r} already exists")
+        category = self._by_name.pop(name)
+        category.name = new_name
+        self._by_name[new_name] = category
+        self._offsets = None
+
+    def set_order(self, names: Iterable[str]) -> None:
+        order = [self._by_name[name] for name in names]
+        if len(order) != len(self._order) or len(set(map(id, order))) != len(order):
+            raise ValueError("New order must name every category exactly once")
+        self._order = order
+        self._offsets = None
+
+    def replace(self, categories: Mapping[str, Iterable[RoaEntry]]) -> None:
+        self._order = []
+        self._by_name = {}
+        self._category_of = {}
+        self._offsets = None
+        for name, entries in categories.items():
+            self.add_category(name, entries)
+
+    def reconcile(self, characters: Iterable[RoaEntry], new_category: str = 'unsorted') -> tuple[int, int]:
+        """
+        >>> a, b, c = (RoaEntry(b'/workshop/%d' % i) for i in range(1, 4))
+        >>> layout = LayoutModel({'x': [a, b]})
+        >>> layout.reconcile([c, a])
+        (1, 1)
+        >>> {name: [e.id for e in entries] for name, entries in layout.items()}
+        {'x': ['1'], 'unsorted': ['3']}
+        """
+        # For when the character list changed under the layout, e.g. entries
+        # were pruned or scanned in: drops entries that are no longer listed
+        # and appends unknown ones to new_category. Returns (removed, added).
+        characters = list(characters)
+        present = set(characters)
+        removed = 0
+        for category in self._order:
+            kept = [e for e in category.entries if e in present]
+            if len(kept) != len(category.entries):
+                removed += len(category.entries) - len(kept)
+                self.set_entries(category.name, kept)
+        new = [e for e in characters if e not in self._category_of]
+        if new and new_category in self._by_name:
+            self.set_entries(new_category, self[new_category] + new)
+        elif new:
+            self.add_category(new_category, new)
+        return removed, len(new)
+
+    # Entry operations
+
+    def set_entries(self, name: str, entries: list[RoaEntry]) -> None:
+        # Takes ownership of `entries`. Passing the category's own list back
+        # after reordering it in place just refreshes the position index.
+        category = self._by_name[name]
+        if entries is category.entries:
+            if category.positions is not None:
+                category.positions.clear()
+                category.positions.update(build_positions(entries))
+            return
+
+        for entry in category.entries:
+            if self._category_of.get(entry) is category:
+                del self._category_of[entry]
+        for entry in entries:
+            self._category_of[entry] = category
+        category.entries = entries
+        category.positions = None
+        self._offsets = None
+
+    def move_entries(self, entries: Collection[RoaEntry], dest: str) -> int:
+        # Move entries from wherever they are to the end of `dest`
+        dest_category = self._by_name[dest]
+        moving: list[RoaEntry] = [e for e in entries if self._category_of[e] is not dest_category]
+        if not moving:
+            return 0
+
+        by_source: dict[_Category, set[RoaEntry]] = defaultdict(set)
+        for entry in moving:
+            by_source[self._category_of[entry]].add(entry)
+        for source, removed in by_source.items():
+            source.entries = [e for e in source.entries if e not in removed]
+            source.positions = None
+
+        # Sources get new lists, the destination is appended to in place
+        start = len(dest_category.entries)
+        dest_category.entries.extend(moving)
+        for i, entry in enumerate(moving, start=start):
+            self._category_of[entry] = dest_category
+            if dest_category.positions is not None:
+                dest_category.positions[entry] = i
+        self._offsets = None
+        return len(moving)
+
+    def move_within(self, name: str, entries: Collection[RoaEntry], direction: Direction) -> None:
+        move_by(self[name], self.positions(name), entries, direction)
+
+    def move_within_to(self, name: str, entries: Collection[RoaEntry], index: int) -> None:
+        move_to(self[name], self.positions(name), entries, index)
+
+    def sort_category(self, name: str, key_fn: Callable[[RoaEntry], Any], reverse: bool = False) -> None:
+        self[name].sort(key=key_fn, reverse=reverse)
+        self.set_entries(name, self[name])
+
+
+# Diffs between stored layouts, e.g. two profiles or a folder and an export
+
+def read_flat_layout(roa_dir: Path) -> FlatLayout:
+    # As on disk, without pruning or scanning
+    order_roa = RoaOrderFile(roa_dir / 'order.roa', scan=False)
+    categories_roa = RoaCategoriesFile(roa_dir / 'categories.roa')
+    return {k: [e.value for e in v] for k, v in order_roa.groups.items()}, categories_roa.categories
+
+
+def moved_values(old: list[bytes], new: list[bytes]) -> set[bytes]:
+    """
+    >>> moved_values([b'a', b'b', b'c', b'd'], [b'b', b'c', b'a', b'd', b'e'])
+    {b'a'}
+    """
+    # Entries in both lists that changed their relative order: everything
+    # outside a longest run that kept it
+    new_index = {v: i for i, v in enumerate(new)}
+    common = [v for v in old if v in new_index]
+    kept = stable_indices([new_index[v] for v in common])
+    return {v for k, v in enumerate(common) if k not in kept}
+
+
+def labels_by_value(characters: list[bytes], categories: list[RoaCategory]) -> dict[bytes, str]:
+    labels: dict[bytes, str] = {}
+    for label, start, end in category_spans(categories, len(characters)):
+        for value in characters[start:end]:
+            labels[value] = label
+    return labels
+
+
+def diff_layouts(old_layout: FlatLayout, new_layout: FlatLayout) -> Iterator[dict[str, Any]]:
+    # One record per added, removed, moved or recategorized entry
+    old_groups, old_categories = old_layout
+    new_groups, new_categories = new_layout
+
+    for group in RoaOrderFile.group_labels:
+        old = old_groups.get(group, [])
+        new = new_groups.get(group, [])
+        old_set, new_set = set(old), set(new)
+        for i, value in enumerate(old):
+            if value not in new_set:
+                yield {'kind': 'removed', 'group': group, 'index': i, 'path': value.decode('utf-8')}
+        for i, value in enumerate(new):
+            if value not in old_set:
+                yield {'kind': 'added', 'group': group, 'index': i, 'path': value.decode('utf-8')}
+        moved = moved_values(old, new)
+        if moved:
+            old_index = {v: i for i, v in enumerate(old)}
+            for i, value in enumerate(new):
+                if value in moved:
+                    yield {'kind': 'moved', 'group': group, 'from': old_index[value], 'to': i, 'path': value.decode('utf-8')}
+
+    old_labels = labels_by_value(old_groups.get('characters', []), old_categories)
+    new_labels = labels_by_value(new_groups.get('characters', []), new_categories)
+    for value, label in new_labels.items():
+        old_label = old_labels.get(value)
+        if old_label is not None and old_label != label:
+            yield {'kind': 'recategorized', 'path': value.decode('utf-8'), 'from': old_label, 'to': label}
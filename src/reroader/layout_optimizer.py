@@ -0,0 +1,192 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Mapping, Optional, Sequence
+
+from .roa import RoaEntry
+
+# Slot waste is the number of empty cells a category leaves at the end of its
+# last row on the character select grid, `width` cells wide. The first
+# category shares its grid with the random-character slot, so it counts one
+# extra cell (see CatInfo.slot_waste_4/16).
+#
+# Ordering only matters through which category goes first. Splitting a
+# category never helps: (-a % w) + (-b % w) >= -(a + b) % w. So the search is
+# over merges (a partition of the categories) plus the choice of first group.
+
+
+def slot_waste(length: int, width: int, first: bool = False) -> int:
+    return (width - length - (1 if first else 0)) % width
+
+
+@dataclass
+class LayoutPlan():
+    groups: list[list[str]]
+    width: int
+    waste_before: int
+    waste_after: int
+    exact: bool
+
+    @property
+    def labels(self) -> list[str]:
+        return [' + '.join(group) for group in self.groups]
+
+    @property
+    def merges(self) -> int:
+        return sum(len(group) - 1 for group in self.groups)
+
+
+def total_waste(lengths: Sequence[int], width: int) -> int:
+    return sum(slot_waste(length, width, first=(i == 0)) for i, length in enumerate(lengths))
+
+
+def _order_groups(groups: list[list[int]], first: Optional[int]) -> list[list[int]]:
+    # Keep the user's order (by each group's earliest member), with the
+    # chosen group pulled to the front
+    groups = sorted(groups, key=min)
+    if first is not None:
+        groups.insert(0, groups.pop(first))
+    return groups
+
+
+def _best_first(group_lengths: list[int], width: int) -> Optional[int]:
+    # Group that saves the most by taking the shared first slot
+    if not group_lengths:
+        return None
+    savings = [
+        slot_waste(length, width) - slot_waste(length, width, first=True)
+        for length in group_lengths
+    ]
+    best = max(range(len(savings)), key=lambda i: (savings[i], -i))
+    return best
+
+
+def _plan_heuristic(lengths: list[int], width: int, merge_penalty: float, allow_merge: bool, deadline: float) -> list[list[int]]:
+    # Greedy pairwise merging over residue buckets. Groups with the same
+    # residue are interchangeable, so each step only compares width^2 pairs.
+    buckets: dict[int, list[list[int]]] = {}
+    for i, length in enumerate(lengths):
+        buckets.setdefault(length % width, []).append([i])
+
+    while allow_merge and time.monotonic() < deadline:
+        best_gain, best_pair = 0.0, None
+        for r1 in range(1, width):
+            if not buckets.get(r1):
+                continue
+            for r2 in range(r1, width):
+                if not buckets.get(r2) or (r1 == r2 and len(buckets[r1]) < 2):
+                    continue
+                gain = (width - r1) + (width - r2) - slot_waste(r1 + r2, width) - merge_penalty
+                if gain > best_gain:
+                    best_gain, best_pair = gain, (r1, r2)
+        if best_pair is None:
+            break
+        r1, r2 = best_pair
+        a = buckets[r1].pop()
+        b = buckets[r2].pop()
+        buckets.setdefault((r1 + r2) % width, []).append(a + b)
+
+    return [group for bucket in buckets.values() for group in bucket]
+
+
+def _plan_exact(lengths: list[int], width: int, merge_penalty: float, allow_merge: bool, deadline: float) -> Optional[list[list[int]]]:
+    # Subset DP over the categories with a nonzero residue; each state also
+    # tracks whether the shared first slot has been given out. Returns None
+    # if the time budget runs out.
+    movable = [i for i, length in enumerate(lengths) if length % width]
+    fixed = [[i] for i, length in enumerate(lengths) if not length % width]
+    n = len(movable)
+    if not allow_merge or n == 0:
+        return [*fixed, *([i] for i in movable)]
+
+    full = (1 << n) - 1
+    sums = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + lengths[movable[low.bit_length() - 1]]
+    sizes = [bin(mask).count('1') for mask in range(full + 1)]
+
+    inf = float('inf')
+    best = [[inf, inf] for _ in range(full + 1)]
+    choice: list[list[tuple[int, int]]] = [[(0, 0), (0, 0)] for _ in range(full + 1)]
+    best[0] = [0, inf]
+
+    for mask in range(1, full + 1):
+        if mask & 0xff == 0 and time.monotonic() > deadline:
+            return None
+        low = mask & -mask
+        rest_bits = mask ^ low
+        sub_rest = rest_bits
+        while True:
+            sub = sub_rest | low
+            rest = mask ^ sub
+            penalty = merge_penalty * (sizes[sub] - 1)
+            cost0 = slot_waste(sums[sub], width) + penalty
+            cost1 = slot_waste(sums[sub], width, first=True) + penalty
+            if cost0 + best[rest][0] < best[mask][0]:
+                best[mask][0] = cost0 + best[rest][0]
+                choice[mask][0] = (sub, 0)
+            if cost1 + best[rest][0] < best[mask][1]:
+                best[mask][1] = cost1 + best[rest][0]
+                choice[mask][1] = (sub, 1)
+            if cost0 + best[rest][1] < best[mask][1]:
+                best[mask][1] = cost0 + best[rest][1]
+                choice[mask][1] = (sub, 0)
+            if sub_rest == 0:
+                break
+            sub_rest = (sub_rest - 1) & rest_bits
+
+    groups: list[list[int]] = []
+    mask, flag = full, 1
+    while mask:
+        sub, sub_flag = choice[mask][flag]
+        groups.append([movable[b] for b in range(n) if sub >> b & 1])
+        mask ^= sub
+        if sub_flag:
+            flag = 0
+    return [*fixed, *groups]
+
+
+def optimize_layout(
+    categories: Sequence[tuple[str, int]],
+    width: int = 4,
+    allow_merge: bool = False,
+    merge_penalty: float = 1,
+    exact_limit: int = 12,
+    time_budget: float = 1.0
+) -> LayoutPlan:
+    # `categories` is (name, length) in the current order. Exact for up to
+    # `exact_limit` categories that could benefit from merging, greedy above
+    # that or when the time budget runs out.
+    deadline = time.monotonic() + time_budget
+    names = [name for name, _ in categories]
+    lengths = [length for _, length in categories]
+
+    movable_count = sum(1 for length in lengths if length % width)
+    groups: Optional[list[list[int]]] = None
+    exact = False
+    if movable_count <= exact_limit:
+        groups = _plan_exact(lengths, width, merge_penalty, allow_merge, deadline)
+        exact = groups is not None
+    if groups is None:
+        groups = _plan_heuristic(lengths, width, merge_penalty, allow_merge, deadline)
+
+    groups = _order_groups(groups, None)
+    first = _best_first([sum(lengths[i] for i in g) for g in groups], width)
+    groups = _order_groups(groups, first)
+
+    group_lengths = [sum(lengths[i] for i in g) for g in groups]
+    return LayoutPlan(
+        groups=[[names[i] for i in sorted(g)] for g in groups],
+        width=width,
+        waste_before=total_waste(lengths, width),
+        waste_after=total_waste(group_lengths, width),
+        exact=exact
+    )
+
+
+def apply_plan(nested_state: Mapping[str, list[RoaEntry]], plan: LayoutPlan) -> OrderedDict[str, list[RoaEntry]]:
+    return OrderedDict(
+        (label, [entry for name in group for entry in nested_state[name]])
+        for label, group in zip(plan.labels, plan.groups)
+    )
@@ -0,0 +1,90 @@
+import logging
+import os
+import sys
+from collections import deque
+from typing import Optional
+
+from .settings import env_int
+
+# Modules log through logging.getLogger(__name__), with %-style arguments so
+# messages are only formatted when a handler actually shows or writes them.
+# The ring buffer keeps the most recent records unformatted for the status
+# bar and the log viewer.
+#
+# REROADER_LOG_LEVEL   level for the 'reroader' loggers (default INFO;
+#                      DEBUG adds a line per pruned/added/missing entry)
+# REROADER_LOG_FILE    also append formatted records to this file
+
+LOGGER_NAME = 'reroader'
+DEFAULT_CAPACITY: int = env_int('REROADER_LOG_CAPACITY', 5000, minimum=1)
+
+FILE_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        super().__init__(logging.DEBUG)
+        self.records: deque[logging.LogRecord] = deque(maxlen=capacity)
+        # Number of records ever emitted; readers compare it to spot new ones
+        self.seq: int = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records.append(record)
+        self.seq += 1
+
+    def tail(self, count: int, level: int = logging.NOTSET) -> list[logging.LogRecord]:
+        found: list[logging.LogRecord] = []
+        for record in reversed(self.records):
+            if record.levelno >= level:
+                found.append(record)
+                if len(found) >= count:
+                    break
+        found.reverse()
+        return found
+
+    def clear(self) -> None:
+        self.records.clear()
+
+
+_ring: Optional[RingBufferHandler] = None
+
+
+def ring_buffer() -> RingBufferHandler:
+    global _ring
+    if _ring is None:
+        _ring = RingBufferHandler()
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.addHandler(_ring)
+        level = os.environ.get('REROADER_LOG_LEVEL', 'INFO').upper()
+        if not isinstance(logging.getLevelName(level), int):
+            logging.getLogger(__name__).warning("Ignoring REROADER_LOG_LEVEL=%r: not a level name, using INFO", level)
+            level = 'INFO'
+        logger.setLevel(level)
+    return _ring
+
+
+def setup_logging(console: bool = True) -> RingBufferHandler:
+    # Idempotent
+    ring = ring_buffer()
+    logger = logging.getLogger(LOGGER_NAME)
+    if getattr(logger, '_reroader_configured', False):
+        return ring
+    logger._reroader_configured = True  # type: ignore
+
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(console_handler)
+    if log_file := os.environ.get('REROADER_LOG_FILE'):
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter(FILE_FORMAT))
+        logger.addHandler(file_handler)
+    logger.propagate = False
+    return ring
+
+
+def format_record(record: logging.LogRecord) -> str:
+    try:
+        return record.getMessage()
+    except Exception as e:
+        return f"{record.msg!r} (unformattable: {e})"
@@ -0,0 +1,117 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from .layout import LayoutModel
+from .roa import RoaCategoriesFile, RoaOrderFile
+from .rules import apply_rules, load_rules
+
+# Maintenance over several targets (folders with order.roa and
+# categories.roa): prune entries that disappeared from disk, scan the
+# workshop roots for new ones, optionally apply a rules file, and save. Each
+# target runs in its own worker process; results stream back as they finish
+# and add up to one summary.
+
+
+@dataclass
+class TargetReport():
+    roa_dir: str
+    entries: int = 0
+    pruned: int = 0
+    added: int = 0
+    moved: int = 0
+    saved: bool = False
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    def record(self) -> dict:
+        return {'kind': 'target', **asdict(self)}
+
+
+def maintain_target(roa_dir: str, roots: list[str], rules_path: Optional[str], dry_run: bool) -> TargetReport:
+    """
+    Runs in a worker process, so it takes and returns plain data.
+
+    >>> import tempfile
+    >>> tmp = Path(tempfile.mkdtemp())
+    >>> order_roa = RoaOrderFile(tmp / 'order.roa', load=False)
+    >>> order_roa.groups.update((label, []) for label in order_roa.group_labels)
+    >>> order_roa.save_file()
+    >>> RoaCategoriesFile(tmp / 'categories.roa', load=False).save_file()
+    >>> (tmp / 'root' / '123').mkdir(parents=True)
+    >>> _ = (tmp / 'root' / '123' / 'config.ini').write_text('[general]\\ntype="1"\\n')
+    >>> report = maintain_target(str(tmp), [str(tmp / 'root')], None, False)
+    >>> report.added, report.saved
+    (1, True)
+    >>> report = maintain_target(str(tmp), [str(tmp / 'root')], None, False)
+    >>> report.added, report.saved
+    (0, False)
+    """
+    start = time.perf_counter()
+    report = TargetReport(roa_dir)
+    try:
+        order_roa = RoaOrderFile(Path(roa_dir) / 'order.roa', scan=False, roots=[Path(r) for r in roots])
+        categories_roa = RoaCategoriesFile(Path(roa_dir) / 'categories.roa')
+        # Zipped before pruning, so categories keep their characters
+        layout = LayoutModel.from_roa(order_roa, categories_roa)
+
+        report.pruned = order_roa.prune_deleted_entries()
+        report.added = order_roa.scan_for_new_entries()
+        layout.reconcile(order_roa.groups['characters'])
+        if rules_path is not None:
+            new_state, report.moved = apply_rules(layout, load_rules(Path(rules_path)))
+            layout.replace(new_state)
+        layout.to_roa(order_roa, categories_roa)
+
+        report.entries = sum(len(group) for group in order_roa.groups.values())
+        changed = report.pruned or report.added or report.moved
+        if not dry_run and (changed or order_roa.is_dirty() or categories_roa.is_dirty()):
+            order_roa.save_file()
+            categories_roa.save_file()
+            report.saved = True
+    except Exception as e:
+        # One broken target shouldn't stop the others
+        report.error = f"{type(e).__name__}: {e}"
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def maintain_targets(
+    roa_dirs: Iterable[Path],
+    roots: Iterable[Path] = (),
+    rules_path: Optional[Path] = None,
+    dry_run: bool = False,
+    workers: Optional[int] = None,
+) -> Iterator[TargetReport]:
+    # Reports come back in completion order
+    targets = [str(d) for d in roa_dirs]
+    root_args = [str(r) for r in roots]
+    rules_arg = str(rules_path) if rules_path is not None else None
+    if len(targets) == 1 or workers == 1:
+        for target in targets:
+            yield maintain_target(target, root_args, rules_arg, dry_run)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers or min(len(targets), os.cpu_count() or 1)) as pool:
+        futures = [pool.submit(maintain_target, target, root_args, rules_arg, dry_run) for target in targets]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def summary_record(reports: list[TargetReport], seconds: float) -> dict:
+    return {
+        'kind': 'summary',
+        'targets': len(reports),
+        'failed': sum(r.error is not None for r in reports),
+        'saved': sum(r.saved for r in reports),
+        'entries': sum(r.entries for r in reports),
+        'pruned': sum(r.pruned for r in reports),
+        'added': sum(r.added for r in reports),
+        'moved': sum(r.moved for r in reports),
+        'seconds': round(seconds, 3),
+        # Time the targets would have taken one after another
+        'serial_seconds': round(sum(r.seconds for r in reports), 3),
+    }
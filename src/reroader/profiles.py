@@ -0,0 +1,249 @@
+import hashlib
+import os
+import re
+import sys
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .cache import load_json, save_json
+from .layout import FlatLayout
+from .profiling import timed
+from .roa import RoaCategoriesFile, RoaOrderFile
+
+# Named snapshots of order.roa and categories.roa.
+#
+#   <store>/profiles/<name>.json   manifest: the chunk hashes of each file
+#   <store>/objects/ab/cdef...     zlib-compressed chunk, named by the sha256
+#                                  of its uncompressed bytes
+#
+# Files are cut into chunks at record (NUL) boundaries chosen by the content
+# of the record, not its offset, so layouts that share most of their entries
+# share most of their chunks even after insertions and moves. Activating a
+# profile writes both files next to the originals, then renames them over,
+# so the game never sees a half-written file.
+
+ROA_FILES: tuple[str, ...] = ('order.roa', 'categories.roa')
+
+# A record ends a chunk when the low bits of its crc32 are zero: about one
+# in 256 records, or ~20 KB of workshop paths per chunk
+CHUNK_MASK: int = 0xff
+MAX_CHUNK: int = 256 * 1024
+
+# Activating a profile first snapshots the live files under this name
+PREVIOUS: str = '_previous'
+
+_valid_name = re.compile(r'[\w][\w .-]{0,63}')
+
+
+class ProfileError(ValueError):
+    # A bad profile name, or a profile whose stored files are damaged
+    pass
+
+
+class UnknownProfile(ProfileError):
+    pass
+
+
+def default_store_dir() -> Path:
+    if env_dir := os.environ.get('REROADER_PROFILE_DIR'):
+        return Path(env_dir)
+    if sys.platform == 'win32' and 'LOCALAPPDATA' in os.environ:
+        return Path(os.environ['LOCALAPPDATA']) / 'reroader' / 'profiles'
+    return Path(os.environ.get('XDG_DATA_HOME', Path.home() / '.local' / 'share')) / 'reroader' / 'profiles'
+
+
+def chunk_records(data: bytes, mask: int = CHUNK_MASK, max_size: int = MAX_CHUNK) -> Iterator[bytes]:
+    start = pos = 0
+    while pos < len(data):
+        end = data.find(b'\x00', pos)
+        end = len(data) if end < 0 else end + 1
+        record_crc = zlib.crc32(data[pos:end])
+        pos = end
+        if record_crc & mask == 0 or pos - start >= max_size:
+            yield data[start:pos]
+            start = pos
+    if start < len(data):
+        yield data[start:]
+
+
+@dataclass
+class Profile():
+    name: str
+    created: float
+    source: str
+    # File name -> {'sha256', 'size', 'chunks'}
+    files: dict[str, dict]
+
+    @property
+    def size(self) -> int:
+        return sum(f['size'] for f in self.files.values())
+
+    def record(self) -> dict:
+        return {
+            'kind': 'profile',
+            'name': self.name,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.created)),
+            'source': self.source,
+            'bytes': self.size,
+            'chunks': sum(len(f['chunks']) for f in self.files.values()),
+        }
+
+
+class ProfileStore():
+    def __init__(self, root: Optional[Path] = None) -> None:
+        self.root: Path = root or default_store_dir()
+        self.profile_dir: Path = self.root / 'profiles'
+        self.object_dir: Path = self.root / 'objects'
+
+    # Chunks
+
+    def object_path(self, digest: str) -> Path:
+        return self.object_dir / digest[:2] / digest[2:]
+
+    def put_chunk(self, chunk: bytes) -> tuple[str, bool]:
+        # (digest, whether it was new)
+        digest = hashlib.sha256(chunk).hexdigest()
+        path = self.object_path(digest)
+        if path.exists():
+            return digest, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as fp:
+            fp.write(zlib.compress(chunk))
+        os.replace(tmp_path, path)
+        return digest, True
+
+    def get_chunk(self, digest: str) -> bytes:
+        with open(self.object_path(digest), 'rb') as fp:
+            chunk = zlib.decompress(fp.read())
+        if hashlib.sha256(chunk).hexdigest() != digest:
+            raise ProfileError(f"Chunk {digest} is corrupt")
+        return chunk
+
+    # Profiles
+
+    def manifest_path(self, name: str) -> Path:
+        # Every way in goes through here, so names like '../x' can't reach
+        # files outside the store
+        if not _valid_name.fullmatch(name):
+            raise ProfileError(f"Invalid profile name {name!r}")
+        return self.profile_dir / f"{name}.json"
+
+    def names(self) -> list[str]:
+        if not self.profile_dir.is_dir():
+            return []
+        return sorted(p.stem for p in self.profile_dir.glob('*.json') if _valid_name.fullmatch(p.stem))
+
+    def get(self, name: str) -> Profile:
+        data = load_json(self.manifest_path(name), None)
+        if data is None:
+            raise UnknownProfile(f"No profile named {name!r}")
+        return Profile(**data)
+
+    def profiles(self) -> list[Profile]:
+        return [self.get(name) for name in self.names()]
+
+    @timed('profiles.save')
+    def save(self, name: str, roa_dir: Path) -> tuple[Profile, int]:
+        """
+        >>> import tempfile
+        >>> from reroader.roa import RoaEntry
+        >>> tmp = Path(tempfile.mkdtemp())
+        >>> order_roa = RoaOrderFile(tmp / 'order.roa', load=False)
+        >>> order_roa.groups.update((label, []) for label in order_roa.group_labels)
+        >>> order_roa.groups['characters'] = [RoaEntry(b'/workshop/%d' % i) for i in range(2000)]
+        >>> order_roa.save_file()
+        >>> RoaCategoriesFile(tmp / 'categories.roa', load=False).save_file()
+        >>> store = ProfileStore(tmp / 'store')
+        >>> profile, new_chunks = store.save('a', tmp)
+        >>> new_chunks > 2, all(store.blob(profile, f) == (tmp / f).read_bytes() for f in ROA_FILES)
+        (True, True)
+        >>> store.save('b', tmp)[1]
+        0
+        >>> store.delete('a'), store.delete('b') == new_chunks
+        (0, True)
+        """
+        # (profile, number of new chunks written)
+        manifest_path = self.manifest_path(name)
+        files: dict[str, dict] = {}
+        new_chunks = 0
+        for filename in ROA_FILES:
+            data = (roa_dir / filename).read_bytes()
+            digests = []
+            for chunk in chunk_records(data):
+                digest, new = self.put_chunk(chunk)
+                digests.append(digest)
+                new_chunks += new
+            files[filename] = {'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data), 'chunks': digests}
+        profile = Profile(name, time.time(), str(roa_dir), files)
+        save_json(manifest_path, profile.__dict__)
+        return profile, new_chunks
+
+    def blob(self, profile: Profile, filename: str) -> bytes:
+        entry = profile.files[filename]
+        data = b''.join(self.get_chunk(d) for d in entry['chunks'])
+        if hashlib.sha256(data).hexdigest() != entry['sha256']:
+            raise ProfileError(f"Profile {profile.name!r}: {filename} doesn't match its checksum")
+        return data
+
+    def layout(self, name: str) -> FlatLayout:
+        profile = self.get(name)
+        order_roa = RoaOrderFile(Path(profile.source) / 'order.roa', load=False)
+        order_roa.load_bytes(self.blob(profile, 'order.roa'))
+        categories_roa = RoaCategoriesFile(Path(profile.source) / 'categories.roa', load=False)
+        categories_roa.load_bytes(self.blob(profile, 'categories.roa'))
+        return {k: [e.value for e in v] for k, v in order_roa.groups.items()}, categories_roa.categories
+
+    def active(self, roa_dir: Path) -> Optional[str]:
+        # Name of a profile identical to the live files, if any
+        digests = {
+            filename: hashlib.sha256((roa_dir / filename).read_bytes()).hexdigest()
+            for filename in ROA_FILES
+        }
+        for profile in self.profiles():
+            if profile.name != PREVIOUS and all(profile.files[f]['sha256'] == d for f, d in digests.items()):
+                return profile.name
+        return None
+
+    @timed('profiles.activate')
+    def activate(self, name: str, roa_dir: Path, backup: bool = True) -> None:
+        profile = self.get(name)
+        blobs = {filename: self.blob(profile, filename) for filename in ROA_FILES}
+        if blobs['order.roa'][:len(RoaOrderFile.header)] != RoaOrderFile.header:
+            raise ProfileError(f"Profile {name!r} doesn't hold an order.roa")
+        if backup and name != PREVIOUS:
+            self.save(PREVIOUS, roa_dir)
+
+        # Write everything first, then swap: two renames in the same folder
+        tmp_paths: list[tuple[Path, Path]] = []
+        for filename, data in blobs.items():
+            path = roa_dir / filename
+            tmp_path = path.with_name(path.name + '.tmp')
+            with open(tmp_path, 'wb') as fp:
+                fp.write(data)
+                fp.flush()
+                os.fsync(fp.fileno())
+            tmp_paths.append((tmp_path, path))
+        for tmp_path, path in tmp_paths:
+            os.replace(tmp_path, path)
+
+    def delete(self, name: str) -> int:
+        # Returns the number of chunks freed
+        manifest_path = self.manifest_path(name)
+        if not manifest_path.is_file():
+            raise UnknownProfile(f"No profile named {name!r}")
+        manifest_path.unlink()
+        return self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        used = {d for p in self.profiles() for f in p.files.values() for d in f['chunks']}
+        freed = 0
+        if self.object_dir.is_dir():
+            for path in self.object_dir.glob('*/*'):
+                if path.parent.name + path.name not in used:
+                    path.unlink()
+                    freed += 1
+        return freed
@@ -0,0 +1,189 @@
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterator, Optional, TypeVar
+
+# Opt-in timing spans and counters. Enable with REROADER_PROFILE=1 (or a
+# path ending in .json to choose where the trace goes) or --profile. While
+# disabled, span() hands back a shared no-op context manager and count()
+# returns right away, so instrumentation can stay in hot paths.
+#
+# The trace is Chrome trace format: open it in chrome://tracing or Perfetto.
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+DEFAULT_TRACE_PATH = Path('reroader-trace.json')
+
+_null_span: ContextManager[None] = nullcontext()
+
+logger = logging.getLogger(__name__)
+
+
+class _Span():
+    __slots__ = ('profiler', 'name', 'args', 'start')
+
+    def __init__(self, profiler: 'Profiler', name: str, args: Optional[dict]) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *_exc_info) -> None:
+        self.profiler.add_span(self.name, self.start, time.perf_counter_ns(), self.args)
+
+
+class Profiler():
+    # Spans beyond this many are aggregated but left out of the trace
+    max_events: int = 200_000
+
+    def __init__(self, trace_path: Path = DEFAULT_TRACE_PATH) -> None:
+        self.trace_path: Path = trace_path
+        self.origin_ns: int = time.perf_counter_ns()
+        self.lock = threading.Lock()
+        self.events: list[dict] = []
+        self.dropped_events: int = 0
+        # name -> [calls, total ns, max ns]
+        self.totals: defaultdict[str, list[int]] = defaultdict(lambda: [0, 0, 0])
+        self.counters: defaultdict[str, int] = defaultdict(int)
+
+    def span(self, name: str, args: Optional[dict] = None) -> _Span:
+        return _Span(self, name, args)
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, args: Optional[dict] = None) -> None:
+        duration = end_ns - start_ns
+        with self.lock:
+            total = self.totals[name]
+            total[0] += 1
+            total[1] += duration
+            total[2] = max(total[2], duration)
+            if len(self.events) >= self.max_events:
+                self.dropped_events += 1
+                return
+            event = {
+                'name': name,
+                'ph': 'X',
+                'ts': (start_ns - self.origin_ns) / 1000,
+                'dur': duration / 1000,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+            }
+            if args:
+                event['args'] = args
+            self.events.append(event)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += n
+            if len(self.events) < self.max_events:
+                self.events.append({
+                    'name': name,
+                    'ph': 'C',
+                    'ts': (time.perf_counter_ns() - self.origin_ns) / 1000,
+                    'pid': os.getpid(),
+                    'args': {name: self.counters[name]},
+                })
+
+    def slowest(self, limit: int) -> Iterator[tuple[str, int, int, int]]:
+        # (name, calls, total ns, max ns), by total time
+        with self.lock:
+            totals = sorted(self.totals.items(), key=lambda kv: kv[1][1], reverse=True)
+        for name, (calls, total_ns, max_ns) in totals[:limit]:
+            yield name, calls, total_ns, max_ns
+
+    def summary(self, limit: int = 4) -> str:
+        parts = [
+            f"{name} {total_ns / 1e6:.0f}ms" + (f"/{calls}" if calls > 1 else "")
+            for name, calls, total_ns, _ in self.slowest(limit)
+        ]
+        return "Profile: " + (", ".join(parts) or "no spans yet")
+
+    def trace(self) -> dict:
+        with self.lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+            dropped = self.dropped_events
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'counters': counters, 'dropped_events': dropped},
+        }
+
+    def dump(self, path: Optional[Path] = None) -> Path:
+        path = path or self.trace_path
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as fp:
+            json.dump(self.trace(), fp)
+        os.replace(tmp_path, path)
+        return path
+
+
+_profiler: Optional[Profiler] = None
+
+
+def enable(trace_path: Optional[Path] = None) -> Profiler:
+    # Idempotent; the trace is written at exit
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(trace_path or DEFAULT_TRACE_PATH)
+        atexit.register(_dump_at_exit)
+    elif trace_path is not None:
+        _profiler.trace_path = trace_path
+    return _profiler
+
+
+def _dump_at_exit() -> None:
+    if _profiler is not None:
+        logger.info("Wrote profile trace to %s", _profiler.dump())
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def span(name: str, **args) -> ContextManager[None]:
+    if _profiler is None:
+        return _null_span
+    return _profiler.span(name, args or None)
+
+
+def count(name: str, n: int = 1) -> None:
+    if _profiler is not None:
+        _profiler.count(name, n)
+
+
+def timed(name: Optional[str] = None) -> Callable[[F], F]:
+    # Decorator form of span(). Checks for a profiler per call, so it also
+    # picks up a profiler enabled after import, e.g. by --profile.
+    def decorate(fn: F) -> F:
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return fn(*args, **kwargs)
+            with _profiler.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper  # type: ignore
+    return decorate
+
+
+def summary(limit: int = 4) -> str:
+    return _profiler.summary(limit) if _profiler is not None else ""
+
+
+def enable_from_env() -> None:
+    value = os.environ.get('REROADER_PROFILE', '')
+    if value and value != '0':
+        enable(Path(value) if value.endswith('.json') else None)
+
+
+enable_from_env()
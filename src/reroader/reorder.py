@@ -0,0 +1,82 @@
+import bisect
+from typing import Collection, Hashable, Literal, Sequence, TypeAlias, TypeVar, Union
+
+Direction: TypeAlias = Union[Literal[1], Literal[-1]]
+
+T = TypeVar('T', bound=Hashable)
+
+
+def build_positions(items: Sequence[T]) -> dict[T, int]:
+    return {item: i for i, item in enumerate(items)}
+
+
+def stable_indices(seq: Sequence[int]) -> set[int]:
+    """
+    >>> sorted(stable_indices([0, 3, 1, 2, -1, 4]))
+    [0, 2, 3, 5]
+    >>> stable_indices([]), stable_indices([-1, -1])
+    (set(), set())
+    """
+    # Indices of a longest strictly increasing subsequence of seq, ignoring
+    # negative values.
+    tails: list[int] = []
+    tail_indices: list[int] = []
+    parents: list[int] = [-1] * len(seq)
+    for i, value in enumerate(seq):
+        if value < 0:
+            continue
+        pos = bisect.bisect_left(tails, value)
+        if pos == len(tails):
+            tails.append(value)
+            tail_indices.append(i)
+        else:
+            tails[pos] = value
+            tail_indices[pos] = i
+        parents[i] = tail_indices[pos - 1] if pos else -1
+
+    result: set[int] = set()
+    i = tail_indices[-1] if tail_indices else -1
+    while i >= 0:
+        result.add(i)
+        i = parents[i]
+    return result
+
+
+def sorted_by_position(selected: Collection[T], positions: dict[T, int]) -> list[T]:
+    return sorted(selected, key=positions.__getitem__)
+
+
+def move_by(items: list[T], positions: dict[T, int], selected: Collection[T], direction: Direction) -> None:
+    # Shift every selected item one step in `direction`, in place. Selected
+    # items never swap with each other, so a block that hits either end of the
+    # list stays put as a whole. Costs O(k log k) for k selected items.
+    selected_set = set(selected)
+    order = sorted_by_position(selected_set, positions)
+    if direction == 1:
+        order.reverse()
+
+    for item in order:
+        i = positions[item]
+        j = i + direction
+        if j < 0 or j >= len(items) or items[j] in selected_set:
+            continue
+        other = items[j]
+        items[i], items[j] = other, item
+        positions[item], positions[other] = j, i
+
+
+def move_to(items: list[T], positions: dict[T, int], selected: Collection[T], index: int) -> None:
+    # Move the selected items, keeping their relative order, so the first of
+    # them lands at `index` of the resulting list. One O(n) pass.
+    selected_set = set(selected)
+    if not selected_set:
+        return
+    moved = sorted_by_position(selected_set, positions)
+    rest = [item for item in items if item not in selected_set]
+    index = min(max(0, index), len(rest))
+
+    # Nothing before the first affected position changes place
+    first_changed = min(index, positions[moved[0]])
+    items[:] = [*rest[:index], *moved, *rest[index:]]
+    for i in range(first_changed, len(items)):
+        positions[items[i]] = i
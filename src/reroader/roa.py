@@ -2,18 +2,60 @@ import configparser
 import functools
 import glob
 import itertools
+import logging
 import os
-import traceback
 from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
-from typing import ClassVar, Optional
-
-from frozendict import frozendict
+from types import MappingProxyType
+from typing import ClassVar, Iterable, Mapping, Optional
 
 from .binutil import BinReader, BinWriter
+from .profiling import count, span, timed
+from .sorting import collation_key
+
+logger = logging.getLogger(__name__)
+
+
+class RoaFormatError(ValueError):
+    # An order.roa that can't be parsed
+    pass
+
+
+def default_roa_dir() -> Path:
+    # REROADER_ROA_DIR points the tools at another workshop, e.g. a fixture
+    if env_dir := os.environ.get('REROADER_ROA_DIR'):
+        return Path(env_dir)
+    return Path(f"{os.environ.get('LOCALAPPDATA', Path.home())}/RivalsofAether/workshop")
+
+
+def roa_dirs() -> list[Path]:
+    # REROADER_ROA_DIRS lists several targets, separated by os.pathsep, e.g.
+    # one per user profile on a shared machine
+    if env_dirs := os.environ.get('REROADER_ROA_DIRS'):
+        return [Path(p) for p in env_dirs.split(os.pathsep) if p]
+    return [default_roa_dir()]
+
+
+def workshop_roots() -> list[Path]:
+    # REROADER_WORKSHOP_ROOTS: folders holding workshop items (os.pathsep
+    # separated) to scan for new entries, besides the folders of known ones.
+    # Lets the first item of a new install or library be discovered.
+    return [Path(p) for p in os.environ.get('REROADER_WORKSHOP_ROOTS', '').split(os.pathsep) if p]
+
 
-ROA_DIR = Path(f"{os.environ['LOCALAPPDATA']}/RivalsofAether/workshop")
+def parse_version(value: str) -> Optional[float]:
+    """
+    >>> parse_version('20'), parse_version('"1.5"'), parse_version(' 3 ')
+    (20.0, 1.5, 3.0)
+    >>> parse_version('<UNDEFINED>') is None, parse_version('nan') is None
+    (True, True)
+    """
+    try:
+        version = float(value.strip().strip('"'))
+    except ValueError:
+        return None
+    return version if version == version else None
 
 
 class RoaEntry():
@@ -52,37 +94,41 @@ class RoaEntry():
             return 'skins'
         raise NotImplementedError(type_val)
 
-    image_sizes: ClassVar[frozendict[str, tuple[int, int]]] = frozendict({
+    image_sizes: ClassVar[Mapping[str, tuple[int, int]]] = MappingProxyType({
         'characters': (79, 31),
         'stages': (56, 40),
         'buddies': (42, 32),
         'skins': (79, 31),
     })
 
-    def image_path(self) -> Path:
-        if self.type == 'characters':
-            return self.directory / 'result_small.png'
-        if self.type == 'buddies':
-            return self.directory / 'icon.png'
-        if self.type == 'skins':
-            return self.directory / 'result_small.png'
-        if self.type == 'stages':
-            return self.directory / 'thumb.png'
-        raise NotImplementedError(f"RoaEntry.image for type {self.type!r}")
+    image_filenames: ClassVar[Mapping[str, str]] = MappingProxyType({
+        'characters': 'result_small.png',
+        'stages': 'thumb.png',
+        'buddies': 'icon.png',
+        'skins': 'result_small.png',
+    })
+
+    def image_path(self, type_: Optional[str] = None) -> Path:
+        # Pass the group label as type_ to skip reading config.ini
+        type_ = type_ or self.type
+        if type_ not in self.image_filenames:
+            raise NotImplementedError(f"RoaEntry.image for type {type_!r}")
+        return self.directory / self.image_filenames[type_]
 
     @functools.cached_property
     def ini(self) -> configparser.ConfigParser:
         filename = self.ini_path
         if not os.path.isfile(filename):
-            print("File not found:", filename)
+            logger.debug("File not found: %s", filename)
+            count('ini.missing')
             return {}  # type: ignore
         parser = configparser.ConfigParser(strict=False, interpolation=None)
         try:
-            with open(filename, 'r', encoding='utf-8') as fp:
+            with span('ini.read'), open(filename, 'r', encoding='utf-8') as fp:
                 parser.read_file(fp)
             return parser
         except configparser.Error as e:
-            traceback.print_exc()
+            logger.warning("Couldn't parse %s: %s", filename, e)
             self.parser_error = e
             return parser
 
@@ -90,11 +136,10 @@ class RoaEntry():
         try:
             return self.ini['general'].get(key)[1:-1]  # type: ignore
         except configparser.Error:
-            print("Parser error reading", self.ini_path)
-            traceback.print_exc()
+            logger.warning("Parser error reading %r from %s", key, self.ini_path, exc_info=True)
             return '<INI ERROR>'
         except (KeyError, TypeError):
-            print("Key error reading", self.ini_path)
+            logger.debug("Key error reading %r from %s", key, self.ini_path)
             if self.parser_error:
                 return '<INI ERROR>'
             else:
@@ -109,11 +154,14 @@ class RoaEntry():
         return self.get_property('author')
 
     @functools.cached_property
-    def version(self) -> float:
-        try:
-            return self.ini['general'].getfloat('version')  # type: ignore
-        except (KeyError, ValueError):
-            return -1
+    def sort_key(self) -> tuple:
+        return collation_key(self)
+
+    @functools.cached_property
+    def version(self) -> Optional[float]:
+        # config.ini quotes its values, e.g. version="20". None if missing or
+        # not a number.
+        return parse_version(self.get_property('version'))
 
 
 class RoaOrderFile:
@@ -124,16 +172,28 @@ class RoaOrderFile:
     def expected_group_count(self) -> int:
         return len(self.group_labels)
 
-    def __init__(self, roa_path: Path) -> None:
+    def __init__(self, roa_path: Path, load: bool = True, scan: bool = True, roots: Optional[Iterable[Path]] = None) -> None:
+        # load=False leaves the groups empty for callers that parse the bytes
+        # themselves. scan=False keeps the file as it is on disk: no pruning,
+        # and no config.ini reads to type new entries. roots are scanned on
+        # top of the known entries' folders (default: workshop_roots()).
         self.roa_path: Path = roa_path
+        self.extra_roots: list[Path] = list(roots) if roots is not None else workshop_roots()
 
         self.groups: dict[str, list[RoaEntry]] = OrderedDict()
-        self.state_on_disk: frozendict[str, list[RoaEntry]] = frozendict()
+        self.state_on_disk: Mapping[str, list[RoaEntry]] = MappingProxyType({})
+        # Recoverable problems found by the last load_bytes()
+        self.parse_warnings: list[str] = []
 
-        self.load_from_disk()
+        if load:
+            self.load_from_disk()
+        if load and scan:
+            self.prune_deleted_entries()
+            self.scan_for_new_entries()
 
-        self.prune_deleted_entries()
-        self.scan_for_new_entries()
+    def snapshot(self) -> Mapping[str, list[RoaEntry]]:
+        # Copies of the lists: scanning appends to the groups in place
+        return MappingProxyType({label: list(group) for label, group in self.groups.items()})
 
     def is_dirty(self) -> bool:
         return self.groups != self.state_on_disk
@@ -146,14 +206,16 @@ class RoaOrderFile:
             data: bytes = fp.read()
 
         if not self.check_file_header(data):
-            raise ValueError("Bad input file")
+            raise RoaFormatError("Bad input file")
 
         self.load_bytes(data)
         assert data == self.encode_bytes()
         assert not self.is_dirty()
 
+    @timed('order.parse')
     def load_bytes(self, data: bytes) -> None:
         view: bytes = data
+        self.parse_warnings = []
         groups = []
         curr_group = []
         group_type = self.group_labels[len(curr_group)]
@@ -167,7 +229,8 @@ class RoaOrderFile:
             if string == self.header:
                 # Close previous list
                 if len(curr_group) != expected_count:
-                    print(f"Warning: Expected {expected_count} but got {len(curr_group)} elems!")
+                    self.parse_warnings.append(f"Expected {expected_count} but got {len(curr_group)} entries in group {len(groups) - 1}")
+                    logger.warning("Expected %d but got %d entries in %s", expected_count, len(curr_group), self.roa_path)
                 groups.append(curr_group)
 
                 # Begin next list
@@ -182,21 +245,23 @@ class RoaOrderFile:
                 reader.read_null()
 
         if len(curr_group) != expected_count:
-            print(f"Warning: Expected {expected_count} but got {len(curr_group)} elems!")
+            self.parse_warnings.append(f"Expected {expected_count} but got {len(curr_group)} entries in group {len(groups) - 1}")
+            logger.warning("Expected %d but got %d entries in %s", expected_count, len(curr_group), self.roa_path)
         groups.append(curr_group)
 
         if groups and groups[0] == []:
             groups.pop(0)
 
         if len(groups) < self.expected_group_count:
-            raise ValueError(f"Parse error (expected >= {self.expected_group_count} groups but got {len(groups)})")
+            raise RoaFormatError(f"Parse error (expected >= {self.expected_group_count} groups but got {len(groups)})")
 
         for i, group in enumerate(groups):
             self.groups[self.group_labels[i]] = group
 
-        self.state_on_disk = frozendict(self.groups)
+        self.state_on_disk = self.snapshot()
         assert not self.is_dirty()
 
+    @timed('order.encode')
     def encode_bytes(self) -> bytes:
         writer = BinWriter()
 
@@ -207,34 +272,48 @@ class RoaOrderFile:
 
         return writer.blob
 
+    @timed('order.save')
     def save_file(self) -> None:
         encoded: bytes = self.encode_bytes()
 
         if not self.check_file_header(encoded):
             raise ValueError("Bad output attempt")
 
-        print("Writing", self.roa_path)
+        logger.info("Writing %s", self.roa_path)
         with open(self.roa_path, 'wb') as fp:
             fp.write(encoded)
 
-        self.state_on_disk = frozendict(self.groups)
+        self.state_on_disk = self.snapshot()
         assert not self.is_dirty()
 
-    def prune_deleted_entries(self) -> None:
+    @timed('order.prune')
+    def prune_deleted_entries(self) -> int:
+        pruned = 0
         for label in self.group_labels:
-            for entry in [*self.groups[label]]:
-                if not os.path.exists(entry.directory):
-                    print("Entry has disappeared from disk:", entry.directory)
-                    self.groups[label].remove(entry)
-
-
-    def scan_for_new_entries(self) -> None:
+            kept = []
+            for entry in self.groups[label]:
+                if os.path.exists(entry.directory):
+                    kept.append(entry)
+                else:
+                    logger.debug("Entry has disappeared from disk: %s", entry.directory)
+            if len(kept) != len(self.groups[label]):
+                pruned += len(self.groups[label]) - len(kept)
+                self.groups[label] = kept
+        if pruned:
+            logger.info("Removed %d entries that have disappeared from disk", pruned)
+            count('order.pruned', pruned)
+        return pruned
+
+
+    @timed('order.scan')
+    def scan_for_new_entries(self) -> int:
         # 1. Find paths for all known entries
         all_entries = {*itertools.chain(*self.groups.values())}
         known_entry_dirs = {e.directory for e in all_entries}
 
         # 2. Find set of root directories
         root_dirs = {e.directory.parent for e in all_entries}
+        root_dirs.update(self.extra_roots)
 
         # 3. Find paths on disk not in order list
         all_entry_dirs = {
@@ -251,16 +330,22 @@ class RoaOrderFile:
 
         # # 4. Add new order items to list state
         new_dirs = all_entry_dirs - known_entry_dirs
+        added = 0
         for n in new_dirs:
             try:
                 dir_bytes = str(n).encode('utf-8')
                 new_entry = RoaEntry(dir_bytes)
 
-                print("Adding new entry", new_entry, "to", new_entry.type)
                 self.groups[new_entry.type].append(new_entry)
+                logger.debug("Adding new entry %r to %s", new_entry, new_entry.type)
+                added += 1
             except:
-                traceback.print_exc()
+                logger.warning("Couldn't add new entry %s", n, exc_info=True)
                 continue
+        if added:
+            logger.info("Added %d new entries", added)
+            count('order.added', added)
+        return added
 
         # raise NotImplementedError()
 
@@ -271,22 +356,24 @@ class RoaCategory():
 
 
 class RoaCategoriesFile:
-    def __init__(self, roa_path: Path) -> None:
+    def __init__(self, roa_path: Path, load: bool = True) -> None:
         self.roa_path: Path = roa_path
 
         self.categories: list[RoaCategory] = []
         self.state_on_disk: tuple[RoaCategory, ...] = tuple()
 
-        with open(roa_path, 'rb') as fp:
-            data: bytes = fp.read()
+        if load:
+            with open(roa_path, 'rb') as fp:
+                data: bytes = fp.read()
 
-        self.load_bytes(data)
+            self.load_bytes(data)
 
-        assert data == self.encode_bytes()
+            assert data == self.encode_bytes()
 
     def is_dirty(self) -> bool:
         return tuple(self.categories) != self.state_on_disk
 
+    @timed('categories.parse')
     def load_bytes(self, data: bytes) -> None:
         self.categories.clear()
         reader = BinReader(data)
@@ -302,6 +389,7 @@ class RoaCategoriesFile:
         self.state_on_disk = tuple(self.categories)
         assert not self.is_dirty()
 
+    @timed('categories.encode')
     def encode_bytes(self) -> bytes:
         writer = BinWriter()
 
@@ -312,10 +400,11 @@ class RoaCategoriesFile:
 
         return writer.blob
 
+    @timed('categories.save')
     def save_file(self) -> None:
         encoded: bytes = self.encode_bytes()
 
-        print("Writing", self.roa_path)
+        logger.info("Writing %s", self.roa_path)
         with open(self.roa_path, 'wb') as fp:
             fp.write(encoded)
 
@@ -0,0 +1,211 @@
+import re
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Mapping, Optional
+
+from .roa import RoaEntry
+
+# Rules file format (yaml):
+#
+#   rules:
+#     - category: Pokemon
+#       name: '(?i)pok[eé]mon|pikachu'
+#     - category: Supercomputer
+#       author: [Alice, Bob]
+#       min_version: 1.0
+#     - category: Favorites
+#       ids: [1234567890, 2345678901]
+#
+# Every criterion given on a rule must match. The first matching rule wins;
+# entries that match no rule stay in their current category.
+#
+# Versions are a half-open range: min_version is inclusive, max_version is
+# exclusive, so `min_version: 1` and `max_version: 2` rules split at 2.
+# Entries without a numeric version never match a rule that has a version
+# bound.
+
+
+class RulesError(ValueError):
+    # A rules file that can't be loaded
+    pass
+
+
+@dataclass
+class Rule():
+    category: str
+    priority: int
+    ids: frozenset[str] = frozenset()
+    authors: frozenset[str] = frozenset()
+    name: Optional[re.Pattern] = None
+    min_version: Optional[float] = None
+    max_version: Optional[float] = None
+
+    def matches(self, entry: RoaEntry) -> bool:
+        """
+        >>> import configparser
+        >>> entry = RoaEntry(b'/workshop/1234567890')
+        >>> entry.ini = configparser.ConfigParser(interpolation=None)
+        >>> entry.ini.read_string('[general]\\nversion="20"\\n')
+        >>> Rule('New', 0, min_version=10).matches(entry), Rule('Old', 0, max_version=20).matches(entry)
+        (True, False)
+        >>> entry = RoaEntry(b'/workshop/2345678901')
+        >>> entry.ini = configparser.ConfigParser(interpolation=None)
+        >>> entry.ini.read_string('[general]\\nversion="beta"\\n')
+        >>> Rule('New', 0, min_version=10).matches(entry), Rule('Old', 0, max_version=20).matches(entry)
+        (False, False)
+        >>> Rule('Any', 0).matches(entry)
+        True
+        """
+        if self.ids and entry.id not in self.ids:
+            return False
+        if self.authors and entry.author.casefold() not in self.authors:
+            return False
+        if self.name is not None and not self.name.search(entry.name):
+            return False
+        # Reads config.ini only for rules that check the version
+        if self.min_version is not None or self.max_version is not None:
+            version = entry.version
+            if version is None:
+                return False
+            if self.min_version is not None and version < self.min_version:
+                return False
+            if self.max_version is not None and version >= self.max_version:
+                return False
+        return True
+
+
+@dataclass
+class RuleSet():
+    rules: list[Rule]
+
+    # Rules are indexed by their most selective exact-match criterion, so
+    # per-entry work is a dict lookup plus a scan of the unindexed rules.
+    by_id: dict[str, list[Rule]] = field(default_factory=dict)
+    by_author: dict[str, list[Rule]] = field(default_factory=dict)
+    unindexed: list[Rule] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        by_id: dict[str, list[Rule]] = defaultdict(list)
+        by_author: dict[str, list[Rule]] = defaultdict(list)
+        for rule in self.rules:
+            if rule.ids:
+                for id_ in rule.ids:
+                    by_id[id_].append(rule)
+            elif rule.authors:
+                for author in rule.authors:
+                    by_author[author].append(rule)
+            else:
+                self.unindexed.append(rule)
+        self.by_id = dict(by_id)
+        self.by_author = dict(by_author)
+
+    @property
+    def categories(self) -> list[str]:
+        return list(OrderedDict.fromkeys(r.category for r in self.rules))
+
+    def match(self, entry: RoaEntry) -> Optional[Rule]:
+        candidates = [
+            *self.by_id.get(entry.id, ()),
+            *self.by_author.get(entry.author.casefold(), ())
+        ]
+        best: Optional[Rule] = None
+        for rule in sorted(candidates, key=lambda r: r.priority):
+            if rule.matches(entry):
+                best = rule
+                break
+        for rule in self.unindexed:
+            if best is not None and rule.priority >= best.priority:
+                break
+            if rule.matches(entry):
+                best = rule
+                break
+        return best
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _version_bound(raw: Mapping, key: str, rule_name: str) -> Optional[float]:
+    if raw.get(key) is None:
+        return None
+    try:
+        return float(raw[key])
+    except (TypeError, ValueError):
+        raise RulesError(f"{rule_name}: {key} must be a number, not {raw[key]!r}") from None
+
+
+def compile_rules(raw_rules: list[Mapping]) -> RuleSet:
+    # Every problem with the input is raised as a RulesError naming the rule
+    if not isinstance(raw_rules, (list, tuple)):
+        raise RulesError(f"'rules' must be a list, not {type(raw_rules).__name__}")
+    rules: list[Rule] = []
+    for priority, raw in enumerate(raw_rules):
+        if not isinstance(raw, Mapping):
+            raise RulesError(f"Rule #{priority} must be a mapping, not {raw!r}")
+        if 'category' not in raw:
+            raise RulesError(f"Rule #{priority} has no category: {dict(raw)!r}")
+        rule_name = f"Rule #{priority} ({raw['category']})"
+        known_keys = {'category', 'ids', 'author', 'name', 'min_version', 'max_version'}
+        if unknown := set(raw.keys()) - known_keys:
+            raise RulesError(f"{rule_name} has unknown keys {sorted(unknown)}")
+
+        name = raw.get('name')
+        try:
+            pattern = re.compile(str(name)) if name is not None else None
+        except re.error as e:
+            raise RulesError(f"{rule_name}: bad name pattern {name!r}: {e}") from e
+        rules.append(Rule(
+            category=str(raw['category']),
+            priority=priority,
+            ids=frozenset(str(i) for i in _as_list(raw.get('ids'))),
+            authors=frozenset(str(a).casefold() for a in _as_list(raw.get('author'))),
+            name=pattern,
+            min_version=_version_bound(raw, 'min_version', rule_name),
+            max_version=_version_bound(raw, 'max_version', rule_name),
+        ))
+    return RuleSet(rules)
+
+
+def load_rules(path: Path) -> RuleSet:
+    import ruamel.yaml  # deferred, most runs never load a rules file
+
+    loader = ruamel.yaml.YAML(typ='safe')
+    with open(path, 'r', encoding='utf-8') as fp:
+        try:
+            data = loader.load(fp) or {}
+        except ruamel.yaml.YAMLError as e:
+            raise RulesError(f"{path} isn't valid YAML: {e}") from e
+    if not isinstance(data, Mapping):
+        raise RulesError(f"{path}: expected a mapping with a 'rules' list at the top level")
+    return compile_rules(data.get('rules', []))
+
+
+def apply_rules(
+    nested_state: Mapping[str, list[RoaEntry]],
+    ruleset: RuleSet
+) -> tuple[OrderedDict[str, list[RoaEntry]], int]:
+    # Single pass over every entry; returns the new nested state and the
+    # number of entries that changed category.
+    new_state: OrderedDict[str, list[RoaEntry]] = OrderedDict(
+        (label, []) for label in nested_state.keys()
+    )
+    for label in ruleset.categories:
+        new_state.setdefault(label, [])
+
+    moved = 0
+    for label, entries in nested_state.items():
+        for entry in entries:
+            rule = ruleset.match(entry)
+            if rule is None or rule.category == label:
+                new_state[label].append(entry)
+            else:
+                new_state[rule.category].append(entry)
+                moved += 1
+
+    return new_state, moved
@@ -0,0 +1,120 @@
+import os
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from .roa import RoaEntry
+
+# Tokens are indexed by their trigrams (substring lookup for queries of three
+# or more characters) and by their one- and two-character prefixes (prefix
+# lookup for shorter queries). Entries are keyed by path, so reloading the
+# order file only indexes the entries it added and unindexes the ones it
+# dropped; the others are re-read only if their config.ini changed since.
+
+
+def entry_tokens(entry: RoaEntry) -> list[str]:
+    return f"{entry.name} {entry.author} {entry.id}".casefold().split()
+
+
+def ini_stamp(entry: RoaEntry) -> Optional[int]:
+    try:
+        return os.stat(entry.ini_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def token_keys(token: str) -> set[str]:
+    keys = {token[:1], token[:2]}
+    keys.update(token[i:i + 3] for i in range(len(token) - 2))
+    return keys
+
+
+def query_keys(token: str) -> set[str]:
+    if len(token) < 3:
+        return {token}
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex():
+    def __init__(self) -> None:
+        self.entries: dict[bytes, RoaEntry] = {}
+        self.tokens: dict[bytes, list[str]] = {}
+        self.keys: dict[bytes, set[str]] = {}
+        # config.ini mtime when tokenized
+        self.stamps: dict[bytes, Optional[int]] = {}
+        self.postings: defaultdict[str, set[bytes]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, entry: RoaEntry) -> None:
+        # The same entry object can't have changed (its name and author are
+        # cached). A new one for the same path, e.g. after a reload, is only
+        # re-tokenized if its config.ini changed, and replaces the old
+        # postings if the tokens differ.
+        path = entry.value
+        if self.entries.get(path) is entry:
+            return
+        stamp = ini_stamp(entry)
+        if path in self.entries and self.stamps[path] == stamp:
+            self.entries[path] = entry
+            return
+        tokens = entry_tokens(entry)
+        if self.tokens.get(path) == tokens:
+            self.entries[path] = entry
+            self.stamps[path] = stamp
+            return
+        self.remove(path)
+        self.entries[path] = entry
+        self.stamps[path] = stamp
+        keys: set[str] = set()
+        for token in tokens:
+            keys |= token_keys(token)
+        for key in keys:
+            self.postings[key].add(path)
+        self.tokens[path] = tokens
+        self.keys[path] = keys
+
+    def remove(self, path: bytes) -> None:
+        self.entries.pop(path, None)
+        self.tokens.pop(path, None)
+        self.stamps.pop(path, None)
+        for key in self.keys.pop(path, ()):
+            postings = self.postings[key]
+            postings.discard(path)
+            if not postings:
+                del self.postings[key]
+
+    def update(self, entries: Iterable[RoaEntry]) -> None:
+        # Incremental: only new, gone or changed entries touch the postings,
+        # and only new or changed ones read config.ini
+        current = {e.value: e for e in entries}
+        for path in self.entries.keys() - current.keys():
+            self.remove(path)
+        for entry in current.values():
+            self.add(entry)
+
+    def _match_token(self, query_token: str) -> set[bytes]:
+        postings = sorted(
+            (self.postings.get(key, set()) for key in query_keys(query_token)),
+            key=len
+        )
+        candidates = set(postings[0]).intersection(*postings[1:])
+        if len(query_token) < 3:
+            return candidates
+        # Trigram hits can come from different tokens; confirm the substring
+        return {
+            path for path in candidates
+            if any(query_token in token for token in self.tokens[path])
+        }
+
+    def search(self, query: str) -> set[RoaEntry]:
+        # Every whitespace-separated query word has to match some token
+        query_tokens = query.casefold().split()
+        if not query_tokens:
+            return set()
+        matches: set[bytes] = self._match_token(query_tokens[0])
+        for query_token in query_tokens[1:]:
+            if not matches:
+                break
+            matches &= self._match_token(query_token)
+        return {self.entries[path] for path in matches}
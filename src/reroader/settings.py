@@ -0,0 +1,22 @@
+import logging
+import os
+
+# Numeric REROADER_* settings. A malformed value logs a warning and falls
+# back to the default instead of stopping the program while it imports.
+
+logger = logging.getLogger(__name__)
+
+
+def env_int(name: str, default: int, minimum: int = 0) -> int:
+    value = os.environ.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        logger.warning("Ignoring %s=%r: not a whole number, using %d", name, value, default)
+        return default
+    if number < minimum:
+        logger.warning("Ignoring %s=%r: less than %d, using %d", name, value, minimum, default)
+        return default
+    return number
@@ -0,0 +1,54 @@
+import re
+from typing import TYPE_CHECKING, Callable, Hashable, Sequence, TypeVar
+
+if TYPE_CHECKING:
+    from .roa import RoaEntry
+
+T = TypeVar('T')
+K = TypeVar('K', bound=Hashable)
+
+# Splitting on a capturing group alternates str/int parts, so two natural keys
+# always have the same type at the same position and compare cleanly.
+_re_digits = re.compile(r'(\d+)')
+
+NaturalKey = tuple
+
+
+def natural_key(text: str) -> NaturalKey:
+    parts = _re_digits.split(text.casefold())
+    return tuple(
+        int(part) if i % 2 else part
+        for i, part in enumerate(parts)
+    )
+
+
+def collation_key(entry: 'RoaEntry') -> tuple[NaturalKey, NaturalKey, str]:
+    return (natural_key(entry.name), natural_key(entry.author), entry.id)
+
+
+# Key functions. These read keys cached on the entry, so a sort only computes
+# each key once per entry for the lifetime of the entry.
+
+def sort_name(entry: 'RoaEntry') -> tuple[NaturalKey, NaturalKey, str]:
+    return entry.sort_key
+
+
+def sort_author(entry: 'RoaEntry') -> tuple[NaturalKey, NaturalKey, str]:
+    name, author, id_ = entry.sort_key
+    return (author, name, id_)
+
+
+def alpha_label(entry: 'RoaEntry') -> str:
+    return entry.name[:1].upper() or '?'
+
+
+def group_boundaries(items: Sequence[T], key_fn: Callable[[T], K]) -> list[tuple[K, int]]:
+    # (key, start index) for every run of equal keys, in one linear pass
+    boundaries: list[tuple[K, int]] = []
+    prev_key: object = object()
+    for i, item in enumerate(items):
+        key = key_fn(item)
+        if key != prev_key:
+            boundaries.append((key, i))
+            prev_key = key
+    return boundaries
@@ -0,0 +1,127 @@
+import atexit
+import os
+import sys
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from importlib.abc import Loader as _LoaderBase
+    from importlib.machinery import ModuleSpec
+else:
+    # importlib.abc costs more to import than this whole module
+    _LoaderBase = object
+
+# Startup timing, enabled with REROADER_STARTUP_REPORT=1. The entry scripts
+# import reroader.bootstrap before anything else, which calls
+# start_import_timer(); from then on the timer times every
+# module executed from then on, like `python -X importtime`, and mark()
+# records milestones. The report goes to stderr from finish(), or at exit.
+#
+# Keep this module free of imports beyond the standard basics, it is loaded
+# before everything else.
+
+ENABLED: bool = os.environ.get('REROADER_STARTUP_REPORT', '') not in ('', '0')
+
+_t0: float = time.perf_counter()
+marks: list[tuple[str, float]] = []
+# (module, self seconds, cumulative seconds, depth)
+imports: list[tuple[str, float, float, int]] = []
+_reported: bool = False
+
+
+class _Frame():
+    # A module being executed
+    __slots__ = ('name', 'start', 'children')
+
+    def __init__(self, name: str, start: float) -> None:
+        self.name: str = name
+        self.start: float = start
+        # Seconds spent executing the modules it imported
+        self.children: float = 0.0
+
+
+_stack: list[_Frame] = []
+
+
+class _TimedLoader(_LoaderBase):
+    def __init__(self, loader: '_LoaderBase', name: str) -> None:
+        self._loader: _LoaderBase = loader
+        self._name: str = name
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec: Any) -> Any:
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: Any) -> None:
+        frame = _Frame(self._name, time.perf_counter())
+        _stack.append(frame)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            _stack.pop()
+            total = time.perf_counter() - frame.start
+            if _stack:
+                _stack[-1].children += total
+            imports.append((self._name, total - frame.children, total, len(_stack)))
+
+
+class _ImportTimer():
+    def __init__(self) -> None:
+        self._finding: bool = False
+
+    def find_spec(self, name: str, path: Any, target: Any = None) -> Optional['ModuleSpec']:
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, name)
+        return spec
+
+
+def start_import_timer() -> None:
+    if ENABLED and not any(isinstance(f, _ImportTimer) for f in sys.meta_path):
+        sys.meta_path.insert(0, _ImportTimer())
+        atexit.register(finish, "exit")
+
+
+def mark(label: str) -> None:
+    if ENABLED:
+        marks.append((label, time.perf_counter() - _t0))
+
+
+def report(limit: int = 15) -> str:
+    lines = ["Startup:"]
+    previous = 0.0
+    for label, at in marks:
+        lines.append(f"  {label:<24} {at * 1000:8.1f} ms  (+{(at - previous) * 1000:.1f})")
+        previous = at
+    top_level = sorted((i for i in imports if i[3] == 0), key=lambda i: i[2], reverse=True)
+    if top_level:
+        lines.append(f"Slowest imports (of {len(imports)} modules, self | cumulative ms):")
+        for name, self_s, total_s, _ in top_level[:limit]:
+            lines.append(f"  {self_s * 1000:8.1f} | {total_s * 1000:8.1f}  {name}")
+    return '\n'.join(lines)
+
+
+def finish(label: Optional[str] = None) -> None:
+    # Records a final mark and prints the report, once
+    global _reported
+    if not ENABLED or _reported:
+        return
+    if label:
+        mark(label)
+    _reported = True
+    print(report(), file=sys.stderr)
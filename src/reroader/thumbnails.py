@@ -0,0 +1,168 @@
+import logging
+import os
+import queue
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeAlias
+
+from PIL import Image, ImageFile, ImageTk
+
+from .atlas import ThumbnailAtlas
+from .imagescan import BROKEN, ImageHealth
+from .profiling import count, span
+from .settings import env_int
+
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+logger = logging.getLogger(__name__)
+
+ThumbKey: TypeAlias = tuple[str, tuple[int, int]]
+ThumbCallback: TypeAlias = Callable[[tk.PhotoImage], None]
+
+# Budget for decoded thumbnails held by the cache, in bytes of RGBA pixels.
+# Images currently shown by a list are kept alive by that list regardless.
+THUMBNAIL_BUDGET_BYTES: int = env_int('REROADER_THUMBNAIL_BUDGET_MB', 32) * 1024 * 1024
+
+
+def decode_thumbnail(path: str, size: tuple[int, int]) -> Image.Image:
+    # Runs on a worker thread: no Tk calls allowed here.
+    with Image.open(path, formats=('png',)) as img:
+        img.load()
+        thumb = img.convert('RGBA')
+    if size[0] > 0 and size[1] > 0:
+        thumb.thumbnail(size)
+    return thumb
+
+
+class ThumbnailCache():
+    def __init__(
+        self,
+        root: tk.Misc,
+        budget_bytes: int = THUMBNAIL_BUDGET_BYTES,
+        workers: int = 4,
+        poll_ms: int = 30
+    ) -> None:
+        self.root: tk.Misc = root
+        self.budget_bytes: int = budget_bytes
+        self.poll_ms: int = poll_ms
+
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+
+        self.images: OrderedDict[ThumbKey, tk.PhotoImage] = OrderedDict()
+        self.image_bytes: dict[ThumbKey, int] = {}
+        self.used_bytes: int = 0
+        self.failed: set[ThumbKey] = set()
+
+        self.pending: dict[ThumbKey, list[ThumbCallback]] = {}
+        self.finished: queue.SimpleQueue[tuple[ThumbKey, Optional[Image.Image]]] = queue.SimpleQueue()
+        self.placeholders: dict[tuple[int, int], tk.PhotoImage] = {}
+        self.atlases: dict[tuple[int, int], ThumbnailAtlas] = {}
+
+        # Filled in from a background pre-scan; known-broken images go straight
+        # to the placeholder without a decode attempt
+        self.health: dict[str, ImageHealth] = {}
+        self._poll_scheduled: bool = False
+
+    def placeholder(self, size: tuple[int, int]) -> tk.PhotoImage:
+        if size not in self.placeholders:
+            self.placeholders[size] = tk.PhotoImage(master=self.root, width=max(1, size[0]), height=max(1, size[1]))
+        return self.placeholders[size]
+
+    def get(self, path: str, size: tuple[int, int], callback: ThumbCallback) -> tk.PhotoImage:
+        # Returns the cached image, or a placeholder while the real image is
+        # decoded in the background. `callback` is called on the Tk thread
+        # with the real image once it is ready.
+        key: ThumbKey = (path, size)
+        if key in self.images:
+            self.images.move_to_end(key)
+            return self.images[key]
+        if key in self.failed or self.health.get(path) == BROKEN:
+            return self.placeholder(size)
+
+        if key in self.pending:
+            self.pending[key].append(callback)
+        else:
+            self.pending[key] = [callback]
+            if size[0] > 0 and size[1] > 0 and size not in self.atlases:
+                self.atlases[size] = ThumbnailAtlas(size)
+            self.executor.submit(self._decode, key)
+            self._schedule_poll()
+        return self.placeholder(size)
+
+    def _decode(self, key: ThumbKey) -> None:
+        path, size = key
+        atlas = self.atlases.get(size)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            thumb = atlas.lookup(path, mtime_ns) if atlas else None
+            if thumb is None:
+                with span('thumbnail.decode'):
+                    thumb = decode_thumbnail(path, size)
+                if atlas:
+                    atlas.add(path, mtime_ns, thumb)
+            else:
+                count('thumbnail.atlas_hit')
+            self.finished.put((key, thumb))
+        except Exception:
+            logger.warning("Couldn't decode %s", path, exc_info=True)
+            self.finished.put((key, None))
+
+    def _schedule_poll(self) -> None:
+        if not self._poll_scheduled:
+            self._poll_scheduled = True
+            self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self) -> None:
+        self._poll_scheduled = False
+        while True:
+            try:
+                key, pil_image = self.finished.get_nowait()
+            except queue.Empty:
+                break
+
+            callbacks = self.pending.pop(key, [])
+            if pil_image is None:
+                self.failed.add(key)
+                continue
+
+            photo: tk.PhotoImage = ImageTk.PhotoImage(pil_image, master=self.root)  # type: ignore
+            self._store(key, photo, pil_image.width * pil_image.height * 4)
+            for callback in callbacks:
+                callback(photo)
+
+        if self.pending:
+            self._schedule_poll()
+
+    def _store(self, key: ThumbKey, photo: tk.PhotoImage, cost: int) -> None:
+        self.images[key] = photo
+        self.image_bytes[key] = cost
+        self.used_bytes += cost
+        while self.used_bytes > self.budget_bytes and len(self.images) > 1:
+            old_key, _ = self.images.popitem(last=False)
+            self.used_bytes -= self.image_bytes.pop(old_key)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for atlas in self.atlases.values():
+            try:
+                atlas.save()
+            except OSError:
+                logger.warning("Couldn't save thumbnail atlas %s", atlas.root, exc_info=True)
+
+
+_thumbnail_cache: Optional[ThumbnailCache] = None
+
+
+def get_thumbnail_cache(widget: tk.Misc) -> ThumbnailCache:
+    global _thumbnail_cache
+    if _thumbnail_cache is None:
+        _thumbnail_cache = ThumbnailCache(widget.winfo_toplevel())
+    return _thumbnail_cache
+
+
+def close_thumbnail_cache() -> None:
+    global _thumbnail_cache
+    if _thumbnail_cache is not None:
+        _thumbnail_cache.close()
+        _thumbnail_cache = None
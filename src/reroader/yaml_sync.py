@@ -1,22 +1,30 @@
-import itertools
+import functools
+import logging
 import os
-import pprint
-from collections import OrderedDict, defaultdict
-
-import ruamel.yaml
+from collections import OrderedDict
+from typing import TYPE_CHECKING
 
+from .layout import LayoutModel, roa_zip_chars
+from .profiling import timed
 from .roa import RoaCategoriesFile, RoaCategory, RoaEntry, RoaOrderFile
+from .rules import RuleSet, apply_rules
+from .sorting import alpha_label, group_boundaries, sort_name
+
+logger = logging.getLogger(__name__)
 
-yaml = ruamel.yaml.YAML(typ='unsafe')
-yaml.default_flow_style = False
-yaml.width = 4096
+if TYPE_CHECKING:
+    import ruamel.yaml
 
 
-def sort_name(entry: RoaEntry) -> str:
-    try:
-        return entry.name.upper()  # type: ignore
-    except:
-        return 'ERROR'
+@functools.cache
+def get_yaml() -> 'ruamel.yaml.YAML':
+    # ruamel is slow to import, only load it once sort.yaml is touched
+    import ruamel.yaml
+
+    yaml = ruamel.yaml.YAML(typ='unsafe')
+    yaml.default_flow_style = False
+    yaml.width = 4096
+    return yaml
 
 
 def alphabetize_characters(order_roa):
@@ -30,47 +38,27 @@ def set_groups_by_alpha(order_roa, categories_roa):
     categories_roa.categories.clear()
 
     characters = order_roa.groups['characters']
-    for g in itertools.groupby(characters, lambda c: c.name[0].upper()):
-        key, list_ = g
-        index = characters.index(next(list_))
-
+    for key, index in group_boundaries(characters, alpha_label):
         new_cat = RoaCategory(index, key.encode())
         # print(new_cat)
         categories_roa.categories.append(new_cat)
 
 
-def roa_zip_chars(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile) -> dict[str, list[RoaEntry]]:
-    data: dict = defaultdict(list)
-    category = ''
-
-    cats_by_index = {
-        c.index: c.label.decode('utf-8')
-        for c in categories_roa.categories
-    }
-
-    for i, c in enumerate(order_roa.groups['characters']):
-        category = cats_by_index.get(i, category)
-        data[category].append(c)
-
-    return OrderedDict([
-        (k, v)
-        for k, v in data.items()
-    ])
-
-
+@timed('yaml.load')
 def load_yaml_state(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile):
     yaml_state: dict[str, list[str]] = {}
     if not os.path.isfile('sort.yaml'):
         with open("sort.yaml", "w", encoding="utf-8") as fp:
             yaml_state = {k: [repr(i) for i in v] for k, v in roa_zip_chars(order_roa, categories_roa).items()}
-            yaml.dump(yaml_state, fp)
+            get_yaml().dump(yaml_state, fp)
 
     with open("sort.yaml", "r", encoding="utf-8") as fp:
-        yaml_state = yaml.load(fp)
+        yaml_state = get_yaml().load(fp)
 
     return yaml_state
 
 
+@timed('yaml.sync_to_yaml')
 def sync_characters_to_yaml(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile):
     yaml_state = load_yaml_state(order_roa, categories_roa)
 
@@ -83,35 +71,37 @@ def sync_characters_to_yaml(order_roa: RoaOrderFile, categories_roa: RoaCategori
     all_oar_reprs: set[str] = {
         repr(c) for c in order_roa.groups['characters']
     }
-    # Remove unsubscribed or duplicate characters
+    # Remove unsubscribed or duplicate characters, rebuilding each group once
     yaml_seen_reprs = set()
     for label, group in [*yaml_state.items()]:
-        if label == '_removed': continue
-        for repr_ in [*group]:
+        if label == '_removed' or not group: continue
+        kept = []
+        for repr_ in group:
             if repr_ in yaml_seen_reprs:
-                print(repr_, "appears twice, removing duplicate.")
-                group.remove(repr_)
+                logger.info("%s appears twice, removing duplicate.", repr_)
                 continue
 
             yaml_seen_reprs.add(repr_)
             if repr_ not in all_oar_reprs:
-                print(repr_, "not in oar, removing.")
-                group.remove(repr_)
+                logger.info("%s not in oar, removing.", repr_)
                 yaml_state['_removed'] = yaml_state.get('_removed', [])
                 yaml_state['_removed'].append(repr_)
-            yaml_state[label] = sorted(group)
+                continue
+            kept.append(repr_)
+        yaml_state[label] = sorted(kept)
 
     # Add missing characters
     yaml_state['unsorted'] = yaml_state.get('unsorted', [])
     for r in all_oar_reprs.difference(all_yaml_reprs):
-        print(r, "not in yaml, adding.")
+        logger.info("%s not in yaml, adding.", r)
         yaml_state['unsorted'].append(r)
 
     # Save yaml state
     with open("sort.yaml", "w", encoding="utf-8") as fp:
-        yaml.dump(yaml_state, fp)
+        get_yaml().dump(yaml_state, fp)
 
 
+@timed('yaml.sync_to_roa')
 def sync_yaml_to_roa(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile, interactive=False):
     yaml_state = load_yaml_state(order_roa, categories_roa)
 
@@ -120,21 +110,40 @@ def sync_yaml_to_roa(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile,
     }
 
     # Sync roa to yaml
-    characters = []
-    categories_roa.categories.clear()
+    layout = LayoutModel()
     for label, group in yaml_state.items():
-        if len(group) < 1:
-            continue
-        new_cat = RoaCategory(len(characters), label.encode('utf-8'))
-        print(new_cat)
-        categories_roa.categories.append(new_cat)
+        entries: list[RoaEntry] = []
         for repr_ in group:
             try:
-                characters.append(repr_to_char[repr_])
+                entries.append(repr_to_char[repr_])
             except KeyError:
                 if label == '_removed': continue
-                print("Couldn't find repr", repr_, "in repr map")
-                pprint.pprint(repr_to_char)
+                logger.error("Couldn't find %s among %d characters in the order file", repr_, len(repr_to_char))
                 raise
+        layout.add_category(label, entries)
+
+    layout.to_roa(order_roa, categories_roa)
+
+
+@timed('yaml.apply_rules')
+def apply_rules_to_yaml(order_roa: RoaOrderFile, categories_roa: RoaCategoriesFile, ruleset: RuleSet) -> int:
+    yaml_state = load_yaml_state(order_roa, categories_roa)
+
+    repr_to_char: dict[str, RoaEntry] = {
+        repr(c): c for c in order_roa.groups['characters']
+    }
+
+    layout = LayoutModel(OrderedDict(
+        (label, [repr_to_char[r] for r in group if r in repr_to_char])
+        for label, group in yaml_state.items()
+        if label != '_removed' and isinstance(group, list)
+    ))
+    new_state, moved = apply_rules(layout, ruleset)
+
+    for label, group in new_state.items():
+        yaml_state[label] = [repr(c) for c in group]
+
+    with open("sort.yaml", "w", encoding="utf-8") as fp:
+        get_yaml().dump(yaml_state, fp)
 
-    order_roa.groups['characters'] = characters
+    return moved